@@ -0,0 +1,216 @@
+from collections import deque
+import threading
+import time
+from typing import Optional
+
+from monitor_latency import MonitorLatency
+from profiler import Profiler
+
+
+# Keep the cursor this far from the screen edges
+SCREEN_MARGIN = 50
+
+
+class InputBackend:
+    """Injects mouse and keyboard input"""
+
+    def size(self) -> tuple[int, int]:
+        raise NotImplementedError
+
+    def move_to(self, x: int, y: int):
+        raise NotImplementedError
+
+    def mouse_down(self, button: str):
+        raise NotImplementedError
+
+    def mouse_up(self, button: str):
+        raise NotImplementedError
+
+    def key_down(self, key: str):
+        raise NotImplementedError
+
+    def key_up(self, key: str):
+        raise NotImplementedError
+
+
+class InputBackendDirect(InputBackend):
+    """DirectInput events through pydirectinput, which the game reads instead of virtual key codes"""
+
+    def __init__(self):
+        # Windows only, imported here so the other backends work everywhere
+        import pydirectinput
+        self.pydirectinput = pydirectinput
+
+    def size(self) -> tuple[int, int]:
+        return self.pydirectinput.size()
+
+    def move_to(self, x: int, y: int):
+        # Moves are coalesced, pausing after them would only delay the next target
+        self.pydirectinput.moveTo(x, y, _pause=False)
+
+    def mouse_down(self, button: str):
+        self.pydirectinput.mouseDown(button=button)
+
+    def mouse_up(self, button: str):
+        self.pydirectinput.mouseUp(button=button)
+
+    def key_down(self, key: str):
+        self.pydirectinput.keyDown(key)
+
+    def key_up(self, key: str):
+        self.pydirectinput.keyUp(key)
+
+
+class InputBackendNull(InputBackend):
+    """Fake backend which drops all input, for headless runs of any length"""
+
+    def __init__(self, size: tuple[int, int] = (1920, 1080)):
+        self.screen_size = size
+
+    def size(self) -> tuple[int, int]:
+        return self.screen_size
+
+    def move_to(self, x: int, y: int):
+        pass
+
+    def mouse_down(self, button: str):
+        pass
+
+    def mouse_up(self, button: str):
+        pass
+
+    def key_down(self, key: str):
+        pass
+
+    def key_up(self, key: str):
+        pass
+
+
+class InputBackendRecording(InputBackend):
+    """Fake backend which records (time, action, *args) instead of injecting anything
+
+    Every event is kept, so it is meant for tests and the simulator, not for long runs.
+    """
+
+    def __init__(self, size: tuple[int, int] = (1920, 1080)):
+        self.screen_size = size
+        self.events = []
+
+    def size(self) -> tuple[int, int]:
+        return self.screen_size
+
+    def _record(self, *event):
+        self.events.append((time.perf_counter(),) + event)
+
+    def move_to(self, x: int, y: int):
+        self._record("move_to", x, y)
+
+    def mouse_down(self, button: str):
+        self._record("mouse_down", button)
+
+    def mouse_up(self, button: str):
+        self._record("mouse_up", button)
+
+    def key_down(self, key: str):
+        self._record("key_down", key)
+
+    def key_up(self, key: str):
+        self._record("key_up", key)
+
+
+class Actuator:
+    """Queue of input commands served by a dedicated thread
+
+    Enqueueing never blocks, so the tracking thread does not pay for the injected input.
+    A move queued right after another pending move replaces it, only the latest target matters.
+    """
+
+    def __init__(self, backend: Optional[InputBackend] = None, latency_monitor: Optional[MonitorLatency] = None):
+        self.backend = backend if backend is not None else InputBackendDirect()
+        self.latency_monitor = latency_monitor
+        self.screen_width, self.screen_height = self.backend.size()
+        self.commands = deque()
+        self.lock = threading.Lock()
+        self.pending = threading.Event()
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._actuate_loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.pending.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+
+    def move(self, x: float, y: float, capture_ns: Optional[int] = None):
+        """Move the mouse to the position, clamped to the screen
+
+        capture_ns is the capture timestamp of the frame the move was decided on, for latency monitoring.
+        """
+        x = int(max(SCREEN_MARGIN, min(x, self.screen_width - SCREEN_MARGIN)))
+        y = int(max(SCREEN_MARGIN, min(y, self.screen_height - SCREEN_MARGIN)))
+        command = ("move", time.perf_counter(), capture_ns, x, y)
+        with self.lock:
+            if self.commands and self.commands[-1][0] == "move":
+                self.commands[-1] = command
+            else:
+                self.commands.append(command)
+        self.pending.set()
+
+    def click(self, button: str):
+        self._put(("click", time.perf_counter(), None, button))
+
+    def press(self, key: str):
+        self._put(("press", time.perf_counter(), None, key))
+
+    def idle(self) -> bool:
+        """Whether all queued commands were executed"""
+        with self.lock:
+            return not self.commands and not self.pending.is_set()
+
+    def _put(self, command: tuple):
+        with self.lock:
+            self.commands.append(command)
+        self.pending.set()
+
+    def flush(self):
+        """Execute the queued commands on the calling thread, for driving an actuator which was not started"""
+        while True:
+            with self.lock:
+                if not self.commands:
+                    # Cleared under the lock so that a command put meanwhile sets it again
+                    self.pending.clear()
+                    return
+                command = self.commands.popleft()
+            self._execute(command)
+
+    def _actuate_loop(self):
+        while self.running:
+            self.pending.wait()
+            self.flush()
+
+    def _execute(self, command: tuple):
+        action, queued_time, capture_ns, *args = command
+        start = time.perf_counter()
+        Profiler.record("actuator.queue_delay", start - queued_time)
+        try:
+            if action == "move":
+                self.backend.move_to(*args)
+            elif action == "click":
+                self.backend.mouse_down(*args)
+                self.backend.mouse_up(*args)
+            elif action == "press":
+                self.backend.key_down(*args)
+                self.backend.key_up(*args)
+        except Exception as e:
+            print(f"Actuator error on {action}: {e}")
+        end = time.perf_counter()
+        Profiler.record(f"actuator.{action}", end - start)
+        if self.latency_monitor is not None:
+            self.latency_monitor.record_injection_cost(end - queued_time)
+            if capture_ns is not None:
+                self.latency_monitor.record("injection", capture_ns)
@@ -0,0 +1,264 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Optional
+
+import cv2
+import numpy as np
+
+from detector_puck import DetectorPuck
+from estimator_motion import ESTIMATORS
+from frame_source import FrameSourceArray
+from mask_color import MASK_ENGINES
+from pacer import PacerUnlimited
+from reacquirer_puck import ReacquirerPuck
+from screen_capture import ScreenCapture
+from synthetic import synthetic_frame
+from trajectory_rink import TrajectoryRink
+from vector_motion import VectorMotion
+
+
+ROI_SIZES = [(200, 200), (400, 400), (1920, 1080)]
+MARK_WIDTHS = [10, 20]
+NOISE_LEVELS = [0, 8]
+# Downscaled detection is timed with the HSV engine only
+DETECTION_SCALES = [2, 4]
+# Detector modes compared against the true position of exactly rendered check marks, as (scale, subpixel)
+POSITION_MODES = {"bbox": (1, False), "subpixel": (1, True), "subpixel,1/2": (2, True), "subpixel,1/4": (4, True)}
+POSITION_SAMPLES = 200
+POSITION_MARK_WIDTH = 20
+POSITION_NOISE = 4
+# Slower p50 than the baseline by more than this fraction is a regression
+DEFAULT_TOLERANCE = 0.2
+MAIN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+# Extra main.py arguments of each startup mode, the headless one replays a short synthetic video
+STARTUP_MODES = {"headless": ["--headless"], "desktop": []}
+
+
+def measure(function: Callable, min_time: float, max_calls: int = 100000) -> dict:
+    """Call function repeatedly for at least min_time seconds and summarize the per-call latency"""
+    for _ in range(3):
+        function()
+    durations = []
+    start = time.perf_counter_ns()
+    deadline = start + int(min_time * 1e9)
+    while len(durations) < max_calls:
+        call_start = time.perf_counter_ns()
+        function()
+        call_end = time.perf_counter_ns()
+        durations.append(call_end - call_start)
+        if call_end >= deadline and len(durations) >= 10:
+            break
+    durations = np.array(durations, dtype=np.float64) / 1e3
+    return {
+        "calls": len(durations),
+        "throughput_per_s": len(durations) / (durations.sum() / 1e6),
+        "mean_us": float(durations.mean()),
+        "p50_us": float(np.percentile(durations, 50)),
+        "p99_us": float(np.percentile(durations, 99)),
+    }
+
+
+def detection_cases() -> dict[str, Callable]:
+    cases = {}
+    for width, height in ROI_SIZES:
+        for mark_width in MARK_WIDTHS:
+            for noise in NOISE_LEVELS:
+                # Mark slightly off center, at a sub-pixel position
+                frame = synthetic_frame(width, height, [(width * 0.45 + 0.3, height * 0.55 + 0.6)], mark_width, noise)
+                for engine in MASK_ENGINES:
+                    detector = DetectorPuck(mask_engine=engine)
+                    name = f"detect_check_marks[{engine},{width}x{height},w{mark_width},n{noise}]"
+                    cases[name] = lambda detector=detector, frame=frame: detector.detect_check_marks(frame)
+                for scale in DETECTION_SCALES:
+                    detector = DetectorPuck(scale=scale, subpixel=True)
+                    name = f"detect_check_marks[hsv,1/{scale},{width}x{height},w{mark_width},n{noise}]"
+                    cases[name] = lambda detector=detector, frame=frame: detector.detect_check_marks(frame)
+
+    frame = synthetic_frame(1920, 1080, [(1500.3, 300.6)], 10, 4)
+    reacquirer = ReacquirerPuck(DetectorPuck())
+    cases["reacquire[1920x1080,near]"] = lambda: reacquirer.reacquire(frame, (0, 0, 1920, 1080), (1450, 320))
+    cases["reacquire[1920x1080,far]"] = lambda: reacquirer.reacquire(frame, (0, 0, 1920, 1080), (100, 900))
+    return cases
+
+
+def position_errors() -> dict:
+    """Bias and jitter (px) of the detected check mark center at random sub-pixel positions, per detector mode"""
+    rng = np.random.default_rng(0)
+    truth = np.column_stack((rng.uniform(190, 210, POSITION_SAMPLES), rng.uniform(190, 210, POSITION_SAMPLES)))
+    frames = [synthetic_frame(400, 400, [tuple(center)], POSITION_MARK_WIDTH, POSITION_NOISE, seed=i, exact=True)
+              for i, center in enumerate(truth)]
+    errors = {}
+    for mode, (scale, subpixel) in POSITION_MODES.items():
+        detector = DetectorPuck(scale=scale, subpixel=subpixel)
+        detector.puck_delta = (0, 0)
+        found = []
+        for frame, center in zip(frames, truth):
+            marks = detector.detect_check_marks(frame)
+            if marks:
+                found.append(np.array(marks[0][:2]) - center)
+        found = np.array(found).reshape(-1, 2)
+        # The bias is a constant offset, the jitter around it is what turns into velocity noise
+        errors[mode] = {
+            "detected": len(found) / POSITION_SAMPLES,
+            "bias_x": float(found[:, 0].mean()) if len(found) else None,
+            "bias_y": float(found[:, 1].mean()) if len(found) else None,
+            "jitter_x": float(found[:, 0].std()) if len(found) else None,
+            "jitter_y": float(found[:, 1].std()) if len(found) else None,
+        }
+    return errors
+
+
+def motion_cases() -> dict[str, Callable]:
+    cases = {}
+    rng = np.random.default_rng(0)
+    for name in ESTIMATORS:
+        # Puck moving at 1200 px/s, sampled at 60 FPS with a pixel of detection noise
+        detector = DetectorPuck(estimator=name)
+        for i in range(detector.history.capacity):
+            detector.update_position((1500 - 20 * i + rng.normal(), 400 + 5 * i + rng.normal()), i * 1_000_000_000 // 60)
+        cases[f"calculate_motion_vector[{name}]"] = detector.calculate_motion_vector
+
+        def update(detector=detector, samples=iter(range(detector.history.capacity, 1 << 62))):
+            i = next(samples)
+            detector.update_position((1500 - 20 * i, 400 + 5 * i), i * 1_000_000_000 // 60)
+        cases[f"update_position[{name}]"] = update
+
+    motion = VectorMotion(-1200.0, 300.0, 1236.9)
+    cases["predict_position"] = lambda: motion.predict_position((500.0, 400.0), 0.05)
+
+    # Bank shot off the top wall, with the velocity uncertainty of a settled Kalman filter
+    trajectory = TrajectoryRink([(100, 100), (1800, 100), (1800, 1000), (100, 1000)])
+    banked = VectorMotion(-1200.0, -700.0, 1389.2, np.diag([900.0, 900.0]))
+    cases["trajectory_rink.predict_motion"] = lambda: trajectory.predict_motion((1000.0, 400.0), banked, ((200, 450), (200, 700)))
+    return cases
+
+
+def controller_cases() -> dict[str, Callable]:
+    from controller import Controller
+    line = ((200.0, 450.0), (200.0, 700.0))
+    return {"find_intersection": lambda: Controller.find_intersection(line, (900.0, 500.0), (-1200.0, 100.0))}
+
+
+def capture_cases() -> tuple[dict[str, Callable], Callable]:
+    frames = np.stack([synthetic_frame(1920, 1080, [(900 + 5 * i, 500)], 10, 4, seed=i) for i in range(4)])
+    screen_capture = ScreenCapture(source=FrameSourceArray(frames), pacer=PacerUnlimited())
+    screen_capture.start_capture()
+    while screen_capture.get_frame() is None:
+        time.sleep(0.001)
+    return {"get_frame": screen_capture.get_frame}, screen_capture.stop_capture
+
+
+def startup_cases() -> tuple[dict[str, Callable], Callable]:
+    """Launch of main.py in a fresh interpreter until its tracker is set up"""
+    directory = tempfile.mkdtemp()
+    replay = os.path.join(directory, "startup.avi")
+    writer = cv2.VideoWriter(replay, cv2.VideoWriter_fourcc(*"MJPG"), 60, (640, 480))
+    writer.write(synthetic_frame(640, 480))
+    writer.release()
+    cases = {}
+    for mode, arguments in STARTUP_MODES.items():
+        command = [sys.executable, MAIN_PATH, "--startup-only"] + arguments
+        if "--headless" in arguments:
+            command += ["--replay", replay]
+        # The desktop mode needs a display and the input libraries
+        probe = subprocess.run(command, capture_output=True, text=True)
+        if probe.returncode != 0:
+            error = probe.stderr.strip().splitlines()[-1:] or [f"exit code {probe.returncode}"]
+            print(f"Skipping startup[{mode}]: {error[0]}", file=sys.stderr)
+            continue
+        cases[f"startup[{mode}]"] = lambda command=command: subprocess.run(command, stdout=subprocess.DEVNULL, check=True)
+    return cases, lambda: shutil.rmtree(directory, ignore_errors=True)
+
+
+def run(min_time: float, filter_text: Optional[str] = None) -> dict:
+    cases = {}
+    cases.update(detection_cases())
+    cases.update(motion_cases())
+    cases.update(controller_cases())
+    capture, cleanup = capture_cases()
+    cases.update(capture)
+    cleanups = [cleanup]
+    if not filter_text or "startup" in filter_text:
+        startup, cleanup = startup_cases()
+        cases.update(startup)
+        cleanups.append(cleanup)
+
+    results = {}
+    try:
+        for name, function in cases.items():
+            if filter_text and filter_text not in name:
+                continue
+            results[name] = measure(function, min_time)
+            stats = results[name]
+            print(f"{name:<55} {stats['throughput_per_s']:>12.0f}/s p50 {stats['p50_us']:>10.1f} us p99 {stats['p99_us']:>10.1f} us")
+    finally:
+        for cleanup in cleanups:
+            cleanup()
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Names of the cases whose p50 latency regressed against the baseline"""
+    regressions = []
+    print("\nComparison with baseline (p50):")
+    for name, stats in results.items():
+        if name not in baseline:
+            continue
+        ratio = stats["p50_us"] / baseline[name]["p50_us"]
+        marker = ""
+        if ratio > 1 + tolerance:
+            marker = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:<55} {baseline[name]['p50_us']:>10.1f} -> {stats['p50_us']:>10.1f} us ({ratio:.2f}x){marker}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks of the tracking hot path")
+    parser.add_argument("--min-time", type=float, default=0.3, help="Seconds spent measuring each case")
+    parser.add_argument("--filter", help="Only run cases whose name contains this text")
+    parser.add_argument("--output", help="Save results as JSON")
+    parser.add_argument("--baseline", help="Compare against results saved earlier, exit with 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    results = run(args.min_time, args.filter)
+    accuracy = {}
+    if not args.filter or "position" in args.filter:
+        accuracy = position_errors()
+        print(f"\n{'position error (px)':<25} {'detected':>8} {'bias x':>8} {'bias y':>8} {'jitter x':>8} {'jitter y':>8}")
+        for mode, error in accuracy.items():
+            values = [f"{error[key]:>8.3f}" if error[key] is not None else f"{'-':>8}"
+                      for key in ("detected", "bias_x", "bias_y", "jitter_x", "jitter_y")]
+            print(f"{mode:<25} " + " ".join(values))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "meta": {
+                    "time": time.time(),
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "numpy": np.__version__,
+                },
+                "results": results,
+                "position_errors": accuracy,
+            }, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s)")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
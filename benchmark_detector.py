@@ -0,0 +1,39 @@
+import argparse
+import time
+
+from detector_puck import DetectorPuck
+from mask_color import MASK_ENGINES
+from synthetic import synthetic_frame
+
+
+SIZES = [(200, 200), (400, 400), (1920, 1080)]
+
+
+def time_call(function, repeats: int) -> float:
+    """Median wall time of one call in milliseconds"""
+    function()
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return times[len(times) // 2] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare mask engines of DetectorPuck side by side")
+    parser.add_argument("--repeats", type=int, default=200)
+    args = parser.parse_args()
+
+    detectors = {name: DetectorPuck(mask_engine=name) for name in MASK_ENGINES}
+    print(f"{'size':>10} {'engine':>6} {'mask ms':>9} {'detect ms':>10}")
+    for width, height in SIZES:
+        frame = synthetic_frame(width, height, [(width / 2, height / 2)], noise=4)
+        for name, detector in detectors.items():
+            mask_ms = time_call(lambda: detector.mask_color.compute(frame, detector.lower_yellow, detector.upper_yellow), args.repeats)
+            detect_ms = time_call(lambda: detector.detect_check_marks(frame), args.repeats)
+            print(f"{width:>4}x{height:<5} {name:>6} {mask_ms:>9.3f} {detect_ms:>10.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import cv2
+import json
+import math
+import numpy as np
+import os
+import threading
+from typing import Optional
+
+
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "crease_cache.json")
+CANNY_THRESHOLDS = (50, 150)
+# Crease line length as a fraction of the frame height
+MIN_CREASE_LENGTH = 0.1
+MAX_CREASE_LENGTH = 0.5
+# Largest deviation from vertical of the crease line (degrees)
+MAX_CREASE_TILT = 10
+# Cached corners are kept while at least this fraction of the points along the line are still on an edge
+MIN_EDGE_FRACTION = 0.6
+VALIDATION_SAMPLES = 32
+# Half width of the band searched around each sampled point
+VALIDATION_TOLERANCE = 3
+VALIDATION_GRADIENT = 40
+# Step of following an edge past the end of a detected line segment (px)
+FOLLOW_STEP = 8
+
+Corners = tuple[tuple[int, int], tuple[int, int]]
+
+
+class CalibratorCrease:
+    """Find the crease line in a frame and remember it per screen resolution
+
+    Detection runs in a background thread, the result is picked up with take_result().
+    Cached corners are checked against a later frame by sampling the horizontal
+    gradient along the line, which costs a few hundred pixel reads.
+    """
+
+    def __init__(self, cache_path: str = CACHE_PATH):
+        self.cache_path = cache_path
+        self.cache = self._load_cache()
+        self.result: Optional[Corners] = None
+        self.thread = None
+
+    @staticmethod
+    def resolution_key(width: int, height: int) -> str:
+        return f"{width}x{height}"
+
+    def _load_cache(self) -> dict:
+        try:
+            with open(self.cache_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            print(f"Ignoring crease cache {self.cache_path}: {e}")
+            return {}
+
+    def load(self, width: int, height: int) -> Optional[Corners]:
+        entry = self.cache.get(self.resolution_key(width, height))
+        if entry is None:
+            return None
+        return tuple(entry["top"]), tuple(entry["bot"])
+
+    def save(self, width: int, height: int, corners: Corners):
+        top, bot = corners
+        self.cache[self.resolution_key(width, height)] = {"top": [int(top[0]), int(top[1])], "bot": [int(bot[0]), int(bot[1])]}
+        try:
+            with open(self.cache_path, "w") as f:
+                json.dump(self.cache, f, indent=2)
+        except OSError as e:
+            print(f"Failed to save crease cache {self.cache_path}: {e}")
+
+    def busy(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def calibrate_async(self, image: np.ndarray, resolution: Optional[tuple[int, int]] = None):
+        """Detect the crease in a copy of the image in the background, ignored if one is already running
+
+        The result is cached under resolution, (width, height) of the image by default.
+        """
+        if self.busy():
+            return
+        if resolution is None:
+            resolution = (image.shape[1], image.shape[0])
+        image = image.copy()
+        self.thread = threading.Thread(target=self._calibrate, args=(image, resolution), daemon=True)
+        self.thread.start()
+
+    def _calibrate(self, image: np.ndarray, resolution: tuple[int, int]):
+        corners = self.detect(image)
+        if corners is None:
+            print("Crease calibration failed: no crease line found")
+            return
+        self.save(*resolution, corners)
+        print(f"Crease calibrated: top {corners[0]}, bot {corners[1]}")
+        self.result = corners
+
+    def take_result(self) -> Optional[Corners]:
+        """Corners found by the last background calibration, once"""
+        result, self.result = self.result, None
+        return result
+
+    @staticmethod
+    def detect(image: np.ndarray) -> Optional[Corners]:
+        """Longest near vertical line of crease length, as (top, bottom) corners"""
+        height = image.shape[0]
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        edges = cv2.Canny(gray, *CANNY_THRESHOLDS)
+        min_length = MIN_CREASE_LENGTH * height
+        lines = cv2.HoughLinesP(edges, 1, np.pi / 180, threshold=int(min_length / 2),
+                                minLineLength=min_length, maxLineGap=int(min_length / 10))
+        if lines is None:
+            return None
+        x1, y1, x2, y2 = lines.reshape(-1, 4).T.astype(np.float64)
+        lengths = np.hypot(x2 - x1, y2 - y1)
+        tilt = np.degrees(np.arctan2(np.abs(x2 - x1), np.abs(y2 - y1)))
+        valid = (tilt <= MAX_CREASE_TILT) & (lengths >= min_length) & (lengths <= MAX_CREASE_LENGTH * height)
+        if not valid.any():
+            return None
+        max_length = MAX_CREASE_LENGTH * height
+        for best in np.flatnonzero(valid)[np.argsort(-lengths[valid])]:
+            top, bot = (x1[best], y1[best]), (x2[best], y2[best])
+            if top[1] > bot[1]:
+                top, bot = bot, top
+            # Hough splits lines into pieces, follow the edge past both ends to measure the whole line
+            direction = np.array([bot[0] - top[0], bot[1] - top[1]]) / lengths[best]
+            top = CalibratorCrease._follow_edge(image, np.array(top), -direction, max_length)
+            bot = CalibratorCrease._follow_edge(image, np.array(bot), direction, max_length)
+            if min_length <= np.hypot(*(bot - top)) <= max_length:
+                return (int(top[0]), int(top[1])), (int(bot[0]), int(bot[1]))
+        return None
+
+    @staticmethod
+    def _follow_edge(image: np.ndarray, end: np.ndarray, direction: np.ndarray, max_length: float) -> np.ndarray:
+        """Move the end of a line along the direction while the edge continues, at most past max_length"""
+        travelled = 0.0
+        while travelled <= max_length:
+            step = end + direction * FOLLOW_STEP
+            if CalibratorCrease._edge_fraction(image, end, step) < MIN_EDGE_FRACTION:
+                break
+            end = step
+            travelled += FOLLOW_STEP
+        return end
+
+    @staticmethod
+    def validate(image: np.ndarray, corners: Corners) -> bool:
+        """Whether the image still has a vertical edge along the line between the corners"""
+        return CalibratorCrease._edge_fraction(image, *corners) >= MIN_EDGE_FRACTION
+
+    @staticmethod
+    def _edge_fraction(image: np.ndarray, start: tuple[float, float], end: tuple[float, float]) -> float:
+        """Fraction of the points sampled along the line which lie on a vertical edge"""
+        (top_x, top_y), (bot_x, bot_y) = start, end
+        height, width = image.shape[:2]
+        steps = np.linspace(0, 1, VALIDATION_SAMPLES)
+        ys = np.round(top_y + (bot_y - top_y) * steps).astype(np.intp)
+        xs = np.round(top_x + (bot_x - top_x) * steps).astype(np.intp)
+        offsets = np.arange(-VALIDATION_TOLERANCE, VALIDATION_TOLERANCE + 2)
+        columns = xs[:, None] + offsets[None, :]
+        inside = (ys >= 0) & (ys < height) & (columns.min(axis=1) >= 0) & (columns.max(axis=1) < width)
+        if not inside.any():
+            return 0.0
+        # Gray values of a short horizontal band around every sampled point
+        band = image[ys[inside, None], columns[inside]].astype(np.int16).sum(axis=2) / 3
+        gradient = np.abs(np.diff(band, axis=1)).max(axis=1)
+        return math.fsum(gradient >= VALIDATION_GRADIENT) / VALIDATION_SAMPLES
@@ -1,14 +1,30 @@
-import keyboard
 import math
-import pyautogui
-import pydirectinput
+import numpy as np
 import time
+from typing import Optional
 
+from actuator import Actuator
+from calibrator_crease import CalibratorCrease
 from detector_puck import DetectorPuck
+from frame_source import Region
+from scheduler import Scheduler
+from trajectory_rink import TrajectoryRink
 
 
 CREASE_CORNER_TOP = (200, 450)
 CREASE_CORNER_BOT = (200, 700)
+# Screen space rink boundary [(x, y), ...] for predicting rebounds, straight lines only if None
+RINK_POLYGON = None
+# Do not act on motion vectors whose velocity is less certain than this (px/s)
+MAX_VELOCITY_STD = 250.0
+# Schedule a save for impacts predicted at most this many seconds ahead
+SAVE_HORIZON = 2.0
+# Fire the save this long before the predicted impact, to cover the input and game latency
+SAVE_LEAD = 0.05
+# Ignore new impacts for this long after a save fired
+SAVE_COOLDOWN = 0.5
+# Mouse button of the block
+SAVE_BUTTON = "right"
 
 
 class Controller:
@@ -17,14 +33,41 @@ class Controller:
         SET_CORNER_AUTO = "f2"
         SET_CORNER_TOP = "f3"
         SET_CORNER_BOT = "f4"
-
-    def __init__(self, detector: DetectorPuck):
-        print("Keybinds:")
-        print(f"Press {Controller.KEYBINDS.ENABLE_CONTROL} to enable auto control")
-        print(f"Press {Controller.KEYBINDS.SET_CORNER_TOP} to set top gate corner")
-        print(f"Press {Controller.KEYBINDS.SET_CORNER_BOT} to set bot gate corner")
+        SAVE_CROPS = "f5"
+
+    def __init__(self, detector: DetectorPuck, actuator: Optional[Actuator] = None, hotkeys: bool = True):
+        """Without hotkeys no keyboard hook is installed and auto control is always enabled"""
+        self.hotkeys = hotkeys
+        if hotkeys:
+            print("Keybinds:")
+            print(f"Press {Controller.KEYBINDS.ENABLE_CONTROL} to enable auto control")
+            print(f"Press {Controller.KEYBINDS.SET_CORNER_AUTO} to detect the gate corners automatically")
+            print(f"Press {Controller.KEYBINDS.SET_CORNER_TOP} to set top gate corner")
+            print(f"Press {Controller.KEYBINDS.SET_CORNER_BOT} to set bot gate corner")
+            print(f"Press {Controller.KEYBINDS.SAVE_CROPS} to save the recent frames around the puck")
         self.detector_puck = detector
+        self.actuator = actuator if actuator is not None else Actuator()
+        self.actuator.start()
+        self.scheduler = Scheduler()
+        self.scheduler.start()
+        self.last_save_time = -math.inf
+        self.trajectory = TrajectoryRink(RINK_POLYGON) if RINK_POLYGON is not None else None
+        self.calibrator = CalibratorCrease()
+        self.auto_key_held = False
+        # Automatic calibration waits for a frame showing the whole rink, see wants_full_frame
+        self.calibration_requested = False
+        self.corner_key_held = False
+        # Outcome of the last do(), one of recorder_flight.ACTIONS, and the crease impact it computed
+        self.last_action = "none"
+        self.last_impact: Optional[tuple[float, float, float, bool]] = None
+        self._load_corners()
         self.pressed_keys = set()
+        if hotkeys:
+            self._hook_keys()
+
+    def _hook_keys(self):
+        # Global hook, needs a desktop session (or root on Linux), so only imported when hotkeys are used
+        import keyboard
         def update_keys(e):
             if e.event_type == keyboard.KEY_DOWN:
                 self.pressed_keys.add(e.name)
@@ -32,49 +75,130 @@ class Controller:
                 self.pressed_keys.discard(e.name)
         keyboard.hook(update_keys)
 
-    def tick(self):
+    @staticmethod
+    def _cursor_position() -> tuple[int, int]:
+        import pyautogui
+        x, y = pyautogui.position()
+        return (x, y)
+
+    def enabled(self) -> bool:
+        """Whether auto control is on"""
+        return not self.hotkeys or Controller.KEYBINDS.ENABLE_CONTROL in self.pressed_keys
+
+    def wants_full_frame(self) -> bool:
+        """Whether the capture has to grab the whole rink again for the corner calibration or check"""
+        return self.calibration_requested or self.validate_corners
+
+    def _resolution(self) -> tuple[int, int]:
+        """Screen size the corners are cached under, the same for loading, manual and automatic corners"""
+        return self.actuator.screen_width, self.actuator.screen_height
+
+    def _load_corners(self):
+        """Corners cached for this screen resolution, checked against the first frame"""
         global CREASE_CORNER_TOP, CREASE_CORNER_BOT
+        corners = self.calibrator.load(*self._resolution())
+        self.validate_corners = corners is not None
+        if corners is not None:
+            CREASE_CORNER_TOP, CREASE_CORNER_BOT = corners
+            print(f"Loaded cached gate corners: top {CREASE_CORNER_TOP}, bot {CREASE_CORNER_BOT}")
+
+    def tick(self, image: Optional[np.ndarray] = None, region: Optional[Region] = None):
+        """Handle the corner keys, image is the current frame and region the part of it which was grabbed (all by default)
+
+        Outside of a narrowed region the frame holds stale pixels, so the corners are only
+        checked and detected on frames grabbed whole.
+        """
+        global CREASE_CORNER_TOP, CREASE_CORNER_BOT
+        corners = self.calibrator.take_result()
+        if corners is not None:
+            CREASE_CORNER_TOP, CREASE_CORNER_BOT = corners
+        full_frame = image is not None and (region is None or tuple(region) == (0, 0, image.shape[1], image.shape[0]))
+        if full_frame and self.validate_corners:
+            self.validate_corners = False
+            if not self.calibrator.validate(image, (CREASE_CORNER_TOP, CREASE_CORNER_BOT)):
+                print("Cached gate corners do not match the screen, detecting them again")
+                self.calibrator.calibrate_async(image, self._resolution())
+
+        corner_pressed = False
         if Controller.KEYBINDS.SET_CORNER_TOP in self.pressed_keys:
-            CREASE_CORNER_TOP = (pyautogui.position()[0], pyautogui.position()[1])
+            CREASE_CORNER_TOP = self._cursor_position()
+            corner_pressed = True
         if Controller.KEYBINDS.SET_CORNER_BOT in self.pressed_keys:
-            CREASE_CORNER_BOT = (pyautogui.position()[0], pyautogui.position()[1])
-        if Controller.KEYBINDS.SET_CORNER_AUTO in self.pressed_keys:
-            pass # TODO auto determine corners
-
-    def do(self, pos: tuple[float, float] = None):
-        if Controller.KEYBINDS.ENABLE_CONTROL not in self.pressed_keys:
+            CREASE_CORNER_BOT = self._cursor_position()
+            corner_pressed = True
+        # The corners follow the cursor while the key is held, they are written once it is released
+        if self.corner_key_held and not corner_pressed:
+            self.calibrator.save(*self._resolution(), (CREASE_CORNER_TOP, CREASE_CORNER_BOT))
+        self.corner_key_held = corner_pressed
+        # Once per key press, the key stays down for many frames
+        auto_pressed = Controller.KEYBINDS.SET_CORNER_AUTO in self.pressed_keys
+        if auto_pressed and not self.auto_key_held:
+            self.calibration_requested = True
+        self.auto_key_held = auto_pressed
+        if self.calibration_requested and full_frame:
+            self.calibration_requested = False
+            self.calibrator.calibrate_async(image, self._resolution())
+
+    def do(self, pos: tuple[float, float] = None, capture_ns: Optional[int] = None):
+        self.last_impact = None
+        if not self.enabled():
+            # A save scheduled before control was turned off must not fire anymore
+            self.scheduler.cancel("save")
+            self.last_action = "disabled"
             return
 
         motion_vector = self.detector_puck.calculate_motion_vector()
         if pos is None:
+            self.last_action = "idle"
+            if self.scheduler.pending("save"):
+                # Puck lost right before the impact, keep the cursor on the intercept for the pending block
+                return
             a = time.time() % 2
             a = a if a < 1 else 2 - a
             inter_x = (CREASE_CORNER_TOP[0] * a + CREASE_CORNER_BOT[0] * (1 - a))
             inter_y = (CREASE_CORNER_TOP[1] * a + CREASE_CORNER_BOT[1] * (1 - a))
-            self._move_mouse(int(inter_x), int(inter_y))
+            self.actuator.move(inter_x, inter_y)
+            return
+
+        if motion_vector is None or motion_vector.velocity_std() > MAX_VELOCITY_STD:
+            self.last_action = "uncertain"
+            return
+
+        now = time.perf_counter()
+        if now - self.last_save_time < SAVE_COOLDOWN:
+            self.last_action = "cooldown"
             return
 
-        ix, iy, distance, on_segment = self.find_intersection((CREASE_CORNER_TOP, CREASE_CORNER_BOT), pos, (motion_vector.dx, motion_vector.dy))
-        if on_segment:
-            if distance < 2:
-                self._move_mouse(ix, iy)
-                #pydirectinput.move(int(ix), int(iy))
-                pydirectinput.mouseDown(button=pyautogui.RIGHT)
-                #time.sleep(0.01)
-                pydirectinput.mouseUp(button=pyautogui.RIGHT)
-                pydirectinput.keyDown("q")
-                #time.sleep(0.01)
-                pydirectinput.keyUp("q")
-                pydirectinput.keyDown("s")
-                #time.sleep(0.01)
-                pydirectinput.keyUp("s")
-
-    def _move_mouse(self, x: float, y: float):
-        """Move mouse to position with bounds checking"""
-        screen_width, screen_height = pyautogui.size()
-        x = max(50, min(x, screen_width - 50))
-        y = max(50, min(y, screen_height - 50))
-        pydirectinput.moveTo(int(x), int(y))
+        crease = (CREASE_CORNER_TOP, CREASE_CORNER_BOT)
+        if self.trajectory is not None:
+            impact = self.trajectory.predict_motion(pos, motion_vector, crease, SAVE_HORIZON)
+            on_segment = impact is not None
+            if on_segment:
+                ix, iy, time_to_impact = impact
+                self.last_impact = (ix, iy, time_to_impact, True)
+        else:
+            # Speed is in px/s, so the distance along the motion vector is the time to impact in seconds
+            ix, iy, time_to_impact, on_segment = self.find_intersection(crease, pos, (motion_vector.dx, motion_vector.dy))
+            self.last_impact = (ix, iy, time_to_impact, on_segment)
+        if on_segment and time_to_impact < SAVE_HORIZON:
+            self.actuator.move(ix, iy, capture_ns)
+            # Re-targeted by every newer prediction
+            self.scheduler.schedule("save", now + max(0.0, time_to_impact - SAVE_LEAD), self._save)
+            self.last_action = "save"
+        else:
+            self.scheduler.cancel("save")
+            self.last_action = "cancel"
+
+    def _save(self):
+        """Block sequence, fired by the scheduler at the predicted impact"""
+        self.last_save_time = time.perf_counter()
+        self.actuator.click(SAVE_BUTTON)
+        self.actuator.press("q")
+        self.actuator.press("s")
+
+    def stop(self):
+        self.scheduler.stop()
+        self.actuator.stop()
 
     @staticmethod
     def find_intersection(line: tuple[tuple[float, float], tuple[float, float]], point: tuple[float, float], speed: tuple[float, float]) -> tuple[float, float, float, bool]:
@@ -0,0 +1,220 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import numpy as np
+import os
+import time
+from typing import Iterator, Optional, Union
+
+from detector_puck import DetectorPuck
+from frame_source import Region
+
+
+# Frames thresholded together as one tall image
+CHUNK_FRAMES = 32
+# Two pixels of background around the thresholded pixels are enough for the 3x3 opening and closing
+MORPH_MARGIN = 2
+# One row per detected check mark
+DETECTION_DTYPE = np.dtype([
+    ("frame", np.int64),
+    ("x", np.float64),
+    ("y", np.float64),
+    ("width", np.int32),
+    ("height", np.int32),
+    ("area", np.float64),
+])
+
+Footage = Union[str, np.ndarray]
+
+
+def open_frames(footage: Footage) -> tuple[Optional[np.ndarray], Optional[cv2.VideoCapture]]:
+    """Frame stack of a .npy file (memory-mapped) or an array, or a capture of a video file"""
+    if isinstance(footage, np.ndarray):
+        return footage, None
+    if footage.endswith(".npy"):
+        return np.load(footage, mmap_mode="r"), None
+    capture = cv2.VideoCapture(footage)
+    if not capture.isOpened():
+        raise ValueError(f"Cannot open video {footage}")
+    return None, capture
+
+
+def iter_chunks(footage: Footage, chunk_frames: int = CHUNK_FRAMES) -> Iterator[tuple[int, np.ndarray]]:
+    """(index of the first frame, contiguous (n, height, width, 3) frames) in chunks of at most chunk_frames"""
+    frames, capture = open_frames(footage)
+    if frames is not None:
+        for start in range(0, len(frames), chunk_frames):
+            # Only the pages of this chunk of a memory-mapped file are read
+            yield start, np.ascontiguousarray(frames[start:start + chunk_frames])
+        return
+
+    try:
+        width = int(capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        chunk = np.empty((chunk_frames, height, width, 3), dtype=np.uint8)
+        start = 0
+        while True:
+            count = 0
+            while count < chunk_frames and capture.read(chunk[count])[0]:
+                count += 1
+            if count == 0:
+                return
+            yield start, chunk[:count]
+            start += count
+    finally:
+        capture.release()
+
+
+def video_to_npy(path: str, output: str, chunk_frames: int = CHUNK_FRAMES) -> int:
+    """Decode a video once into a .npy frame stack, which later runs memory-map instead of decoding again"""
+    capture = cv2.VideoCapture(path)
+    count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    width = int(capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    capture.release()
+    # The frame count of the container is only an estimate, the stack grows when more frames are decoded
+    capacity = max(count, chunk_frames)
+    stack = np.lib.format.open_memmap(output, mode="w+", dtype=np.uint8, shape=(capacity, height, width, 3))
+    written = 0
+    for _, chunk in iter_chunks(path, chunk_frames):
+        if written + len(chunk) > capacity:
+            stack.flush()
+            del stack
+            capacity = max(2 * capacity, written + len(chunk))
+            _resize_stack(output, written, capacity, chunk_frames)
+            stack = np.load(output, mmap_mode="r+")
+        stack[written:written + len(chunk)] = chunk
+        written += len(chunk)
+    stack.flush()
+    del stack
+    if written < capacity:
+        _resize_stack(output, written, written, chunk_frames)
+    return written
+
+
+def _resize_stack(path: str, frames: int, length: int, chunk_frames: int = CHUNK_FRAMES):
+    """Replace the .npy stack at path by one of length frames starting with its first frames"""
+    stack = np.load(path, mmap_mode="r")
+    resized_path = path + ".tmp"
+    resized = np.lib.format.open_memmap(resized_path, mode="w+", dtype=np.uint8, shape=(length,) + stack.shape[1:])
+    for start in range(0, frames, chunk_frames):
+        resized[start:min(start + chunk_frames, frames)] = stack[start:min(start + chunk_frames, frames)]
+    resized.flush()
+    del resized, stack
+    os.replace(resized_path, path)
+
+
+class DetectorBatch:
+    """Run DetectorPuck.detect_check_marks over recorded footage as fast as possible
+
+    Frames are processed in chunks stacked into one tall image, so the color
+    threshold runs once per chunk. The morphology and contours still run per frame,
+    giving exactly the marks detect_check_marks would find. A detector with a detection
+    scale thresholds at low resolution first, it runs frame by frame.
+    """
+
+    def __init__(self, detector: Optional[DetectorPuck] = None, chunk_frames: int = CHUNK_FRAMES):
+        self.detector = detector if detector is not None else DetectorPuck()
+        self.chunk_frames = chunk_frames
+        self.frames_processed = 0
+
+    def detect_chunk(self, frames: np.ndarray, first_frame: int = 0, region: Optional[Region] = None) -> list[tuple]:
+        """Rows of DETECTION_DTYPE for a contiguous (n, height, width, 3) stack of frames"""
+        detector = self.detector
+        if detector.scale > 1:
+            left, top, width, height = region if region is not None else (0, 0, frames.shape[2], frames.shape[1])
+            rows = []
+            for i, frame in enumerate(frames):
+                for mark in detector.detect_check_marks(frame, (left, top), (left + width, top + height)):
+                    rows.append((first_frame + i,) + tuple(mark))
+            return rows
+
+        left, top = 0, 0
+        if region is not None:
+            left, top, width, height = region
+            frames = np.ascontiguousarray(frames[:, top:top + height, left:left + width])
+        count, height, width = frames.shape[:3]
+        stacked = detector.mask_color.threshold(frames.reshape(count * height, width, 3), detector.lower_yellow, detector.upper_yellow)
+        rows = []
+        for i in range(count):
+            threshold = stacked[i * height:(i + 1) * height]
+            # Morphology and contours only around the thresholded pixels, the margin keeps the result exact
+            x, y, w, h = cv2.boundingRect(threshold)
+            if w == 0:
+                continue
+            x0, y0 = max(0, x - MORPH_MARGIN), max(0, y - MORPH_MARGIN)
+            x1, y1 = min(width, x + w + MORPH_MARGIN), min(height, y + h + MORPH_MARGIN)
+            mask = detector.mask_color.clean(threshold[y0:y1, x0:x1])
+            for mark in detector.marks_from_mask(mask, (left + x0, top + y0), frames[i, y0:y1, x0:x1]):
+                rows.append((first_frame + i,) + tuple(mark))
+        return rows
+
+    def run(self, footage: Footage, region: Optional[Region] = None, workers: int = 1) -> np.ndarray:
+        """Detection table of every frame of a video file, a .npy frame stack or an (n, height, width, 3) array
+
+        A .npy stack is split between worker processes, each memory-mapping its own range of frames.
+        """
+        if workers > 1 and isinstance(footage, str) and footage.endswith(".npy"):
+            return self._run_parallel(footage, region, workers)
+        rows = []
+        self.frames_processed = 0
+        for start, chunk in iter_chunks(footage, self.chunk_frames):
+            rows += self.detect_chunk(chunk, start, region)
+            self.frames_processed += len(chunk)
+        return np.array(rows, dtype=DETECTION_DTYPE)
+
+    def detect_range(self, path: str, start: int, stop: int, region: Optional[Region] = None) -> list[tuple]:
+        """Rows of DETECTION_DTYPE for frames start to stop of a .npy stack"""
+        frames = np.load(path, mmap_mode="r")
+        rows = []
+        for chunk_start in range(start, stop, self.chunk_frames):
+            chunk = np.ascontiguousarray(frames[chunk_start:min(chunk_start + self.chunk_frames, stop)])
+            rows += self.detect_chunk(chunk, chunk_start, region)
+        return rows
+
+    def _run_parallel(self, path: str, region: Optional[Region], workers: int) -> np.ndarray:
+        count = len(np.load(path, mmap_mode="r"))
+        # A few ranges per worker keep them busy until the end
+        bounds = np.linspace(0, count, 4 * workers + 1).astype(int)
+        with ProcessPoolExecutor(workers) as executor:
+            futures = [executor.submit(self.detect_range, path, int(start), int(stop), region)
+                       for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+            rows = [row for future in futures for row in future.result()]
+        self.frames_processed = count
+        return np.array(rows, dtype=DETECTION_DTYPE)
+
+
+def save_table(table: np.ndarray, path: str):
+    if path.endswith(".npy"):
+        np.save(path, table)
+    else:
+        np.savetxt(path, table, delimiter=",", header=",".join(table.dtype.names), comments="",
+                   fmt=["%d", "%.2f", "%.2f", "%d", "%d", "%.1f"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Detect check marks in every frame of recorded footage")
+    parser.add_argument("footage", help="Video file or .npy stack of BGR frames")
+    parser.add_argument("--output", help="Save the detection table as .csv or .npy")
+    parser.add_argument("--to-npy", help="Only decode the video into this .npy stack for faster later runs")
+    parser.add_argument("--region", type=int, nargs=4, metavar=("LEFT", "TOP", "WIDTH", "HEIGHT"))
+    parser.add_argument("--chunk", type=int, default=CHUNK_FRAMES, help="Frames processed together")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Processes sharing a .npy stack")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.to_npy:
+        count = video_to_npy(args.footage, args.to_npy, args.chunk)
+        print(f"Decoded {count} frames in {time.perf_counter() - start:.1f} s")
+        return
+
+    detector_batch = DetectorBatch(chunk_frames=args.chunk)
+    table = detector_batch.run(args.footage, tuple(args.region) if args.region else None, args.workers)
+    elapsed = time.perf_counter() - start
+    frames = detector_batch.frames_processed
+    print(f"{len(table)} check marks in {frames} frames, {elapsed:.1f} s ({frames / elapsed:.0f} frames/s)")
+    if args.output:
+        save_table(table, args.output)
+
+if __name__ == "__main__":
+    main()
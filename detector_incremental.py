@@ -0,0 +1,91 @@
+import cv2
+import numpy as np
+
+from detector_puck import DetectorPuck
+
+
+# Channel change that counts as a changed pixel, above capture noise and below a check mark edge
+DIFFERENCE_THRESHOLD = 24
+# Changed pixels are grouped into tiles of this size (px) before detection reruns on them
+TILE_SIZE = 64
+# Context detected around the changed tiles, larger than any check mark (px)
+MARK_MARGIN = 24
+
+
+class DetectorIncremental:
+    """Skip detection on the parts of a window which did not change since its marks were detected
+
+    An unchanged window is recognized by the largest channel difference against the
+    kept copy, which is an order of magnitude cheaper than the HSV, morphology and contour
+    chain. Otherwise detection only reruns on the bounding box of the changed tiles,
+    the marks outside of it are kept. A window which moved is detected whole.
+    """
+
+    def __init__(self, detector: DetectorPuck):
+        self.detector = detector
+        self.key = None
+        self.previous = None
+        self.marks = []
+        self.short_circuited = 0
+        self.partial = 0
+        self.full = 0
+
+    def reset(self):
+        self.key = None
+
+    def detect_check_marks(self, image: np.ndarray, bounds_lu: tuple, bounds_rd: tuple) -> list:
+        """Marks of DetectorPuck.detect_check_marks in the window, rerunning it only where the image changed"""
+        left, top = max(0, bounds_lu[0]), max(0, bounds_lu[1])
+        right, bottom = min(image.shape[1], bounds_rd[0]), min(image.shape[0], bounds_rd[1])
+        if right <= left or bottom <= top:
+            return []
+        window = image[top:bottom, left:right]
+        key = (left, top, right, bottom)
+        if key != self.key:
+            return self._detect_full(image, key, window)
+
+        # Compared with the pixels the current marks were detected in, so slow drifts add up
+        if cv2.norm(window, self.previous, cv2.NORM_INF) <= DIFFERENCE_THRESHOLD:
+            self.short_circuited += 1
+            return list(self.marks)
+
+        height, width = window.shape[:2]
+        # Channels side by side in one plane, so the bounding box of the changed bytes is three times as wide
+        difference = cv2.absdiff(window, self.previous).reshape(height, width * 3)
+        _, changed = cv2.threshold(difference, DIFFERENCE_THRESHOLD, 255, cv2.THRESH_BINARY)
+        x, y, w, h = cv2.boundingRect(changed)
+        # Changed area snapped to the tile grid of the window, relative to the window
+        changed_left = x // 3 // TILE_SIZE * TILE_SIZE
+        changed_top = y // TILE_SIZE * TILE_SIZE
+        changed_right = min(right - left, ((x + w - 1) // 3 // TILE_SIZE + 1) * TILE_SIZE)
+        changed_bottom = min(bottom - top, ((y + h - 1) // TILE_SIZE + 1) * TILE_SIZE)
+        if (changed_right - changed_left) * (changed_bottom - changed_top) * 2 > (right - left) * (bottom - top):
+            # Not worth the bookkeeping
+            return self._detect_full(image, key, window)
+
+        self.partial += 1
+        self.previous[changed_top:changed_bottom, changed_left:changed_right] = window[changed_top:changed_bottom, changed_left:changed_right]
+        changed_left, changed_right = left + changed_left, left + changed_right
+        changed_top, changed_bottom = top + changed_top, top + changed_bottom
+        delta_x, delta_y = self.detector.puck_delta
+        def inside(mark) -> bool:
+            x, y = mark[0] - delta_x, mark[1] - delta_y
+            return changed_left <= x < changed_right and changed_top <= y < changed_bottom
+        marks = [mark for mark in self.marks if not inside(mark)]
+        marks += [mark for mark in self.detector.detect_check_marks(
+            image,
+            (max(left, changed_left - MARK_MARGIN), max(top, changed_top - MARK_MARGIN)),
+            (min(right, changed_right + MARK_MARGIN), min(bottom, changed_bottom + MARK_MARGIN)),
+        ) if inside(mark)]
+        self.marks = marks
+        return list(marks)
+
+    def _detect_full(self, image: np.ndarray, key: tuple, window: np.ndarray) -> list:
+        self.full += 1
+        left, top, right, bottom = key
+        self.marks = self.detector.detect_check_marks(image, (left, top), (right, bottom))
+        self.key = key
+        if self.previous is None or self.previous.shape != window.shape:
+            self.previous = np.empty_like(window)
+        np.copyto(self.previous, window)
+        return list(self.marks)
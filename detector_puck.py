@@ -1,29 +1,56 @@
-from collections import deque
 import cv2
 import numpy as np
 import time
 from typing import Optional
 
+from estimator_motion import create_estimator
+from history_motion import HistoryMotion
+from mask_color import create_mask_color
 from vector_motion import VectorMotion
 
 
 MAX_DETECTOR_QUEUE_LENGTH = 15
 PUCK_DELTA = (0, 20)
+# One of estimator_motion.ESTIMATORS
+MOTION_ESTIMATOR = "kalman_cv"
+# One of mask_color.MASK_ENGINES
+MASK_ENGINE = "hsv"
+# Threshold the window at 1/2 or 1/4 of its resolution and only detect at full resolution around the blobs found, 1 to skip
+DETECTION_SCALE = 1
+# Report the saturation weighted centroid of a check mark instead of its bounding box center, to a fraction of a pixel
+SUBPIXEL_CENTER = False
+# Yellow blends with the ice when downsampled, so the low resolution threshold accepts less saturated pixels
+LOW_RES_SATURATION_SCALE = 0.4
+# Full resolution margin around a blob found at low resolution (px)
+REFINE_MARGIN = 4
+# Saturation of the ice, subtracted before weighting the pixels of a check mark by their saturation
+SATURATION_FLOOR = 40
 
 
 class DetectorPuck:
-    def __init__(self):
+    def __init__(self, estimator: str = MOTION_ESTIMATOR, mask_engine: str = MASK_ENGINE, scale: int = DETECTION_SCALE,
+                 subpixel: bool = SUBPIXEL_CENTER):
         # Define yellow color range in HSV
         self.lower_yellow = np.array([20, 100, 100])
         self.upper_yellow = np.array([40, 255, 255])
+        self.mask_color = create_mask_color(mask_engine)
 
         # Minimum area for check mark detection (adjust based on your needs)
         self.min_area = 10
         self.max_area = 200
+        # Width to height window of a check mark (approximately 2:1 for 10x5 check mark)
+        self.min_aspect = 1.5
+        self.max_aspect = 3.0
+        # Offset from the check mark to the puck under it
+        self.puck_delta = PUCK_DELTA
+        if scale < 1 or scale & (scale - 1):
+            raise ValueError(f"Detection scale must be a power of 2: {scale}")
+        self.scale = scale
+        self.subpixel = subpixel
 
         # Motion tracking
-        self.previous_positions = deque(maxlen=MAX_DETECTOR_QUEUE_LENGTH)
-        self.previous_times = deque(maxlen=MAX_DETECTOR_QUEUE_LENGTH)
+        self.history = HistoryMotion(MAX_DETECTOR_QUEUE_LENGTH)
+        self.estimator = create_estimator(estimator, self.history)
 
     def detect_check_marks(self, image: np.ndarray, bounds_lu: tuple = None, bounds_rd: tuple = None) -> list:
         """Detect yellow check marks in the image"""
@@ -35,7 +62,7 @@ class DetectorPuck:
             max(0, bounds_lu[1]),
         )
         if bounds_rd is None:
-            bounds_rd = (image.shape[0], image.shape[1])
+            bounds_rd = (image.shape[1], image.shape[0])
         bounds_rd = (
             max(0, bounds_rd[0]),
             max(0, bounds_rd[1]),
@@ -44,17 +71,48 @@ class DetectorPuck:
         if image.size == 0:
             return []
 
-        # Convert BGR to HSV
-        hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+        if self.scale > 1:
+            return self._detect_downscaled(image, bounds_lu)
 
-        # Create mask for yellow color
-        mask = cv2.inRange(hsv, self.lower_yellow, self.upper_yellow)
+        # Create a cleaned up mask for yellow color
+        mask = self.mask_color.compute(image, self.lower_yellow, self.upper_yellow)
+        return self.marks_from_mask(mask, bounds_lu, image)
 
-        # Clean up the mask
-        kernel = np.ones((3, 3), np.uint8)
-        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)
-        mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
+    def _detect_downscaled(self, image: np.ndarray, bounds_lu: tuple) -> list:
+        """Find yellow blobs at low resolution and run the full resolution detection only around them"""
+        height, width = image.shape[:2]
+        small_width, small_height = width // self.scale, height // self.scale
+        if small_width == 0 or small_height == 0:
+            return []
+        small = image
+        while small.shape[1] > small_width:
+            # Halving step by step averages the same pixels as one area resize, which is slow beyond a factor of 2
+            small = cv2.resize(small, (small.shape[1] // 2, small.shape[0] // 2), interpolation=cv2.INTER_AREA)
+        mask = cv2.inRange(cv2.cvtColor(small, cv2.COLOR_BGR2HSV), self.low_res_lower_yellow(), self.upper_yellow)
+        if not mask.any():
+            return []
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        detected_marks = []
+        for contour in contours:
+            x, y, w, h = cv2.boundingRect(contour)
+            left, top = max(0, x * self.scale - REFINE_MARGIN), max(0, y * self.scale - REFINE_MARGIN)
+            right, bottom = min(width, (x + w) * self.scale + REFINE_MARGIN), min(height, (y + h) * self.scale + REFINE_MARGIN)
+            blob = image[top:bottom, left:right]
+            mask = self.mask_color.compute(blob, self.lower_yellow, self.upper_yellow)
+            detected_marks += self.marks_from_mask(mask, (bounds_lu[0] + left, bounds_lu[1] + top), blob)
+        return detected_marks
+
+    def low_res_lower_yellow(self) -> np.ndarray:
+        """Lower HSV threshold for downsampled images, where yellow blends with the ice"""
+        lower = self.lower_yellow.copy()
+        lower[1] = lower[1] * LOW_RES_SATURATION_SCALE
+        return lower
+
+    def marks_from_mask(self, mask: np.ndarray, bounds_lu: tuple = (0, 0), image: Optional[np.ndarray] = None) -> list:
+        """Check marks among the blobs of a cleaned up mask whose top left corner is at bounds_lu
 
+        image holds the pixels of the mask, it is needed for sub-pixel centers.
+        """
         # Find contours
         contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
 
@@ -65,47 +123,54 @@ class DetectorPuck:
                 # Get bounding rectangle
                 x, y, w, h = cv2.boundingRect(contour)
 
-                # Check aspect ratio (approximately 2:1 for 10x5 check mark)
+                # Check aspect ratio
                 aspect_ratio = w / h
-                if 1.5 <= aspect_ratio <= 3.0:
-                    center_x = x + w / 2
-                    center_y = y + h / 2
-                    detected_marks.append((bounds_lu[0] + center_x + PUCK_DELTA[0], bounds_lu[1] + center_y + PUCK_DELTA[1], w, h, area))
+                if self.min_aspect <= aspect_ratio <= self.max_aspect:
+                    if self.subpixel and image is not None:
+                        center_x, center_y = self.subpixel_center(image, x, y, w, h)
+                    else:
+                        center_x = x + w / 2
+                        center_y = y + h / 2
+                    detected_marks.append((bounds_lu[0] + center_x + self.puck_delta[0], bounds_lu[1] + center_y + self.puck_delta[1], w, h, area))
 
         return detected_marks
 
+    @staticmethod
+    def subpixel_center(image: np.ndarray, x: int, y: int, w: int, h: int) -> tuple[float, float]:
+        """Centroid of the check mark in the bounding box, its pixels weighted by how saturated they are
+
+        The anti-aliased edge pixels are only partially yellow, so they move the centroid by fractions
+        of a pixel where the bounding box jumps by whole pixels. The centroid of a check mark sits a little
+        off its bounding box center, a constant offset on top of the puck delta.
+        """
+        left, top = max(0, x - 1), max(0, y - 1)
+        patch = image[top:y + h + 1, left:x + w + 1]
+        saturation = cv2.cvtColor(patch, cv2.COLOR_BGR2HSV)[:, :, 1]
+        moments = cv2.moments(cv2.subtract(saturation, SATURATION_FLOOR))
+        if moments["m00"] == 0:
+            return x + w / 2, y + h / 2
+        # Pixel i covers [i, i + 1)
+        return left + moments["m10"] / moments["m00"] + 0.5, top + moments["m01"] / moments["m00"] + 0.5
+
     def calculate_motion_vector(self) -> Optional[VectorMotion]:
         """Calculate motion vector based on previous positions"""
-        if len(self.previous_positions) < 2:
+        return self.estimator.estimate()
+
+    def update_position(self, position: tuple[float, float], timestamp_ns: Optional[int] = None) -> bool:
+        """Update position history for motion tracking
+
+        timestamp_ns is the perf_counter_ns() capture time of the frame, now by default.
+        Returns False for a frame not newer than the last one, which is ignored.
+        """
+        if timestamp_ns is None:
+            timestamp_ns = time.perf_counter_ns()
+        if not self.history.append(timestamp_ns, position[0], position[1]):
+            return False
+        self.estimator.update(timestamp_ns / 1e9, position[0], position[1])
+        return True
+
+    def last_position(self) -> Optional[tuple[float, float]]:
+        """Most recent detected position, None if there is none yet"""
+        if len(self.history) == 0:
             return None
-
-        # Use the two most recent positions for more responsive tracking
-        recent_positions = list(self.previous_positions)
-        recent_times = list(self.previous_times)
-
-        if len(recent_positions) < 2:
-            return None
-
-        # Calculate displacement and time difference
-        prev_x, prev_y = recent_positions[0]
-        curr_x, curr_y = recent_positions[-1]
-        prev_time = recent_times[0]
-        current_time = recent_times[-1]
-
-        time_diff = current_time - prev_time
-        if time_diff == 0:
-            return None
-
-        # Calculate velocity components (pixels per second)
-        dx = (curr_x - prev_x) / time_diff
-        dy = (curr_y - prev_y) / time_diff
-
-        # Calculate speed
-        speed = np.sqrt(dx**2 + dy**2)
-
-        return VectorMotion(dx, dy, speed)
-
-    def update_position(self, position: tuple[float, float]):
-        """Update position history for motion tracking"""
-        self.previous_positions.append(position)
-        self.previous_times.append(time.time())
+        return self.history.last_position()
@@ -0,0 +1,177 @@
+import numpy as np
+from typing import Optional
+
+from history_motion import HistoryMotion
+from vector_motion import VectorMotion
+
+
+# Standard deviation of a detected position (px)
+MEASUREMENT_STD = 2.0
+# Spectral density of the unmodelled acceleration (constant velocity) or jerk (constant acceleration)
+PROCESS_NOISE_CV = 5e4
+PROCESS_NOISE_CA = 1e6
+# Initial uncertainty of the velocity (px/s) and acceleration (px/s^2)
+INITIAL_VELOCITY_STD = 2000.0
+INITIAL_ACCELERATION_STD = 20000.0
+# Normalized innovation squared (summed over both axes) above which the filter assumes a deflection
+DEFLECTION_GATE = 50.0
+
+
+class EstimatorMotion:
+    """Base class for motion estimators fed from the detector position history"""
+
+    def __init__(self, history: HistoryMotion):
+        self.history = history
+
+    def update(self, t: float, x: float, y: float):
+        """Called after a new position has been appended to the history"""
+        pass
+
+    def reset(self):
+        pass
+
+    def estimate(self) -> Optional[VectorMotion]:
+        raise NotImplementedError
+
+
+class EstimatorMotionDifference(EstimatorMotion):
+    """Difference between the oldest and the newest position in the history"""
+
+    def estimate(self) -> Optional[VectorMotion]:
+        if len(self.history) < 2:
+            return None
+        times = self.history.times()
+        positions = self.history.positions()
+        time_diff = times[-1] - times[0]
+        if time_diff == 0:
+            return None
+        dx, dy = (positions[-1] - positions[0]) / time_diff
+        return VectorMotion(float(dx), float(dy), float(np.hypot(dx, dy)))
+
+
+class EstimatorMotionLeastSquares(EstimatorMotion):
+    """Straight line fitted to the last window positions"""
+
+    def __init__(self, history: HistoryMotion, window: Optional[int] = None):
+        super().__init__(history)
+        self.window = window
+
+    def estimate(self) -> Optional[VectorMotion]:
+        if len(self.history) < 2:
+            return None
+        times = self.history.times(self.window)
+        positions = self.history.positions(self.window)
+        t = times - times.mean()
+        s_tt = np.dot(t, t)
+        if s_tt == 0:
+            return None
+        centered = positions - positions.mean(axis=0)
+        velocity = t @ centered / s_tt
+
+        # Velocity variance from the fit residuals, measurement noise if there are no degrees of freedom left
+        n = len(t)
+        if n > 2:
+            residuals = centered - np.outer(t, velocity)
+            variance = np.maximum((residuals * residuals).sum(axis=0) / (n - 2), MEASUREMENT_STD ** 2)
+        else:
+            variance = np.full(2, MEASUREMENT_STD ** 2)
+        dx, dy = velocity
+        return VectorMotion(float(dx), float(dy), float(np.hypot(dx, dy)), np.diag(variance / s_tt))
+
+
+class EstimatorMotionKalman(EstimatorMotion):
+    """Kalman filter with a constant velocity (order 1) or constant acceleration (order 2) model
+
+    Both axes share the same model and noise, so they share one covariance matrix
+    and the state is stored as an (order + 1, 2) array.
+    """
+
+    def __init__(self, history: HistoryMotion, order: int = 1):
+        super().__init__(history)
+        self.order = order
+        self.size = order + 1
+        self.process_noise = PROCESS_NOISE_CV if order == 1 else PROCESS_NOISE_CA
+        self.measurement_variance = MEASUREMENT_STD ** 2
+        self.reset()
+
+    def reset(self):
+        self.state = np.zeros((self.size, 2))
+        self.covariance = np.zeros((self.size, self.size))
+        self.last_time: Optional[float] = None
+        self.updates = 0
+
+    def _initial_covariance(self) -> np.ndarray:
+        stds = [MEASUREMENT_STD, INITIAL_VELOCITY_STD, INITIAL_ACCELERATION_STD][:self.size]
+        return np.diag(np.square(stds))
+
+    def _transition(self, dt: float) -> tuple[np.ndarray, np.ndarray]:
+        q = self.process_noise
+        if self.order == 1:
+            f = np.array([[1.0, dt], [0.0, 1.0]])
+            noise = q * np.array([
+                [dt ** 3 / 3, dt ** 2 / 2],
+                [dt ** 2 / 2, dt],
+            ])
+        else:
+            f = np.array([[1.0, dt, dt * dt / 2], [0.0, 1.0, dt], [0.0, 0.0, 1.0]])
+            noise = q * np.array([
+                [dt ** 5 / 20, dt ** 4 / 8, dt ** 3 / 6],
+                [dt ** 4 / 8, dt ** 3 / 3, dt ** 2 / 2],
+                [dt ** 3 / 6, dt ** 2 / 2, dt],
+            ])
+        return f, noise
+
+    def update(self, t: float, x: float, y: float):
+        measurement = np.array([x, y])
+        if self.last_time is None:
+            self.state[:] = 0
+            self.state[0] = measurement
+            self.covariance = self._initial_covariance()
+            self.last_time = t
+            self.updates = 1
+            return
+
+        dt = t - self.last_time
+        if dt < 0:
+            return
+        if dt > 0:
+            f, noise = self._transition(dt)
+            self.state = f @ self.state
+            self.covariance = f @ self.covariance @ f.T + noise
+            self.last_time = t
+
+        innovation = measurement - self.state[0]
+        innovation_variance = self.covariance[0, 0] + self.measurement_variance
+        if np.dot(innovation, innovation) / innovation_variance > DEFLECTION_GATE:
+            # Deflection: keep the measured position, start over with an uncertain velocity
+            self.state[1:] = 0
+            self.covariance = self._initial_covariance()
+            self.state[0] = measurement
+            self.updates = 1
+            return
+
+        gain = self.covariance[:, 0] / innovation_variance
+        self.state += np.outer(gain, innovation)
+        self.covariance -= np.outer(gain, self.covariance[0])
+        self.updates += 1
+
+    def estimate(self) -> Optional[VectorMotion]:
+        if self.updates < 2:
+            return None
+        dx, dy = self.state[1]
+        velocity_variance = self.covariance[1, 1]
+        return VectorMotion(float(dx), float(dy), float(np.hypot(dx, dy)), np.eye(2) * velocity_variance)
+
+
+ESTIMATORS = {
+    "difference": EstimatorMotionDifference,
+    "least_squares": EstimatorMotionLeastSquares,
+    "kalman_cv": lambda history: EstimatorMotionKalman(history, order=1),
+    "kalman_ca": lambda history: EstimatorMotionKalman(history, order=2),
+}
+
+
+def create_estimator(name: str, history: HistoryMotion) -> EstimatorMotion:
+    if name not in ESTIMATORS:
+        raise ValueError(f"Unknown motion estimator: {name}")
+    return ESTIMATORS[name](history)
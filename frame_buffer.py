@@ -0,0 +1,92 @@
+from collections import deque
+from dataclasses import dataclass
+import numpy as np
+from typing import Optional
+
+from frame_source import Region
+
+
+@dataclass
+class Frame:
+    image: np.ndarray
+    sequence: int
+    region: Region
+    # time.perf_counter_ns() right before the pixels were grabbed
+    timestamp_ns: int
+
+
+class FrameBufferTriple:
+    """Single producer / single consumer triple buffer of preallocated frames
+
+    Slot indices are handed over through deque append/pop calls, which are atomic
+    in CPython, so neither side takes a lock and frames are never copied.
+    The producer always owns one slot to write into, the consumer owns the slot
+    it has read last, and the third slot carries the newest published frame.
+    """
+
+    def __init__(self, shape: tuple[int, ...]):
+        self.images = [np.zeros(shape, dtype=np.uint8) for _ in range(3)]
+        self.sequences = [0, 0, 0]
+        self.regions: list[Optional[Region]] = [None, None, None]
+        self.timestamps_ns = [0, 0, 0]
+        self.sequence = 0
+        self._free = deque([1, 2])
+        self._ready = deque()
+        self._back = 0
+        self._front: Optional[int] = None
+
+    def back(self) -> np.ndarray:
+        """Producer: frame to write the next capture into"""
+        return self.images[self._back]
+
+    def publish(self, region: Region, timestamp_ns: int) -> int:
+        """Producer: publish the back frame and take a new one to write into"""
+        self.sequence += 1
+        slot = self._back
+        self.sequences[slot] = self.sequence
+        self.regions[slot] = region
+        self.timestamps_ns[slot] = timestamp_ns
+        self._ready.append(slot)
+
+        # Recycle published frames the consumer has not picked up in time
+        while len(self._ready) > 1:
+            try:
+                self._free.append(self._ready.popleft())
+            except IndexError:
+                break
+
+        while True:
+            try:
+                self._back = self._free.popleft()
+                break
+            except IndexError:
+                pass
+            try:
+                self._back = self._ready.popleft()
+                break
+            except IndexError:
+                # Consumer is swapping its slot right now
+                pass
+        return self.sequence
+
+    def latest(self) -> Optional[Frame]:
+        """Consumer: newest published frame, or the last read one if nothing new was published
+
+        The returned image is only valid until the next call.
+        """
+        while True:
+            try:
+                slot = self._ready.pop()
+            except IndexError:
+                break
+            if self._front is None or self.sequences[slot] > self.sequences[self._front]:
+                if self._front is not None:
+                    self._free.append(self._front)
+                self._front = slot
+            else:
+                # An older frame the producer did not get to recycle yet
+                self._free.append(slot)
+        if self._front is None:
+            return None
+        slot = self._front
+        return Frame(self.images[slot], self.sequences[slot], self.regions[slot], self.timestamps_ns[slot])
@@ -0,0 +1,132 @@
+import cv2
+import numpy as np
+import threading
+from typing import Optional
+
+
+# (left, top, width, height) in full-frame pixel coordinates
+Region = tuple[int, int, int, int]
+
+
+def clamp_region(region: Optional[Region], width: int, height: int) -> Region:
+    """Clamp region to frame bounds, None means the whole frame"""
+    if region is None:
+        return (0, 0, width, height)
+    left, top, region_width, region_height = region
+    right = min(width, left + region_width)
+    bottom = min(height, top + region_height)
+    left = max(0, min(left, width))
+    top = max(0, min(top, height))
+    return (left, top, max(0, right - left), max(0, bottom - top))
+
+
+class FrameSource:
+    """Base class for frame sources used by ScreenCapture
+
+    Sources write the requested region into a preallocated full-size BGR frame,
+    so coordinates stay in screen space no matter how small the grabbed region is.
+    Pixels outside of the region are left untouched.
+    """
+
+    def size(self) -> tuple[int, int]:
+        """Return (width, height) of a full frame"""
+        raise NotImplementedError
+
+    def grab(self, frame: np.ndarray, region: Region) -> bool:
+        """Write region into frame, return False if there are no frames left"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class FrameSourceScreen(FrameSource):
+    """Grab only the requested rectangle of the screen using mss"""
+
+    def __init__(self, monitor: int = 1):
+        # Only imported by the screen source, replaying footage works without a display
+        import mss
+        self.mss = mss
+        with mss.mss() as sct:
+            self.monitor = dict(sct.monitors[monitor])
+        # mss handles are bound to the thread which created them
+        self._local = threading.local()
+
+    def size(self) -> tuple[int, int]:
+        return self.monitor["width"], self.monitor["height"]
+
+    def grab(self, frame: np.ndarray, region: Region) -> bool:
+        left, top, width, height = region
+        if width == 0 or height == 0:
+            return True
+        sct = getattr(self._local, "sct", None)
+        if sct is None:
+            sct = self._local.sct = self.mss.mss()
+        screenshot = sct.grab({
+            "left": self.monitor["left"] + left,
+            "top": self.monitor["top"] + top,
+            "width": width,
+            "height": height,
+        })
+        pixels = np.frombuffer(screenshot.raw, dtype=np.uint8).reshape(height, width, 4)
+        cv2.cvtColor(pixels, cv2.COLOR_BGRA2BGR, dst=frame[top:top + height, left:left + width])
+        return True
+
+    def close(self):
+        sct = getattr(self._local, "sct", None)
+        if sct is not None:
+            sct.close()
+            self._local.sct = None
+
+
+class FrameSourceReplay(FrameSource):
+    """Replay frames from a video file or an image sequence (e.g. "frames/%05d.png")"""
+
+    def __init__(self, path: str, loop: bool = False):
+        self.path = path
+        self.loop = loop
+        self.video = cv2.VideoCapture(path)
+        if not self.video.isOpened():
+            raise ValueError(f"Cannot open replay source: {path}")
+        width = int(self.video.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(self.video.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.buffer = np.zeros((height, width, 3), dtype=np.uint8)
+
+    def size(self) -> tuple[int, int]:
+        return self.buffer.shape[1], self.buffer.shape[0]
+
+    def grab(self, frame: np.ndarray, region: Region) -> bool:
+        ok, image = self.video.read(self.buffer)
+        if not ok and self.loop:
+            self.video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, image = self.video.read(self.buffer)
+        if not ok:
+            return False
+        left, top, width, height = region
+        frame[top:top + height, left:left + width] = image[top:top + height, left:left + width]
+        return True
+
+    def close(self):
+        self.video.release()
+
+
+class FrameSourceArray(FrameSource):
+    """Replay an in-memory (n, height, width, 3) stack of BGR frames"""
+
+    def __init__(self, frames: np.ndarray, loop: bool = True):
+        self.frames = frames
+        self.loop = loop
+        self.index = 0
+
+    def size(self) -> tuple[int, int]:
+        return self.frames.shape[2], self.frames.shape[1]
+
+    def grab(self, frame: np.ndarray, region: Region) -> bool:
+        if self.index >= len(self.frames):
+            if not self.loop:
+                return False
+            self.index = 0
+        left, top, width, height = region
+        frame[top:top + height, left:left + width] = self.frames[self.index, top:top + height, left:left + width]
+        self.index += 1
+        return True
@@ -0,0 +1,68 @@
+import numpy as np
+from typing import Optional
+
+
+class HistoryMotion:
+    """Fixed-size ring buffer of positions stamped with perf_counter_ns() capture times
+
+    Every sample is written twice, at i and i + capacity, so the most recent
+    samples are always available as one contiguous slice without copying.
+    Times are kept in integer nanoseconds and as float seconds for the estimators.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._times_ns = np.zeros(2 * capacity, dtype=np.int64)
+        self._times = np.zeros(2 * capacity, dtype=np.float64)
+        self._positions = np.zeros((2 * capacity, 2), dtype=np.float64)
+        self._index = 0
+        self._length = 0
+
+    def __len__(self) -> int:
+        return self._length
+
+    def append(self, timestamp_ns: int, x: float, y: float) -> bool:
+        """Add a sample, ignoring it if it is not newer than the last one
+
+        Returns whether it was added. A second detection in an already seen frame or
+        a frame which arrives out of order would only produce a bogus velocity.
+        """
+        if self._length and timestamp_ns <= self.last_time_ns():
+            return False
+        i = self._index
+        self._times_ns[i] = self._times_ns[i + self.capacity] = timestamp_ns
+        self._times[i] = self._times[i + self.capacity] = timestamp_ns / 1e9
+        self._positions[i, 0] = self._positions[i + self.capacity, 0] = x
+        self._positions[i, 1] = self._positions[i + self.capacity, 1] = y
+        self._index = (i + 1) % self.capacity
+        self._length = min(self._length + 1, self.capacity)
+        return True
+
+    def clear(self):
+        self._index = 0
+        self._length = 0
+
+    def times(self, count: Optional[int] = None) -> np.ndarray:
+        """Last count sample times in seconds, oldest first"""
+        start, end = self._span(count)
+        return self._times[start:end]
+
+    def positions(self, count: Optional[int] = None) -> np.ndarray:
+        """Last count positions as an (n, 2) array, oldest first"""
+        start, end = self._span(count)
+        return self._positions[start:end]
+
+    def last_time(self) -> float:
+        return float(self._times[self._index - 1 + self.capacity])
+
+    def last_time_ns(self) -> int:
+        return int(self._times_ns[self._index - 1 + self.capacity])
+
+    def last_position(self) -> tuple[float, float]:
+        x, y = self._positions[self._index - 1 + self.capacity]
+        return float(x), float(y)
+
+    def _span(self, count: Optional[int]) -> tuple[int, int]:
+        count = self._length if count is None else min(count, self._length)
+        end = self._index + self.capacity
+        return end - count, end
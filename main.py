@@ -1,8 +1,44 @@
+import argparse
+
+from pacer import create_pacer
+from profiler import ProfilerExporter
+from screen_capture import ScreenCapture
 from tracker_puck import TrackerPuck
 
 
 def main():
-    tracker = TrackerPuck()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--replay", help="Replay a video file instead of capturing the screen")
+    parser.add_argument("--pacing", choices=["fixed", "vsync", "unlimited"], default="fixed", help="Capture pacing policy")
+    parser.add_argument("--fps", type=float, default=60, help="Capture rate for fixed pacing, refresh rate for vsync pacing")
+    parser.add_argument("--poll", action="store_true", help="Poll for frames instead of waiting for them")
+    parser.add_argument("--stats-file", help="Periodically export profiler stats to this .json or .csv file")
+    parser.add_argument("--stats-port", type=int, help="Periodically send profiler stats as JSON to this local UDP port")
+    parser.add_argument("--stats-interval", type=float, default=5.0, help="Seconds between profiler exports")
+    parser.add_argument("--pipeline", action="store_true", help="Run capture, detection and actuation as separate processes")
+    parser.add_argument("--headless", action="store_true",
+                        help="No overlay, hotkeys or input injection, auto control always on (use with --replay without a display)")
+    parser.add_argument("--startup-only", action="store_true", help="Exit once the tracker is set up, for measuring the startup time")
+    args = parser.parse_args()
+
+    if args.pipeline:
+        from pipeline import Pipeline
+        Pipeline(args.replay, args.pacing, args.fps, args.headless).run()
+        return
+
+    pacer = create_pacer(args.pacing, args.fps)
+    if args.replay:
+        screen_capture = ScreenCapture.from_replay(args.replay, pacer=pacer)
+    else:
+        screen_capture = ScreenCapture(pacer=pacer)
+    profiler_exporter = None
+    if args.stats_file or args.stats_port:
+        address = ("127.0.0.1", args.stats_port) if args.stats_port else None
+        profiler_exporter = ProfilerExporter(args.stats_file, address, args.stats_interval)
+    tracker = TrackerPuck(screen_capture, event_driven=not args.poll, profiler_exporter=profiler_exporter, headless=args.headless)
+    if args.startup_only:
+        tracker.controller.stop()
+        return
     tracker.start_tracking()
 
 if __name__ == "__main__":
@@ -0,0 +1,108 @@
+import cv2
+import functools
+import numpy as np
+
+
+# Lookup tables shared by all MaskColorLut instances, the least recently used one is dropped first (16 MB each)
+LUT_CACHE_SIZE = 4
+
+
+def _thresholds_key(lower: np.ndarray, upper: np.ndarray) -> bytes:
+    return np.asarray(lower, dtype=np.int64).tobytes() + np.asarray(upper, dtype=np.int64).tobytes()
+
+
+@functools.lru_cache(maxsize=LUT_CACHE_SIZE)
+def _build_lut(key: bytes) -> np.ndarray:
+    lower, upper = np.frombuffer(key, dtype=np.int64).reshape(2, -1)
+    # Little-endian bytes of the index are exactly its b, g, r components
+    colors = np.arange(1 << 24, dtype=np.uint32).view(np.uint8).reshape(4096, 4096, 4)
+    bgr = np.ascontiguousarray(colors[:, :, :3])
+    hsv = cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV)
+    return cv2.inRange(hsv, lower, upper).ravel()
+
+
+class MaskColor:
+    """Binary mask of the pixels within HSV thresholds, cleaned up with an opening and a closing
+
+    Kernel and output buffers are allocated once and reused while the image size stays the same.
+    """
+
+    def __init__(self):
+        self.kernel = np.ones((3, 3), np.uint8)
+        self._opened = None
+        self._mask = None
+
+    def threshold(self, image: np.ndarray, lower: np.ndarray, upper: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def compute(self, image: np.ndarray, lower: np.ndarray, upper: np.ndarray) -> np.ndarray:
+        """Return the cleaned up mask, valid until the next call"""
+        return self.clean(self.threshold(image, lower, upper))
+
+    def clean(self, mask: np.ndarray) -> np.ndarray:
+        """Open and close a thresholded mask, the result is valid until the next call"""
+        if self._mask is None or self._mask.shape != mask.shape:
+            self._opened = np.empty_like(mask)
+            self._mask = np.empty_like(mask)
+        cv2.morphologyEx(mask, cv2.MORPH_OPEN, self.kernel, dst=self._opened)
+        cv2.morphologyEx(self._opened, cv2.MORPH_CLOSE, self.kernel, dst=self._mask)
+        return self._mask
+
+
+class MaskColorHsv(MaskColor):
+    """Convert to HSV and threshold with inRange"""
+
+    def threshold(self, image: np.ndarray, lower: np.ndarray, upper: np.ndarray) -> np.ndarray:
+        hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+        return cv2.inRange(hsv, lower, upper)
+
+
+class MaskColorLut(MaskColor):
+    """Look every BGR color up in a precomputed 2^24 entry table, skipping the HSV conversion
+
+    The table is built once per thresholds and rebuilt when they change.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._key = None
+        self._lut = None
+        self._bgra = None
+        self._index = None
+        self._threshold = None
+
+    @staticmethod
+    def build_lut(lower: np.ndarray, upper: np.ndarray) -> np.ndarray:
+        """Mask value for every color, indexed by b | g << 8 | r << 16"""
+        return _build_lut(_thresholds_key(lower, upper))
+
+    def threshold(self, image: np.ndarray, lower: np.ndarray, upper: np.ndarray) -> np.ndarray:
+        key = _thresholds_key(lower, upper)
+        if key != self._key:
+            self._lut = self.build_lut(lower, upper)
+            self._key = key
+
+        height, width = image.shape[:2]
+        if self._threshold is None or self._threshold.shape != (height, width):
+            self._bgra = np.empty((height, width, 4), dtype=np.uint8)
+            # Native sized indices spare np.take a conversion
+            self._index = np.empty((height, width), dtype=np.intp)
+            self._threshold = np.empty((height, width), dtype=np.uint8)
+
+        # Pack every pixel into one 32 bit word and drop the alpha byte
+        cv2.cvtColor(image, cv2.COLOR_BGR2BGRA, dst=self._bgra)
+        np.bitwise_and(self._bgra.view(np.uint32)[:, :, 0], 0xFFFFFF, out=self._index)
+        np.take(self._lut, self._index, out=self._threshold, mode="wrap")
+        return self._threshold
+
+
+MASK_ENGINES = {
+    "hsv": MaskColorHsv,
+    "lut": MaskColorLut,
+}
+
+
+def create_mask_color(name: str) -> MaskColor:
+    if name not in MASK_ENGINES:
+        raise ValueError(f"Unknown mask engine: {name}")
+    return MASK_ENGINES[name]()
@@ -0,0 +1,88 @@
+import numpy as np
+import time
+from typing import Optional
+
+from profiler import Profiler
+
+
+STAGES = ("detection", "decision", "injection")
+# Latest latencies kept per stage
+LATENCY_WINDOW = 256
+# Lead time used until enough decisions or injections were measured (s)
+DEFAULT_LEAD_TIME = 0.05
+MIN_SAMPLES = 30
+# Percentile of the capture to injection latency the lead time follows
+LEAD_PERCENTILE = 75
+# The game still needs time to show the input, added on top of the measured latency (s)
+INPUT_LAG = 0.0
+MIN_LEAD_TIME = 0.0
+MAX_LEAD_TIME = 0.2
+
+
+class MonitorLatency:
+    """Rolling distribution of the time from screen capture to each later stage of a frame
+
+    Latencies are measured against the perf_counter_ns() capture timestamp of the frame,
+    so the capture to injection latency is the delay a prediction has to cover.
+    Only the moves of a save carry their capture time, so the time from queueing to
+    injecting any input is also kept, to add to the decision latency until then.
+    """
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.window = window
+        self.samples = {stage: np.zeros(window) for stage in STAGES}
+        self.counts = {stage: 0 for stage in STAGES}
+        self.injection_costs = np.zeros(window)
+        self.injection_cost_count = 0
+
+    def record(self, stage: str, capture_ns: int, now_ns: Optional[int] = None):
+        """Record that the frame captured at capture_ns reached the stage now"""
+        if now_ns is None:
+            now_ns = time.perf_counter_ns()
+        latency = (now_ns - capture_ns) / 1e9
+        self.samples[stage][self.counts[stage] % self.window] = latency
+        self.counts[stage] += 1
+        Profiler.record(f"latency.capture_to_{stage}", latency)
+
+    def record_injection_cost(self, seconds: float):
+        """Record the time an input command took from being queued to being injected"""
+        self.injection_costs[self.injection_cost_count % self.window] = seconds
+        self.injection_cost_count += 1
+
+    def injection_cost(self) -> float:
+        """Median time from queueing to injecting an input, 0 until any input was injected"""
+        count = min(self.injection_cost_count, self.window)
+        return float(np.median(self.injection_costs[:count])) if count else 0.0
+
+    def latencies(self, stage: str) -> np.ndarray:
+        return self.samples[stage][:min(self.counts[stage], self.window)].copy()
+
+    def percentile(self, stage: str, q: float) -> Optional[float]:
+        latencies = self.latencies(stage)
+        if len(latencies) == 0:
+            return None
+        return float(np.percentile(latencies, q))
+
+    def summary(self) -> dict[str, dict]:
+        return {
+            stage: {
+                "count": self.counts[stage],
+                "p50": self.percentile(stage, 50),
+                "p99": self.percentile(stage, 99),
+            }
+            for stage in STAGES
+        }
+
+    def lead_time(self) -> float:
+        """How far ahead of the captured frame to predict so that the input lands on the puck
+
+        Follows the measured capture to injection latency once there are enough samples,
+        before that the decision latency plus the cost of injecting an input.
+        """
+        if self.counts["injection"] >= MIN_SAMPLES:
+            latency = self.percentile("injection", LEAD_PERCENTILE)
+        elif self.counts["decision"] >= MIN_SAMPLES:
+            latency = self.percentile("decision", LEAD_PERCENTILE) + self.injection_cost()
+        else:
+            return DEFAULT_LEAD_TIME
+        return min(max(latency + INPUT_LAG, MIN_LEAD_TIME), MAX_LEAD_TIME)
@@ -0,0 +1,143 @@
+from dataclasses import dataclass
+import threading
+from typing import Optional
+
+from vector_motion import VectorMotion
+
+
+# Upper bound of the overlay refresh rate
+OVERLAY_FPS = 20
+# Anything drawn in this color is see-through
+TRANSPARENT_COLOR = "black"
+PANEL_COLOR = "#101010"
+CURRENT_COLOR = "#0000ff"
+PREDICTED_COLOR = "#00ffff"
+
+
+@dataclass(frozen=True)
+class OverlayState:
+    x: float
+    y: float
+    width: float
+    height: float
+    fps: float
+    motion_vector: Optional[VectorMotion] = None
+    pred_x: Optional[float] = None
+    pred_y: Optional[float] = None
+
+
+class OverlayDebug:
+    """Transparent on-screen overlay with tracking information, drawn by its own thread
+
+    The tracking thread only hands over the latest state, which is never blocking.
+    Closing the window only sets the closed event, the tracking thread checks it and stops
+    itself. Canvas items are created once and only the ones whose content changed are
+    moved or re-texted on refresh, the legend is static.
+    """
+
+    def __init__(self, legend: list[tuple[str, str, str]], fps: float = OVERLAY_FPS):
+        self.legend = legend
+        self.closed = threading.Event()
+        self.interval_ms = max(1, int(1000 / fps))
+        self.state: Optional[OverlayState] = None
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+
+    def submit(self, state: OverlayState):
+        """Hand the latest tracking state over to the overlay thread"""
+        self.state = state
+
+    def _run(self):
+        try:
+            self._create_window()
+        except Exception as e:
+            print(f"Failed to create overlay window: {e}")
+            self.running = False
+            return
+        self.drawn_state = None
+        self.drawn_text = None
+        self.window.after(self.interval_ms, self._refresh)
+        self.window.mainloop()
+
+    def _create_window(self):
+        """Create the transparent window with all canvas items"""
+        # Imported on the overlay thread, so a tracker without overlay never loads Tk
+        import tkinter as tk
+        self.window = tk.Tk()
+        self.window.attributes('-fullscreen', True)
+        self.window.attributes('-topmost', True)
+        self.window.attributes('-transparentcolor', TRANSPARENT_COLOR)
+        self.window.configure(bg=TRANSPARENT_COLOR)
+        self.window.overrideredirect(True)
+
+        self.canvas = tk.Canvas(self.window, bg=TRANSPARENT_COLOR, highlightthickness=0)
+        self.canvas.pack(fill='both', expand=True)
+
+        # Dynamic items start hidden and are only moved afterwards
+        self.current_item = self.canvas.create_oval(0, 0, 0, 0, outline=CURRENT_COLOR, width=3, state='hidden')
+        self.predicted_item = self.canvas.create_oval(0, 0, 0, 0, outline=PREDICTED_COLOR, width=3, state='hidden')
+        self.canvas.create_rectangle(10, 10, 300, 120, fill=PANEL_COLOR, outline='white')
+        self.stats_item = self.canvas.create_text(20, 20, anchor='nw', fill='white', font=('Arial', 10), text="")
+
+        # Static legend in the bottom-left corner
+        legend_y = self.window.winfo_screenheight() - 100
+        self.canvas.create_rectangle(10, legend_y, 260, legend_y + 80, fill=PANEL_COLOR, outline='')
+        for i, (color, color_name, description) in enumerate(self.legend):
+            y_pos = legend_y + 15 + i * 18
+            self.canvas.create_oval(16, y_pos - 4, 24, y_pos + 4, fill=color, outline='')
+            self.canvas.create_text(30, y_pos, anchor='w', fill='white', font=('Arial', 9), text=f"{color_name}: {description}")
+
+        close_btn = tk.Button(self.window, text="X", command=self._close, bg='red', fg='white', font=('Arial', 12))
+        self.canvas.create_window(self.window.winfo_screenwidth() - 50, 50, window=close_btn)
+        print("Overlay window created. Press the red 'X' button to stop tracking.")
+
+    def _close(self):
+        # Runs on the Tk thread, tracker state is left to the tracking thread
+        self.running = False
+        self.closed.set()
+
+    def _refresh(self):
+        if not self.running:
+            self.window.destroy()
+            return
+        state = self.state
+        if state is not None and state is not self.drawn_state:
+            try:
+                self._draw(state)
+            except Exception as e:
+                print(f"Overlay error: {e}")
+            self.drawn_state = state
+        self.window.after(self.interval_ms, self._refresh)
+
+    def _draw(self, state: OverlayState):
+        self._place_circle(self.current_item, state.x, state.y, 50)
+        if state.motion_vector and state.pred_x is not None and state.pred_y is not None:
+            self._place_circle(self.predicted_item, state.pred_x, state.pred_y, 8)
+        else:
+            self.canvas.itemconfigure(self.predicted_item, state='hidden')
+
+        info_lines = [
+            f"FPS: {state.fps:.1f}",
+            f"Position: ({int(state.x)}, {int(state.y)})",
+        ]
+        if state.motion_vector:
+            info_lines.append(f"Speed: {state.motion_vector.speed:.1f} px/s")
+            info_lines.append(f"Direction: ({state.motion_vector.dx:.1f}, {state.motion_vector.dy:.1f})")
+            if state.pred_x is not None and state.pred_y is not None:
+                info_lines.append(f"Predicted: ({int(state.pred_x)}, {int(state.pred_y)})")
+        text = "\n".join(info_lines)
+        if text != self.drawn_text:
+            self.canvas.itemconfigure(self.stats_item, text=text)
+            self.drawn_text = text
+
+    def _place_circle(self, item: int, x: float, y: float, radius: float):
+        self.canvas.coords(item, x - radius, y - radius, x + radius, y + radius)
+        self.canvas.itemconfigure(item, state='normal')
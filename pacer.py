@@ -0,0 +1,64 @@
+import time
+from typing import Optional
+
+
+class Pacer:
+    """Decides when the capture thread grabs the next frame"""
+
+    def wait(self):
+        """Block until the next frame should be grabbed"""
+        raise NotImplementedError
+
+
+class PacerFixed(Pacer):
+    """Grab at a fixed rate, a slow frame does not lower the rate of the following ones"""
+
+    def __init__(self, fps: float):
+        self.set_fps(fps)
+        self.next_time: Optional[float] = None
+
+    def set_fps(self, fps: float):
+        self.fps = fps
+        self.period = 1.0 / fps
+
+    def wait(self):
+        now = time.perf_counter()
+        if self.next_time is None:
+            self.next_time = now
+        self.next_time += self.period
+        if self.next_time <= now:
+            # Behind schedule, grab right away instead of bursting to catch up
+            self.next_time = now
+            return
+        time.sleep(self.next_time - now)
+
+
+class PacerVsync(Pacer):
+    """Grab on a fixed phase grid of the display refresh, skipping missed refreshes"""
+
+    def __init__(self, refresh_rate: float = 60.0, divisor: int = 1):
+        self.period = divisor / refresh_rate
+        self.epoch = time.perf_counter()
+
+    def wait(self):
+        now = time.perf_counter()
+        ticks = int((now - self.epoch) / self.period) + 1
+        time.sleep(self.epoch + ticks * self.period - now)
+
+
+class PacerUnlimited(Pacer):
+    """Grab as fast as possible"""
+
+    def wait(self):
+        # Let other threads take the GIL between grabs
+        time.sleep(0)
+
+
+def create_pacer(name: str, fps: float) -> Pacer:
+    if name == "fixed":
+        return PacerFixed(fps)
+    if name == "vsync":
+        return PacerVsync(fps)
+    if name == "unlimited":
+        return PacerUnlimited()
+    raise ValueError(f"Unknown pacing policy: {name}")
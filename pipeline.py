@@ -0,0 +1,372 @@
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+import os
+import time
+from typing import Optional
+
+from actuator import Actuator, InputBackendNull
+from controller import Controller
+from detector_puck import DetectorPuck
+from frame_buffer import Frame
+from frame_source import FrameSourceReplay, FrameSourceScreen
+from pacer import create_pacer
+from reacquirer_puck import ReacquirerPuck
+from screen_capture import ScreenCapture
+from settings_tracking import CAPTURE_MARGIN, CURRENT_POSITION_DT, INCREMENTAL_DETECTION, PYRAMID_REACQUISITION
+from tracker_multi import TrackerMulti
+
+
+FRAME_SLOTS = 4
+QUEUE_CAPACITY = 64
+# Sleep of a stage whose input queue is empty
+POLL_INTERVAL = 0.0005
+STATS_INTERVAL = 1.0
+
+# Shared counters, each one has a single writer
+COUNTER_RUNNING = 0
+COUNTER_CAPTURED = 1
+COUNTER_DETECTED = 2
+COUNTER_ACTED = 3
+COUNTER_DROPPED = 4
+COUNTER_LOST = 5
+COUNTER_DROPPED_CAPTURE = 6
+# Not a counter but a flag of the act stage, 1 while the Controller needs frames of the whole rink
+COUNTER_FULL_FRAME = 7
+COUNTER_NAMES = {
+    COUNTER_CAPTURED: "capture",
+    COUNTER_DETECTED: "detect",
+    COUNTER_ACTED: "act",
+}
+
+
+def _shared_memory(size: int, name: Optional[str]) -> shared_memory.SharedMemory:
+    """Create a new block, or attach to an existing one by name"""
+    if name is None:
+        return shared_memory.SharedMemory(create=True, size=size)
+    shm = shared_memory.SharedMemory(name=name)
+    if os.name == "posix":
+        # The creating process unlinks the block, keep the resource tracker of an attached process off it
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+class QueueShared:
+    """Single producer / single consumer ring queue of fixed-size records in shared memory
+
+    Head and tail only ever grow and each one has a single writer, so no locks are needed.
+    Pickling the queue passes only its name, a stage process attaches to the same block.
+    """
+
+    # Head and tail live on separate cache lines
+    _HEADER = 128
+
+    def __init__(self, capacity: int, record_size: int, dtype=np.int64, name: Optional[str] = None):
+        self.capacity = capacity
+        self.record_size = record_size
+        self.dtype = np.dtype(dtype)
+        self.shm = _shared_memory(self._HEADER + capacity * record_size * self.dtype.itemsize, name)
+        self._head = np.ndarray((1,), np.int64, self.shm.buf, 0)
+        self._tail = np.ndarray((1,), np.int64, self.shm.buf, self._HEADER // 2)
+        self._records = np.ndarray((capacity, record_size), self.dtype, self.shm.buf, self._HEADER)
+        if name is None:
+            self._head[0] = self._tail[0] = 0
+
+    def __reduce__(self):
+        return QueueShared, (self.capacity, self.record_size, self.dtype.str, self.shm.name)
+
+    def put(self, record) -> bool:
+        """Producer: append a record, False if the queue is full"""
+        tail = int(self._tail[0])
+        if tail - int(self._head[0]) >= self.capacity:
+            return False
+        self._records[tail % self.capacity] = record
+        self._tail[0] = tail + 1
+        return True
+
+    def get(self) -> Optional[np.ndarray]:
+        """Consumer: oldest record, None if the queue is empty"""
+        head = int(self._head[0])
+        if head == int(self._tail[0]):
+            return None
+        record = self._records[head % self.capacity].copy()
+        self._head[0] = head + 1
+        return record
+
+    def get_latest(self) -> tuple[Optional[np.ndarray], int]:
+        """Consumer: newest record and the number of older records skipped"""
+        head = int(self._head[0])
+        tail = int(self._tail[0])
+        if head == tail:
+            return None, 0
+        record = self._records[(tail - 1) % self.capacity].copy()
+        self._head[0] = tail
+        return record, tail - head - 1
+
+    def close(self, unlink: bool = False):
+        self._head = self._tail = self._records = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+class CountersShared:
+    """Small array of int64 counters in shared memory"""
+
+    def __init__(self, size: int = 8, name: Optional[str] = None):
+        self.size = size
+        self.shm = _shared_memory(size * 8, name)
+        self.values = np.ndarray((size,), np.int64, self.shm.buf)
+        if name is None:
+            self.values[:] = 0
+            self.values[COUNTER_RUNNING] = 1
+
+    def __reduce__(self):
+        return CountersShared, (self.size, self.shm.name)
+
+    def running(self) -> bool:
+        return bool(self.values[COUNTER_RUNNING])
+
+    def stop(self):
+        self.values[COUNTER_RUNNING] = 0
+
+    def increment(self, index: int, amount: int = 1):
+        self.values[index] += amount
+
+    def close(self, unlink: bool = False):
+        self.values = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+class FrameSlots:
+    """Ring of full-size frames in shared memory
+
+    A frame goes to slot sequence % slots. The slot header holds the sequence of the
+    frame in it, so a reader can tell whether the slot was overwritten while it was
+    still using the pixels.
+    """
+
+    # sequence, timestamp_ns, left, top, width, height
+    _HEADER_FIELDS = 8
+
+    def __init__(self, slots: int, height: int, width: int, name: Optional[str] = None):
+        self.slots = slots
+        self.height = height
+        self.width = width
+        header_size = slots * self._HEADER_FIELDS * 8
+        self.shm = _shared_memory(header_size + slots * height * width * 3, name)
+        self.headers = np.ndarray((slots, self._HEADER_FIELDS), np.int64, self.shm.buf)
+        self.images = np.ndarray((slots, height, width, 3), np.uint8, self.shm.buf, header_size)
+        if name is None:
+            self.headers[:] = 0
+
+    def __reduce__(self):
+        return FrameSlots, (self.slots, self.height, self.width, self.shm.name)
+
+    def write(self, frame: Frame):
+        """Copy the grabbed region of the frame into its slot"""
+        header = self.headers[frame.sequence % self.slots]
+        header[0] = -1
+        left, top, width, height = frame.region
+        self.images[frame.sequence % self.slots, top:top + height, left:left + width] = frame.image[top:top + height, left:left + width]
+        header[1:6] = (frame.timestamp_ns, left, top, width, height)
+        header[0] = frame.sequence
+
+    def read(self, sequence: int) -> Optional[Frame]:
+        """Frame with this sequence without copying it, None if it was already overwritten"""
+        slot = sequence % self.slots
+        header = self.headers[slot]
+        if header[0] != sequence:
+            return None
+        region = tuple(int(value) for value in header[2:6])
+        return Frame(self.images[slot], sequence, region, int(header[1]))
+
+    def valid(self, sequence: int) -> bool:
+        """Whether the frame with this sequence is still in its slot"""
+        return self.headers[sequence % self.slots, 0] == sequence
+
+    def close(self, unlink: bool = False):
+        self.headers = self.images = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+def run_capture_stage(replay: Optional[str], pacing: str, fps: float, frames: FrameSlots,
+                      frame_queue: QueueShared, region_queue: QueueShared, counters: CountersShared):
+    """Grab frames with ScreenCapture and publish them into the frame slots"""
+    source = FrameSourceReplay(replay) if replay else None
+    screen_capture = ScreenCapture(source=source, pacer=create_pacer(pacing, fps))
+    screen_capture.start_capture()
+    last_sequence = 0
+    while counters.running():
+        region, _ = region_queue.get_latest()
+        if region is not None:
+            # An empty region asks for the whole rink
+            screen_capture.set_region(tuple(int(value) for value in region) if region[2] > 0 else None)
+
+        frame = screen_capture.wait_frame(last_sequence)
+        if frame is None:
+            if not screen_capture.running:
+                break
+            continue
+        last_sequence = frame.sequence
+        frames.write(frame)
+        if not frame_queue.put((frame.sequence,)):
+            counters.increment(COUNTER_DROPPED_CAPTURE)
+        counters.increment(COUNTER_CAPTURED)
+    screen_capture.stop_capture()
+    counters.stop()
+
+
+def run_detect_stage(frames: FrameSlots, frame_queue: QueueShared, region_queue: QueueShared,
+                     detection_queue: QueueShared, counters: CountersShared):
+    """Detect the puck in the newest frame and steer the capture region"""
+    detector_puck = DetectorPuck()
+    reacquirer_puck = ReacquirerPuck(detector_puck, pyramid=PYRAMID_REACQUISITION, incremental=INCREMENTAL_DETECTION)
+    tracker_multi = TrackerMulti()
+    while counters.running():
+        message, skipped = frame_queue.get_latest()
+        if message is None:
+            time.sleep(POLL_INTERVAL)
+            continue
+        counters.increment(COUNTER_DROPPED, skipped)
+        frame = frames.read(int(message[0]))
+        if frame is None:
+            counters.increment(COUNTER_DROPPED)
+            continue
+
+        capture_time = frame.timestamp_ns / 1e9
+        check_marks, missed = reacquirer_puck.find(frame.image, frame.region, frame.timestamp_ns,
+                                                   lambda marks: tracker_multi.accounts_for_puck(marks, capture_time))
+        if not frames.valid(frame.sequence):
+            # Capture lapped the slots while the frame was being processed
+            counters.increment(COUNTER_DROPPED)
+            continue
+        if missed:
+            counters.increment(COUNTER_LOST)
+
+        puck_mark = tracker_multi.update(check_marks, capture_time)
+        if puck_mark is not None:
+            center_x, center_y, width, height, area = puck_mark
+            detector_puck.update_position((center_x, center_y), frame.timestamp_ns)
+            motion_vector = detector_puck.calculate_motion_vector()
+            if counters.values[COUNTER_FULL_FRAME]:
+                region_queue.put((0, 0, 0, 0))
+            else:
+                region_queue.put(ReacquirerPuck.capture_region((center_x, center_y), motion_vector, CAPTURE_MARGIN))
+            detection_queue.put((frame.sequence, 1, center_x, center_y, width, height, area, frame.timestamp_ns))
+        elif tracker_multi.puck_position(capture_time) is None:
+            region_queue.put((0, 0, 0, 0))
+            detection_queue.put((frame.sequence, 0, 0, 0, 0, 0, 0, frame.timestamp_ns))
+        counters.increment(COUNTER_DETECTED)
+
+
+def run_act_stage(frames: FrameSlots, detection_queue: QueueShared, counters: CountersShared, headless: bool = False):
+    """Feed detections into the motion history and let the Controller act on the newest one
+
+    While the Controller checks or detects the gate corners it gets a copy of the frame of the
+    newest detection, and the detect stage is asked for frames of the whole rink.
+    """
+    detector_puck = DetectorPuck()
+    if headless:
+        controller = Controller(detector_puck, Actuator(InputBackendNull()), hotkeys=False)
+    else:
+        controller = Controller(detector_puck)
+    while counters.running():
+        latest = None
+        while (record := detection_queue.get()) is not None:
+            # Every detection goes into the history, only the newest one is acted on
+            if record[1]:
+                detector_puck.update_position((float(record[2]), float(record[3])), int(record[7]))
+            latest = record
+        image, region = None, None
+        if latest is not None and controller.wants_full_frame():
+            frame = frames.read(int(latest[0]))
+            if frame is not None:
+                image, region = frame.image.copy(), frame.region
+                if not frames.valid(frame.sequence):
+                    # Capture lapped the slots during the copy
+                    image = None
+        controller.tick(image, region)
+        counters.values[COUNTER_FULL_FRAME] = controller.wants_full_frame()
+        if latest is None:
+            time.sleep(POLL_INTERVAL)
+            continue
+
+        motion_vector = detector_puck.calculate_motion_vector() if latest[1] else None
+        if motion_vector:
+            controller.do(motion_vector.predict_position((float(latest[2]), float(latest[3])), CURRENT_POSITION_DT))
+        elif not latest[1]:
+            controller.do()
+        counters.increment(COUNTER_ACTED)
+    controller.stop()
+
+
+class Pipeline:
+    """Capture, detection and actuation in separate processes connected through shared memory"""
+
+    def __init__(self, replay: Optional[str] = None, pacing: str = "fixed", fps: float = 60, headless: bool = False):
+        self.replay = replay
+        self.pacing = pacing
+        self.fps = fps
+        self.headless = headless
+        source = FrameSourceReplay(replay) if replay else FrameSourceScreen()
+        width, height = source.size()
+        source.close()
+
+        self.frames = FrameSlots(FRAME_SLOTS, height, width)
+        self.frame_queue = QueueShared(QUEUE_CAPACITY, 1, np.int64)
+        self.region_queue = QueueShared(QUEUE_CAPACITY, 4, np.int64)
+        self.detection_queue = QueueShared(QUEUE_CAPACITY, 8, np.float64)
+        self.counters = CountersShared()
+
+    def run(self):
+        """Run the stages until Ctrl+C or until the replay ends, printing per-stage throughput"""
+        processes = [
+            mp.Process(target=run_capture_stage, name="capture", daemon=True, args=(
+                self.replay, self.pacing, self.fps, self.frames, self.frame_queue, self.region_queue, self.counters)),
+            mp.Process(target=run_detect_stage, name="detect", daemon=True, args=(
+                self.frames, self.frame_queue, self.region_queue, self.detection_queue, self.counters)),
+            mp.Process(target=run_act_stage, name="act", daemon=True, args=(
+                self.frames, self.detection_queue, self.counters, self.headless)),
+        ]
+        for process in processes:
+            process.start()
+
+        print("Pipeline started, press Ctrl+C to stop")
+        start_time = time.time()
+        try:
+            last_values = self.counters.values.copy()
+            last_time = start_time
+            while self.counters.running() and all(process.is_alive() for process in processes):
+                time.sleep(STATS_INTERVAL)
+                values = self.counters.values.copy()
+                now = time.time()
+                print(self._format_stats(values, last_values, now - last_time))
+                last_values, last_time = values, now
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.counters.stop()
+            for process in processes:
+                process.join(timeout=2)
+                if process.is_alive():
+                    process.terminate()
+
+        values = self.counters.values.copy()
+        print("\nPipeline stopped. Totals:", self._format_stats(values, np.zeros_like(values), time.time() - start_time))
+        self.close()
+
+    @staticmethod
+    def _format_stats(values: np.ndarray, last_values: np.ndarray, elapsed: float) -> str:
+        rates = [f"{name} {(values[index] - last_values[index]) / elapsed:.1f}/s" for index, name in COUNTER_NAMES.items()]
+        dropped = values[COUNTER_DROPPED] + values[COUNTER_DROPPED_CAPTURE]
+        return " | ".join(rates) + f" | dropped {dropped} | lost {values[COUNTER_LOST]}"
+
+    def close(self):
+        for block in (self.frames, self.frame_queue, self.region_queue, self.detection_queue, self.counters):
+            block.close(unlink=True)
@@ -0,0 +1,165 @@
+from collections import defaultdict
+import csv
+import json
+import math
+import numpy as np
+import socket
+import threading
+import time
+from typing import Optional
+
+
+# Latest samples per stage kept for the rolling percentiles
+ROLLING_WINDOW = 1024
+# All-time histogram with log spaced buckets between 1 us and 100 s (about 5% wide)
+HISTOGRAM_MIN = 1e-6
+HISTOGRAM_MAX = 100.0
+HISTOGRAM_BUCKETS = 400
+_BUCKET_SCALE = HISTOGRAM_BUCKETS / math.log(HISTOGRAM_MAX / HISTOGRAM_MIN)
+
+
+class StageStats:
+    """Fixed-size statistics of one stage: all-time histogram plus a ring buffer of the latest samples
+
+    Plain lists keep add() cheap, they are only turned into arrays when summarized.
+    """
+
+    __slots__ = ("count", "total", "max", "histogram", "window")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.histogram = [0] * HISTOGRAM_BUCKETS
+        self.window = [0.0] * ROLLING_WINDOW
+
+    def add(self, value: float):
+        self.window[self.count % ROLLING_WINDOW] = value
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        if value <= HISTOGRAM_MIN:
+            bucket = 0
+        else:
+            bucket = min(int(math.log(value / HISTOGRAM_MIN) * _BUCKET_SCALE), HISTOGRAM_BUCKETS - 1)
+        self.histogram[bucket] += 1
+
+    def percentile(self, q: float) -> float:
+        """All-time percentile, upper edge of the histogram bucket it falls in"""
+        if self.count == 0:
+            return 0.0
+        bucket = int(np.searchsorted(np.cumsum(self.histogram), q / 100 * self.count))
+        bucket = min(bucket, HISTOGRAM_BUCKETS - 1)
+        return min(HISTOGRAM_MIN * math.exp((bucket + 1) / _BUCKET_SCALE), self.max)
+
+    def rolling(self) -> np.ndarray:
+        return np.array(self.window[:min(self.count, ROLLING_WINDOW)])
+
+    def summary(self) -> dict:
+        rolling = self.rolling()
+        rolling_p50, rolling_p99 = np.percentile(rolling, [50, 99]) if len(rolling) else (0.0, 0.0)
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "max": self.max,
+            "rolling_p50": float(rolling_p50),
+            "rolling_p99": float(rolling_p99),
+        }
+
+
+class Profiler:
+    start_time: float = None
+    tick_time: float = None
+    end_time: float = None
+
+    total_stats: dict[str, StageStats] = defaultdict(StageStats)
+
+    def __init__(self):
+        self.start()
+
+    def start(self):
+        # print("\nProfiler started")
+        self.start_time = time.perf_counter()
+        self.tick_time = self.start_time
+        self.end_time = None
+
+    def tick(self, msg: str):
+        new_tick_time = time.perf_counter()
+        # print(msg, new_tick_time - self.tick_time)
+        Profiler.total_stats[msg].add(new_tick_time - self.tick_time)
+        self.tick_time = new_tick_time
+
+    @classmethod
+    def record(cls, msg: str, value: float):
+        cls.total_stats[msg].add(value)
+
+    def end(self):
+        self.end_time = time.perf_counter()
+        # print(f"Profiler ended: {self.end_time - self.start_time}\n")
+        Profiler.total_stats["Profiler::__end__"].add(self.end_time - self.start_time)
+
+    @classmethod
+    def snapshot(cls) -> dict[str, dict]:
+        return {msg: stats.summary() for msg, stats in list(cls.total_stats.items())}
+
+    @classmethod
+    def print_total_stats(cls):
+        print("\nProfiler: total stats (ms)")
+        data = sorted(cls.snapshot().items(), key=lambda item: item[1]["mean"], reverse=True)
+        print(f"{'stage':<40} {'mean':>8} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8} {'count':>8}")
+        for msg, summary in data:
+            print(f"{msg:<40} " + " ".join(f"{summary[key] * 1000:>8.3f}" for key in ("mean", "p50", "p90", "p99", "max")) + f" {summary['count']:>8}")
+
+
+class ProfilerExporter:
+    """Periodically export Profiler stats to a JSON or CSV file and/or as JSON datagrams to a local UDP port"""
+
+    def __init__(self, path: Optional[str] = None, address: Optional[tuple[str, int]] = None, interval: float = 5.0):
+        self.path = path
+        self.address = address
+        self.interval = interval
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM) if address else None
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._export_loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop exporting, writing the final stats"""
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.export()
+
+    def _export_loop(self):
+        while not self.stop_event.wait(self.interval):
+            self.export()
+
+    def export(self):
+        snapshot = Profiler.snapshot()
+        timestamp = time.time()
+        try:
+            if self.path:
+                self._write_file(snapshot, timestamp)
+            if self.socket:
+                self.socket.sendto(json.dumps({"time": timestamp, "stats": snapshot}).encode(), self.address)
+        except OSError as e:
+            print(f"Profiler export error: {e}")
+
+    def _write_file(self, snapshot: dict[str, dict], timestamp: float):
+        if self.path.endswith(".csv"):
+            with open(self.path, "w", newline="") as f:
+                writer = csv.writer(f)
+                keys = ["count", "mean", "p50", "p90", "p99", "max", "rolling_p50", "rolling_p99"]
+                writer.writerow(["time", "stage"] + keys)
+                for msg, summary in snapshot.items():
+                    writer.writerow([timestamp, msg] + [summary[key] for key in keys])
+        else:
+            with open(self.path, "w") as f:
+                json.dump({"time": timestamp, "stats": snapshot}, f, indent=2)
@@ -0,0 +1,156 @@
+import cv2
+import numpy as np
+import time
+from typing import Callable, Optional
+
+from detector_incremental import DetectorIncremental
+from detector_puck import DetectorPuck
+from frame_source import Region
+from vector_motion import VectorMotion
+
+
+# Each level halves the resolution of the coarse search
+PYRAMID_LEVELS = 2
+TILE_SIZE = 256
+# Half size of the full resolution window a coarse candidate is refined in
+REFINE_HALF_SIZE = 24
+# Search window around the predicted position: covers this much time of motion plus its uncertainty
+MIN_SEARCH_HALF_SIZE = 60
+MAX_SEARCH_HALF_SIZE = 400
+SEARCH_LOOKAHEAD = 0.1
+# Reacquired marks closer than this to a mark of the search window are the same mark (px)
+SAME_MARK_DISTANCE = 4.0
+
+
+class ReacquirerPuck:
+    """Decide where to look for the puck and find it again once it is lost
+
+    The puck is first searched in a window around its predicted position. If that
+    misses, the grabbed region is scanned tile by tile, nearest to the predicted position first,
+    with a cheap threshold on a downsampled tile. Candidates are then confirmed
+    by the regular detector in a small full resolution window.
+    """
+
+    def __init__(self, detector: DetectorPuck, levels: int = PYRAMID_LEVELS, tile_size: int = TILE_SIZE, pyramid: bool = True,
+                 incremental: bool = False):
+        self.detector = detector
+        # Skips the unchanged parts of the search window, for the frames where the puck rests
+        self.window_detector = DetectorIncremental(detector) if incremental else detector
+        self.levels = levels
+        self.tile_size = tile_size
+        self.pyramid = pyramid
+
+    def find(self, image: np.ndarray, region: Region, timestamp_ns: Optional[int] = None,
+             accept: Optional[Callable[[list], bool]] = None) -> tuple[list, bool]:
+        """Detect check marks in the search window around the predicted position, scan the region if it misses
+
+        Returns the marks and whether the search window missed.
+        The window also misses when accept (e.g. TrackerMulti.accounts_for_puck) rejects its marks,
+        so a UI element inside the window does not hide the puck. Its marks are returned along
+        with the ones found in the region.
+        Only the region of the image is assumed to hold fresh pixels.
+        timestamp_ns is the perf_counter_ns() capture time of the image, now by default.
+        """
+        check_marks = []
+        position = self.detector.last_position()
+        motion = None
+        dt = 0.0
+        if position is not None:
+            motion = self.detector.calculate_motion_vector()
+            if timestamp_ns is None:
+                timestamp_ns = time.perf_counter_ns()
+            dt = (timestamp_ns - self.detector.history.last_time_ns()) / 1e9
+            bounds_lu, bounds_rd = self.search_window(position, motion, dt)
+            check_marks = self.window_detector.detect_check_marks(image, bounds_lu, bounds_rd)
+        if check_marks and (accept is None or accept(check_marks)):
+            return check_marks, False
+
+        if self.pyramid:
+            return check_marks + self.reacquire(image, region, position, motion, dt, exclude=check_marks), True
+        left, top, width, height = region
+        return self.detector.detect_check_marks(image, (left, top), (left + width, top + height)), True
+
+    @classmethod
+    def capture_region(cls, position: tuple[float, float], motion: Optional[VectorMotion] = None, margin: int = 0) -> Region:
+        """Screen region to grab so that the next search window is covered"""
+        (left, top), (right, bottom) = cls.search_window(position, motion)
+        return (left - margin, top - margin, right - left + 2 * margin, bottom - top + 2 * margin)
+
+    @staticmethod
+    def search_window(position: tuple[float, float], motion: Optional[VectorMotion] = None,
+                      dt: float = 0.0) -> tuple[tuple[int, int], tuple[int, int]]:
+        """Bounds of the search window around the position predicted dt seconds ahead"""
+        half_size = MIN_SEARCH_HALF_SIZE
+        if motion is not None:
+            position = motion.predict_position(position, dt)
+            half_size += (motion.speed + 3 * motion.velocity_std()) * SEARCH_LOOKAHEAD
+        half_size = int(min(half_size, MAX_SEARCH_HALF_SIZE))
+        x, y = int(position[0]), int(position[1])
+        return (x - half_size, y - half_size), (x + half_size, y + half_size)
+
+    def reacquire(self, image: np.ndarray, region: Region, position: Optional[tuple[float, float]] = None,
+                  motion: Optional[VectorMotion] = None, dt: float = 0.0, exclude: Optional[list] = None) -> list:
+        """Detect check marks in region of the image, searching near the predicted position first
+
+        Marks at the positions of the exclude marks are already known and skipped.
+        """
+        excluded = np.array([mark[:2] for mark in exclude or []], dtype=np.float64).reshape(-1, 2)
+        left, top, width, height = region
+        if position is None:
+            target = np.array([left + width / 2, top + height / 2])
+        elif motion is None:
+            target = np.array(position)
+        else:
+            target = np.array(motion.predict_position(position, dt))
+
+        for tile_left, tile_top, tile_right, tile_bottom in self._tiles(region, target):
+            tile = image[tile_top:tile_bottom, tile_left:tile_right]
+            candidates = self._coarse_candidates(tile)
+            if len(candidates) == 0:
+                continue
+            candidates += (tile_left, tile_top)
+            order = np.argsort(np.hypot(*(candidates - target).T))
+            for center_x, center_y in candidates[order]:
+                marks = self.detector.detect_check_marks(
+                    image,
+                    (max(left, int(center_x) - REFINE_HALF_SIZE), max(top, int(center_y) - REFINE_HALF_SIZE)),
+                    (min(left + width, int(center_x) + REFINE_HALF_SIZE), min(top + height, int(center_y) + REFINE_HALF_SIZE)),
+                )
+                if len(excluded):
+                    marks = [mark for mark in marks
+                             if np.hypot(*(excluded - mark[:2]).T).min() > SAME_MARK_DISTANCE]
+                if marks:
+                    return marks
+        return []
+
+    def _tiles(self, region: Region, target: np.ndarray) -> list[tuple[int, int, int, int]]:
+        """Tiles covering the region, nearest to the target first"""
+        left, top, width, height = region
+        xs = np.arange(left, left + width, self.tile_size)
+        ys = np.arange(top, top + height, self.tile_size)
+        if len(xs) == 0 or len(ys) == 0:
+            return []
+        grid_x, grid_y = np.meshgrid(xs, ys)
+        grid_x, grid_y = grid_x.ravel(), grid_y.ravel()
+        centers_x = grid_x + np.minimum(self.tile_size, left + width - grid_x) / 2
+        centers_y = grid_y + np.minimum(self.tile_size, top + height - grid_y) / 2
+        order = np.argsort(np.hypot(centers_x - target[0], centers_y - target[1]))
+        return [
+            (int(x), int(y), int(min(x + self.tile_size, left + width)), int(min(y + self.tile_size, top + height)))
+            for x, y in zip(grid_x[order], grid_y[order])
+        ]
+
+    def _coarse_candidates(self, tile: np.ndarray) -> np.ndarray:
+        """Full resolution centers (relative to the tile) of yellow blobs in the downsampled tile"""
+        scale = 1 << self.levels
+        small_width, small_height = tile.shape[1] // scale, tile.shape[0] // scale
+        if small_width == 0 or small_height == 0:
+            return np.empty((0, 2))
+        small = cv2.resize(tile, (small_width, small_height), interpolation=cv2.INTER_AREA)
+        hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+        mask = cv2.inRange(hsv, self.detector.low_res_lower_yellow(), self.detector.upper_yellow)
+        if not mask.any():
+            return np.empty((0, 2))
+        count, _, _, centroids = cv2.connectedComponentsWithStats(mask, connectivity=8)
+        # Label 0 is the background
+        return (centroids[1:count] + 0.5) * scale
@@ -0,0 +1,266 @@
+import argparse
+import glob
+import os
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+
+from frame_source import Region
+from vector_motion import VectorMotion
+
+
+RECORD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "recordings")
+# Every session records into a new file, only the newest ones are kept
+KEEP_RECORDINGS = 20
+# Records kept in the ring, about 18 minutes at 60 FPS
+RECORD_CAPACITY = 1 << 16
+# Detections stored per frame, the rest is only counted
+MAX_MARKS = 4
+# Seconds between flushes of the memory-mapped ring to disk
+FLUSH_INTERVAL = 1.0
+# Crops around the puck kept in memory for save_crops, as frames of CROP_SIZE x CROP_SIZE pixels
+CROP_FRAMES = 600
+CROP_SIZE = 96
+# Controller decisions, stored by index
+ACTIONS = ("none", "disabled", "idle", "uncertain", "cooldown", "save", "cancel")
+RECORD_DTYPE = np.dtype([
+    # 0 marks an empty slot, frame sequences start at 1
+    ("sequence", np.int64),
+    ("capture_ns", np.int64),
+    # Grabbed region as (left, top, width, height)
+    ("region", np.int32, 4),
+    ("mark_count", np.int16),
+    # (x, y, width, height, area) of the first MAX_MARKS detections
+    ("marks", np.float32, (MAX_MARKS, 5)),
+    # Position the tracker chose as the puck, nan if none
+    ("position", np.float32, 2),
+    # dx, dy and speed of the motion vector, nan if none
+    ("motion", np.float32, 3),
+    # xx, xy and yy of the velocity covariance, nan if none or unknown
+    ("covariance", np.float32, 3),
+    # Crease impact as x, y and time to impact, nan if not computed
+    ("impact", np.float32, 3),
+    ("on_segment", np.bool_),
+    ("action", np.uint8),
+])
+
+_NAN2 = (np.nan, np.nan)
+_NAN3 = (np.nan, np.nan, np.nan)
+_NO_MARKS = np.full((MAX_MARKS, 5), np.nan, dtype=np.float32)
+
+
+class RecorderFlight:
+    """Always-on recording of the per-frame tracking state into a memory-mapped ring
+
+    A record is a single structured array assignment into the page cache, a background
+    thread flushes the ring to disk. Small crops around the puck are kept in memory
+    and only written out when asked for, to look at the frames before a missed save.
+    """
+
+    def __init__(self, path: Optional[str] = None, capacity: int = RECORD_CAPACITY, crop_frames: int = CROP_FRAMES,
+                 crop_size: int = CROP_SIZE, flush_interval: float = FLUSH_INTERVAL):
+        """Records into path, a new session file in RECORD_DIR by default"""
+        if path is None:
+            path = session_path()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.records = np.lib.format.open_memmap(path, mode="w+", dtype=RECORD_DTYPE, shape=(capacity,))
+        self.index = 0
+        self.crop_size = crop_size
+        self.crops = np.zeros((crop_frames, crop_size, crop_size, 3), dtype=np.uint8)
+        # Sequence, capture time and top left corner of every crop
+        self.crop_info = np.zeros((crop_frames, 4), dtype=np.int64)
+        self.crop_index = 0
+        self.flush_interval = flush_interval
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self._flush_loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.records.flush()
+
+    def record(self, sequence: int, capture_ns: int, region: Region, marks: list,
+               position: Optional[tuple[float, float]] = None, motion: Optional[VectorMotion] = None,
+               impact: Optional[tuple[float, float, float, bool]] = None, action: str = "none"):
+        """Append the state of one frame, overwriting the oldest record once the ring is full"""
+        stored = _NO_MARKS
+        if marks:
+            stored = _NO_MARKS.copy()
+            stored[:min(len(marks), MAX_MARKS)] = marks[:MAX_MARKS]
+        covariance = motion.covariance if motion is not None else None
+        # A single assignment of the whole record, the eigenvalues of the covariance are left to the analysis
+        self.records[self.index % len(self.records)] = (
+            sequence,
+            capture_ns,
+            region,
+            len(marks),
+            stored,
+            position if position is not None else _NAN2,
+            (motion.dx, motion.dy, motion.speed) if motion is not None else _NAN3,
+            (covariance[0, 0], covariance[0, 1], covariance[1, 1]) if covariance is not None else _NAN3,
+            impact[:3] if impact is not None else _NAN3,
+            impact is not None and impact[3],
+            ACTIONS.index(action),
+        )
+        self.index += 1
+
+    def record_crop(self, sequence: int, capture_ns: int, image: np.ndarray, center: tuple[float, float]):
+        """Keep the pixels around center, the part outside of the image stays black"""
+        slot = self.crop_index % len(self.crops)
+        half = self.crop_size // 2
+        left, top = int(center[0]) - half, int(center[1]) - half
+        x0, y0 = max(0, left), max(0, top)
+        x1, y1 = min(image.shape[1], left + self.crop_size), min(image.shape[0], top + self.crop_size)
+        crop = self.crops[slot]
+        if x0 > left or y0 > top or x1 < left + self.crop_size or y1 < top + self.crop_size:
+            crop[:] = 0
+        if x1 > x0 and y1 > y0:
+            crop[y0 - top:y1 - top, x0 - left:x1 - left] = image[y0:y1, x0:x1]
+        self.crop_info[slot] = (sequence, capture_ns, left, top)
+        self.crop_index += 1
+
+    def save_crops(self, path: Optional[str] = None, seconds: Optional[float] = None) -> str:
+        """Write the kept crops of the last seconds (all by default) to an .npz file, oldest first"""
+        path, crops = self._select_crops(path, seconds)
+        np.savez(path, **crops)
+        return path
+
+    def save_crops_async(self, path: Optional[str] = None, seconds: Optional[float] = None) -> threading.Thread:
+        """Like save_crops, but only copies the crops on the calling thread and writes them in the background
+
+        The returned thread has the path as its name.
+        """
+        path, crops = self._select_crops(path, seconds)
+
+        def write():
+            np.savez(path, **crops)
+            print(f"Saved recent frames to {path}")
+        thread = threading.Thread(target=write, name=path)
+        thread.start()
+        return thread
+
+    def _select_crops(self, path: Optional[str], seconds: Optional[float]) -> tuple[str, dict[str, np.ndarray]]:
+        """Output path and copies of the crops to save"""
+        count = min(self.crop_index, len(self.crops))
+        order = (np.arange(self.crop_index - count, self.crop_index)) % len(self.crops)
+        if seconds is not None and count:
+            capture_ns = self.crop_info[order, 1]
+            order = order[capture_ns >= capture_ns[-1] - int(seconds * 1e9)]
+        if path is None:
+            path = os.path.join(os.path.dirname(os.path.abspath(self.path)), f"crops_{time.strftime('%Y%m%d_%H%M%S')}.npz")
+        # Fancy indexing copies, so the ring can be overwritten while the copies are written
+        return path, {"crops": self.crops[order], "sequence": self.crop_info[order, 0],
+                      "capture_ns": self.crop_info[order, 1], "origin": self.crop_info[order, 2:]}
+
+    def _flush_loop(self):
+        while not self.stopped.wait(self.flush_interval):
+            self.records.flush()
+
+
+def recordings(directory: str = RECORD_DIR) -> list[str]:
+    """Flight recordings in the directory, oldest first"""
+    return sorted(glob.glob(os.path.join(directory, "flight_*.npy")))
+
+
+def session_path(directory: str = RECORD_DIR, keep: int = KEEP_RECORDINGS) -> str:
+    """Path of a new recording, deleting the oldest ones so that at most keep remain with it"""
+    # Sessions started within the same second get a counter, an existing recording is never reused
+    stamp = time.strftime("%Y%m%d_%H%M%S")
+    path = os.path.join(directory, f"flight_{stamp}.npy")
+    count = 1
+    while os.path.exists(path):
+        path = os.path.join(directory, f"flight_{stamp}_{count:02d}.npy")
+        count += 1
+    old = recordings(directory)
+    for old_path in old[:max(0, len(old) - keep + 1)]:
+        try:
+            os.remove(old_path)
+        except OSError as e:
+            print(f"Failed to delete old flight recording {old_path}: {e}")
+    return path
+
+
+def load_records(path: Optional[str] = None) -> np.ndarray:
+    """Records of a flight recording in frame order, empty slots dropped, the newest recording by default"""
+    if path is None:
+        paths = recordings()
+        if not paths:
+            raise FileNotFoundError(f"No flight recordings in {RECORD_DIR}")
+        path = paths[-1]
+    records = np.load(path, mmap_mode="r")
+    records = records[records["sequence"] > 0]
+    return np.array(records[np.argsort(records["sequence"], kind="stable")])
+
+
+def load_crops(path: str) -> dict[str, np.ndarray]:
+    with np.load(path) as data:
+        return {name: data[name] for name in data.files}
+
+
+def velocity_std(records: np.ndarray) -> np.ndarray:
+    """VectorMotion.velocity_std of every record, from its covariance"""
+    xx, xy, yy = records["covariance"].astype(np.float64).T
+    return np.sqrt((xx + yy) / 2 + np.sqrt(((xx - yy) / 2) ** 2 + xy ** 2))
+
+
+def summarize(records: np.ndarray) -> dict:
+    if len(records) == 0:
+        return {"frames": 0}
+    capture_ns = records["capture_ns"]
+    tracked = ~np.isnan(records["position"][:, 0])
+    return {
+        "frames": len(records),
+        "seconds": float((capture_ns[-1] - capture_ns[0]) / 1e9),
+        "dropped": int(records["sequence"][-1] - records["sequence"][0] + 1 - len(records)),
+        "tracked": float(tracked.mean()),
+        "no_detection": int(np.count_nonzero(records["mark_count"] == 0)),
+        "several_detections": int(np.count_nonzero(records["mark_count"] > 1)),
+        "actions": {ACTIONS[code]: int(count) for code, count in zip(*np.unique(records["action"], return_counts=True))},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize a flight recording or export it as CSV")
+    parser.add_argument("path", nargs="?", help="Flight recording, the newest one by default")
+    parser.add_argument("--csv", help="Write one row per frame to this CSV file")
+    args = parser.parse_args()
+
+    records = load_records(args.path)
+    for name, value in summarize(records).items():
+        print(f"{name:>20}: {value}")
+    if args.csv:
+        columns = {
+            "sequence": records["sequence"],
+            "capture_ns": records["capture_ns"],
+            "left": records["region"][:, 0],
+            "top": records["region"][:, 1],
+            "width": records["region"][:, 2],
+            "height": records["region"][:, 3],
+            "marks": records["mark_count"],
+            "x": records["position"][:, 0],
+            "y": records["position"][:, 1],
+            "dx": records["motion"][:, 0],
+            "dy": records["motion"][:, 1],
+            "speed": records["motion"][:, 2],
+            "velocity_std": velocity_std(records),
+            "impact_x": records["impact"][:, 0],
+            "impact_y": records["impact"][:, 1],
+            "time_to_impact": records["impact"][:, 2],
+            "on_segment": records["on_segment"],
+            "action": np.array(ACTIONS)[records["action"]],
+        }
+        table = np.rec.fromarrays(list(columns.values()), names=list(columns))
+        np.savetxt(args.csv, table, delimiter=",", header=",".join(columns), comments="", fmt="%s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+import threading
+import time
+from typing import Callable, Hashable, Optional
+
+from profiler import Profiler
+
+
+# Sleep until this long before the deadline, then spin for the precise instant
+SPIN_THRESHOLD = 0.002
+
+
+class Scheduler:
+    """Fire actions at perf_counter() instants from a dedicated thread
+
+    Actions are keyed: scheduling a key again re-targets its pending action.
+    The thread sleeps on a condition until shortly before the earliest deadline and
+    spins through the rest, so actions fire within a fraction of a millisecond
+    instead of at the OS sleep granularity.
+    """
+
+    def __init__(self):
+        self.actions: dict[Hashable, tuple[float, Callable[[], None]]] = {}
+        self.condition = threading.Condition()
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._schedule_loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.actions.clear()
+            self.condition.notify()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+
+    def schedule(self, key: Hashable, when: float, action: Callable[[], None]):
+        """Fire action at perf_counter() time when, replacing the pending action of the key"""
+        with self.condition:
+            self.actions[key] = (when, action)
+            self.condition.notify()
+
+    def cancel(self, key: Hashable):
+        with self.condition:
+            if self.actions.pop(key, None) is not None:
+                self.condition.notify()
+
+    def pending(self, key: Hashable) -> bool:
+        with self.condition:
+            return key in self.actions
+
+    def next_deadline(self) -> Optional[float]:
+        """perf_counter() time of the earliest pending action, None if there is none"""
+        with self.condition:
+            return min((when for when, _ in self.actions.values()), default=None)
+
+    def run_due(self):
+        """Fire the actions whose time has come on the calling thread, for driving a scheduler which was not started"""
+        now = time.perf_counter()
+        with self.condition:
+            due = sorted((when, key) for key, (when, _) in self.actions.items() if when <= now)
+            due = [(key, when, self.actions.pop(key)[1]) for when, key in due]
+        for key, when, action in due:
+            self._fire(key, when, action)
+
+    def _schedule_loop(self):
+        while True:
+            with self.condition:
+                if not self.running:
+                    return
+                if not self.actions:
+                    self.condition.wait()
+                    continue
+                key = min(self.actions, key=lambda k: self.actions[k][0])
+                when, action = self.actions[key]
+                remaining = when - time.perf_counter()
+                if remaining > SPIN_THRESHOLD:
+                    self.condition.wait(remaining - SPIN_THRESHOLD)
+                    continue
+                if remaining > 0:
+                    action = None
+                else:
+                    del self.actions[key]
+            if action is None:
+                # Spin outside the lock, so a re-target is still picked up
+                time.sleep(0)
+                continue
+            self._fire(key, when, action)
+
+    def _fire(self, key: Hashable, when: float, action: Callable[[], None]):
+        Profiler.record("scheduler.lateness", time.perf_counter() - when)
+        try:
+            action()
+        except Exception as e:
+            print(f"Scheduled action {key} failed: {e}")
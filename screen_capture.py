@@ -1,21 +1,42 @@
-import cv2
-import numpy as np
-import pyautogui
 import threading
 import time
 from typing import Optional
 
+from frame_buffer import Frame, FrameBufferTriple
+from frame_source import FrameSource, FrameSourceReplay, FrameSourceScreen, Region, clamp_region
+from pacer import Pacer, PacerFixed
+
+
+# Rectangle of the screen containing the rink, None to capture the whole screen
+RINK_REGION: Optional[Region] = None
+
 
 class ScreenCapture:
-    def __init__(self, target_fps: int = 30):
-        self.update_target_fps(target_fps)
-        self.current_frame = None
-        self.lock = threading.Lock()
+    def __init__(self, target_fps: int = 30, source: Optional[FrameSource] = None, rink_region: Optional[Region] = RINK_REGION,
+                 pacer: Optional[Pacer] = None):
+        self.target_fps = target_fps
+        self.pacer = pacer if pacer is not None else PacerFixed(target_fps)
+        self.source = source if source is not None else FrameSourceScreen()
+        self.width, self.height = self.source.size()
+        self.rink_region = clamp_region(rink_region, self.width, self.height)
+        self.region = None
+        self.frames = FrameBufferTriple((self.height, self.width, 3))
+        self.new_frame = threading.Event()
         self.running = False
 
+    @classmethod
+    def from_replay(cls, path: str, target_fps: int = 30, loop: bool = False, pacer: Optional[Pacer] = None) -> "ScreenCapture":
+        """Create a capture which replays a video file instead of grabbing the screen"""
+        return cls(target_fps, FrameSourceReplay(path, loop), pacer=pacer)
+
     def update_target_fps(self, target_fps: int):
         self.target_fps = target_fps
-        self.frame_delay = 1.0 / target_fps
+        if isinstance(self.pacer, PacerFixed):
+            self.pacer.set_fps(target_fps)
+
+    def set_region(self, region: Optional[Region]):
+        """Grab only this region from the next frame on, None to grab the whole rink"""
+        self.region = region
 
     def start_capture(self):
         """Start screen capture in a separate thread"""
@@ -31,23 +52,44 @@ class ScreenCapture:
     def _capture_loop(self):
         """Main capture loop running in separate thread"""
         while self.running:
-            start_time = time.time()
-
-            # Capture screen
-            screenshot = pyautogui.screenshot()
-            frame = np.array(screenshot)
-            frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-
-            # Update current frame
-            with self.lock:
-                self.current_frame = frame
-
-            # Maintain target FPS
-            elapsed = time.time() - start_time
-            sleep_time = max(0, self.frame_delay - elapsed)
-            time.sleep(sleep_time)
-
-    def get_frame(self) -> Optional[np.ndarray]:
-        """Get the current frame"""
-        with self.lock:
-            return self.current_frame.copy() if self.current_frame is not None else None
+            if not self.capture_once():
+                self.running = False
+                break
+            self.pacer.wait()
+        self.source.close()
+        self.new_frame.set()
+
+    def capture_once(self) -> bool:
+        """Grab and publish one frame, False if the source has no frames left"""
+        # Capture screen
+        region = self.region
+        region = self.rink_region if region is None else clamp_region(region, self.width, self.height)
+        timestamp_ns = time.perf_counter_ns()
+        if not self.source.grab(self.frames.back(), region):
+            return False
+
+        # Update current frame and wake up the consumer
+        self.frames.publish(region, timestamp_ns)
+        self.new_frame.set()
+        return True
+
+    def get_frame(self) -> Optional[Frame]:
+        """Get the newest frame without copying it
+
+        The frame is only valid until the next call, compare its sequence
+        with the previous one to skip frames which were already processed.
+        """
+        return self.frames.latest()
+
+    def wait_frame(self, last_sequence: int, timeout: float = 0.1) -> Optional[Frame]:
+        """Block until a frame newer than last_sequence is published, None on timeout or when capture stopped"""
+        deadline = time.perf_counter() + timeout
+        while True:
+            # Clear before looking, so a publish right after the check still wakes us up
+            self.new_frame.clear()
+            frame = self.frames.latest()
+            if frame is not None and frame.sequence != last_sequence:
+                return frame
+            remaining = deadline - time.perf_counter()
+            if not self.running or remaining <= 0 or not self.new_frame.wait(remaining):
+                return None
@@ -0,0 +1,13 @@
+# Tuning shared by the single-process tracker and the pipeline, kept free of GUI and input imports
+# so the pipeline workers only load what they use
+
+CURRENT_POSITION_DT = 0.05
+# Predict as far ahead as the measured capture to input latency instead of CURRENT_POSITION_DT
+AUTO_LEAD_TIME = True
+# Search a downsampled pyramid tile by tile instead of the whole frame when the puck is lost
+PYRAMID_REACQUISITION = True
+# Margin of the screen region grabbed around the next search window
+CAPTURE_MARGIN = 100
+# Reuse the detections of the search window parts which did not change since the last frame. Only pays off
+# while the window stays put, it follows a moving puck and then costs more than detecting it whole
+INCREMENTAL_DETECTION = False
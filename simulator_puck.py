@@ -0,0 +1,311 @@
+import argparse
+from contextlib import contextmanager, nullcontext, redirect_stdout
+from dataclasses import dataclass
+import importlib
+import io
+import math
+import time
+from typing import Iterator, Optional
+
+import numpy as np
+
+from actuator import InputBackendRecording
+import controller
+from detector_incremental import DetectorIncremental
+from detector_puck import PUCK_DELTA
+from frame_source import FrameSource, Region
+from pacer import PacerUnlimited
+from screen_capture import ScreenCapture
+from synthetic import render_check_mark, synthetic_frame
+from tracker_puck import TrackerPuck
+
+
+# Size of the simulated screen
+SCREEN_SIZE = (1920, 1080)
+# Crease the simulated goalie defends, the default manual corners of the controller
+CREASE = ((200, 450), (200, 700))
+SIMULATION_FPS = 60
+# Shots start in this part of the rink, as (left, top, right, bottom)
+SHOT_AREA = (900, 100, 1800, 980)
+# Puck speed range of the shots (px/s)
+SHOT_SPEED = (400.0, 1200.0)
+# Keep simulating this long after the puck reached the crease, so a late save still shows up (s)
+AFTER_IMPACT = 0.1
+# Speed of the goalie following the cursor (px/s)
+GOALIE_SPEED = 3000.0
+# The goalie stops a puck passing at most this far from it (px)
+SAVE_RADIUS = 30.0
+# A block started at most this long before the impact is still up when the puck arrives (s)
+BLOCK_WINDOW = 0.2
+# Modules of the tracking stack whose time module is replaced by the simulation clock,
+# the profiler keeps measuring real durations
+CLOCK_MODULES = ("actuator", "controller", "detector_puck", "monitor_latency", "reacquirer_puck", "scheduler",
+                 "screen_capture", "tracker_puck")
+
+
+class ClockVirtual:
+    """Stand-in for the time module which jumps over the idle time between events
+
+    Between two jumps it runs at the speed of the real clock, so the time spent
+    processing a frame still delays the input it leads to.
+    """
+
+    def __init__(self, start_ns: int = 0):
+        self._base_ns = start_ns
+        self._anchor_ns = time.perf_counter_ns()
+
+    def perf_counter_ns(self) -> int:
+        return self._base_ns + time.perf_counter_ns() - self._anchor_ns
+
+    def perf_counter(self) -> float:
+        return self.perf_counter_ns() / 1e9
+
+    def time(self) -> float:
+        return self.perf_counter()
+
+    def sleep(self, seconds: float):
+        pass
+
+    def advance_to(self, timestamp_ns: int):
+        """Jump to timestamp_ns, a time in the past is ignored"""
+        if timestamp_ns > self.perf_counter_ns():
+            self._base_ns = timestamp_ns
+            self._anchor_ns = time.perf_counter_ns()
+
+    @contextmanager
+    def installed(self, modules: tuple[str, ...] = CLOCK_MODULES) -> Iterator["ClockVirtual"]:
+        """Replace the time module of the modules by this clock until the context exits"""
+        modules = [importlib.import_module(name) for name in modules]
+        previous = [module.time for module in modules]
+        for module in modules:
+            module.time = self
+        try:
+            yield self
+        finally:
+            for module, original in zip(modules, previous):
+                module.time = original
+
+
+class FrameSourceSimulator(FrameSource):
+    """Ice colored screen with the check mark of the simulated puck, rendered only inside the grabbed region"""
+
+    def __init__(self, size: tuple[int, int] = SCREEN_SIZE, mark_width: float = 10.0):
+        self.width, self.height = size
+        self.mark_width = mark_width
+        self.background = synthetic_frame(self.width, self.height)
+        # Center of the check mark, None while there is no puck
+        self.mark: Optional[tuple[float, float]] = None
+
+    def size(self) -> tuple[int, int]:
+        return self.width, self.height
+
+    def grab(self, frame: np.ndarray, region: Region) -> bool:
+        left, top, width, height = region
+        view = frame[top:top + height, left:left + width]
+        np.copyto(view, self.background[top:top + height, left:left + width])
+        if self.mark is not None:
+            x, y = self.mark
+            if left - self.mark_width <= x < left + width + self.mark_width and top - self.mark_width <= y < top + height + self.mark_width:
+                render_check_mark(view, (x - left, y - top), self.mark_width)
+        return True
+
+
+@dataclass(frozen=True)
+class Shot:
+    start: tuple[float, float]
+    # Point of the crease the puck crosses
+    target: tuple[float, float]
+    speed: float
+
+    def duration(self) -> float:
+        return math.dist(self.start, self.target) / self.speed
+
+    def position(self, t: float) -> tuple[float, float]:
+        """Puck position t seconds after the shot"""
+        a = t / self.duration()
+        return (self.start[0] + (self.target[0] - self.start[0]) * a, self.start[1] + (self.target[1] - self.start[1]) * a)
+
+
+@dataclass(frozen=True)
+class ShotResult:
+    shot: Shot
+    # Goalie within SAVE_RADIUS of the puck when it reached the crease
+    reached: bool
+    # Block fired within BLOCK_WINDOW before the impact
+    blocked: bool
+    # Distance between goalie and puck at the impact (px)
+    miss_distance: float
+    # Time from the shot until the cursor was sent within SAVE_RADIUS of the impact, None if never (s)
+    reaction_time: Optional[float]
+    # Time of the last block relative to the impact, None without a block (s)
+    block_offset: Optional[float]
+
+    @property
+    def saved(self) -> bool:
+        return self.reached and self.blocked
+
+
+class SimulatorPuck:
+    """Closed loop simulation of shots on the crease, played against the unmodified tracking stack
+
+    Frames are rendered on demand and handed to TrackerPuck.process_frame, the controller's
+    input goes to a recording backend which moves a simulated goalie. The scheduler and the
+    actuator are driven from the simulation loop instead of their threads, on a virtual
+    clock which skips the wait for the next frame.
+    """
+
+    def __init__(self, fps: float = SIMULATION_FPS, seed: int = 0, verbose: bool = False):
+        self.frame_period_ns = int(1e9 / fps)
+        self.rng = np.random.default_rng(seed)
+        self.verbose = verbose
+        self.clock = ClockVirtual()
+        self.source = FrameSourceSimulator()
+        self.backend = InputBackendRecording(self.source.size())
+        with self.clock.installed(), self._output():
+            self.tracker = TrackerPuck(ScreenCapture(source=self.source, pacer=PacerUnlimited()), input_backend=self.backend, headless=True,
+                                       flight_recorder=False)
+        self.controller = self.tracker.controller
+        # Stepped by the simulation loop, on the virtual clock
+        self.controller.scheduler.stop()
+        self.controller.actuator.stop()
+        self.controller.validate_corners = False
+
+    def random_shot(self) -> Shot:
+        left, top, right, bottom = SHOT_AREA
+        a = self.rng.uniform(0.05, 0.95)
+        (top_x, top_y), (bot_x, bot_y) = CREASE
+        target = (top_x + (bot_x - top_x) * a, top_y + (bot_y - top_y) * a)
+        return Shot((self.rng.uniform(left, right), self.rng.uniform(top, bottom)), target, self.rng.uniform(*SHOT_SPEED))
+
+    def run(self, shots: int) -> list[ShotResult]:
+        return [self.play(self.random_shot()) for _ in range(shots)]
+
+    def play(self, shot: Shot) -> ShotResult:
+        """Simulate one shot from a fresh tracking state and score the save"""
+        with self.clock.installed(), self._output():
+            self._reset()
+            shot_start_ns = self.clock.perf_counter_ns()
+            impact_ns = shot_start_ns + int(shot.duration() * 1e9)
+            end_ns = impact_ns + int(AFTER_IMPACT * 1e9)
+            next_frame_ns = shot_start_ns
+            while next_frame_ns <= end_ns:
+                self._run_scheduled(next_frame_ns)
+                self.clock.advance_to(next_frame_ns)
+                t = (self.clock.perf_counter_ns() - shot_start_ns) / 1e9
+                x, y = shot.position(t)
+                self.source.mark = (x - PUCK_DELTA[0], y - PUCK_DELTA[1])
+                self.tracker.screen_capture.capture_once()
+                self.tracker.process_frame(self.tracker.screen_capture.get_frame())
+                self.controller.actuator.flush()
+                # A frame which took longer than the frame period delays the next capture
+                next_frame_ns = max(next_frame_ns + self.frame_period_ns, self.clock.perf_counter_ns())
+            self._run_scheduled(end_ns)
+        return self._score(shot, shot_start_ns / 1e9, impact_ns / 1e9)
+
+    def _reset(self):
+        tracker = self.tracker
+        tracker.tracker_multi.reset()
+        tracker.detector_puck.history.clear()
+        tracker.detector_puck.estimator.reset()
+        if isinstance(tracker.reacquirer_puck.window_detector, DetectorIncremental):
+            tracker.reacquirer_puck.window_detector.reset()
+        tracker.screen_capture.set_region(None)
+        self.controller.scheduler.cancel("save")
+        self.controller.last_save_time = -math.inf
+        controller.CREASE_CORNER_TOP, controller.CREASE_CORNER_BOT = CREASE
+        self.backend.events.clear()
+        self.source.mark = None
+
+    def _run_scheduled(self, until_ns: int):
+        """Fire the scheduled actions due before until_ns at their time"""
+        scheduler = self.controller.scheduler
+        while True:
+            deadline = scheduler.next_deadline()
+            if deadline is None or deadline * 1e9 >= until_ns:
+                return
+            self.clock.advance_to(int(deadline * 1e9))
+            scheduler.run_due()
+            self.controller.actuator.flush()
+
+    def _score(self, shot: Shot, shot_start: float, impact: float) -> ShotResult:
+        (top_x, top_y), (bot_x, bot_y) = CREASE
+        goalie = ((top_x + bot_x) / 2, (top_y + bot_y) / 2)
+        target = goalie
+        last_time = shot_start
+        reaction_time = None
+        block_time = None
+        for event_time, action, *args in self.backend.events:
+            if event_time > impact:
+                break
+            if action == "move_to":
+                goalie = self._follow(goalie, target, event_time - last_time)
+                last_time = event_time
+                target = tuple(args)
+                if reaction_time is None and math.dist(target, shot.target) <= SAVE_RADIUS:
+                    reaction_time = event_time - shot_start
+            elif action == "mouse_down":
+                block_time = event_time
+        goalie = self._follow(goalie, target, impact - last_time)
+        miss_distance = math.dist(goalie, shot.target)
+        block_offset = block_time - impact if block_time is not None else None
+        return ShotResult(
+            shot,
+            miss_distance <= SAVE_RADIUS,
+            block_offset is not None and block_offset >= -BLOCK_WINDOW,
+            miss_distance,
+            reaction_time,
+            block_offset,
+        )
+
+    @staticmethod
+    def _follow(position: tuple[float, float], target: tuple[float, float], dt: float) -> tuple[float, float]:
+        """Goalie position after moving towards the target for dt seconds"""
+        distance = math.dist(position, target)
+        step = GOALIE_SPEED * max(0.0, dt)
+        if distance <= step:
+            return target
+        a = step / distance
+        return (position[0] + (target[0] - position[0]) * a, position[1] + (target[1] - position[1]) * a)
+
+    def _output(self):
+        """The tracker reports every missed search window, which only matters when watching a single shot"""
+        return nullcontext() if self.verbose else redirect_stdout(io.StringIO())
+
+    def close(self):
+        self.controller.stop()
+
+
+def summarize(results: list[ShotResult]) -> dict:
+    reaction_times = np.array([r.reaction_time for r in results if r.reaction_time is not None])
+    block_offsets = np.array([r.block_offset for r in results if r.block_offset is not None])
+    return {
+        "shots": len(results),
+        "save_rate": float(np.mean([r.saved for r in results])),
+        "reach_rate": float(np.mean([r.reached for r in results])),
+        "block_rate": float(np.mean([r.blocked for r in results])),
+        "reaction_p50_ms": float(np.percentile(reaction_times, 50) * 1000) if len(reaction_times) else None,
+        "reaction_p90_ms": float(np.percentile(reaction_times, 90) * 1000) if len(reaction_times) else None,
+        "block_offset_p50_ms": float(np.percentile(block_offsets, 50) * 1000) if len(block_offsets) else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score the tracker against simulated shots, faster than real time")
+    parser.add_argument("--shots", type=int, default=100)
+    parser.add_argument("--fps", type=float, default=SIMULATION_FPS, help="Simulated capture rate")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true", help="Show the tracker output")
+    args = parser.parse_args()
+
+    simulator = SimulatorPuck(args.fps, args.seed, args.verbose)
+    start = time.perf_counter()
+    results = simulator.run(args.shots)
+    elapsed = time.perf_counter() - start
+    simulator.close()
+    simulated = sum(r.shot.duration() + AFTER_IMPACT for r in results)
+    print(f"{len(results)} shots, {simulated:.1f} s simulated in {elapsed:.1f} s ({simulated / elapsed:.1f}x real time)")
+    for name, value in summarize(results).items():
+        print(f"{name:>20}: {value if value is None or isinstance(value, int) else round(value, 3)}")
+
+if __name__ == "__main__":
+    main()
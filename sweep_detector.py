@@ -0,0 +1,156 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import csv
+import itertools
+import json
+import os
+import time
+from typing import Optional
+
+import numpy as np
+
+from detector_batch import video_to_npy
+from detector_puck import DetectorPuck
+
+
+# Values tried for every detector parameter, the grid is their product
+PARAMETER_GRID = {
+    "lower_yellow": [(20, 100, 100), (20, 80, 80), (15, 100, 100)],
+    "upper_yellow": [(40, 255, 255), (35, 255, 255)],
+    "min_area": [5, 10, 20],
+    "max_area": [200, 400],
+    "min_aspect": [1.2, 1.5],
+    "max_aspect": [3.0, 3.5],
+    "puck_delta": [(0, 20)],
+}
+# A detection within this distance of the labeled puck is a true positive, any further one near it is a false positive (px)
+MATCH_DISTANCE = 8.0
+
+# Frames and labels of the worker process, memory-mapped and received once by the pool initializer
+_FRAMES: Optional[np.ndarray] = None
+_LABELS: Optional[np.ndarray] = None
+
+
+def cached_frames(footage: str) -> str:
+    """Path of a .npy stack of the footage, decoding a video only if it was not decoded before"""
+    if footage.endswith(".npy"):
+        return footage
+    cache = footage + ".npy"
+    if not os.path.exists(cache) or os.path.getmtime(cache) < os.path.getmtime(footage):
+        print(f"Decoding {footage} into {cache}")
+        video_to_npy(footage, cache)
+    return cache
+
+
+def load_labels(path: str, frame_count: int) -> np.ndarray:
+    """(frame_count, 2) labeled puck positions, nan for frames without a puck
+
+    Any CSV with frame, x and y columns works, such as a detector_batch table with the wrong rows removed.
+    """
+    labels = np.full((frame_count, 2), np.nan)
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            if row["x"] and row["y"]:
+                labels[int(row["frame"])] = (float(row["x"]), float(row["y"]))
+    return labels
+
+
+def parameter_sets(grid: dict[str, list], samples: Optional[int] = None, seed: int = 0) -> list[dict]:
+    """Every combination of the grid, or a random selection of samples of them"""
+    names = list(grid)
+    combinations = list(itertools.product(*(grid[name] for name in names)))
+    if samples is not None and samples < len(combinations):
+        rng = np.random.default_rng(seed)
+        combinations = [combinations[i] for i in rng.choice(len(combinations), samples, replace=False)]
+    return [dict(zip(names, values)) for values in combinations]
+
+
+def configure(detector: DetectorPuck, parameters: dict) -> DetectorPuck:
+    detector.lower_yellow = np.array(parameters["lower_yellow"])
+    detector.upper_yellow = np.array(parameters["upper_yellow"])
+    detector.min_area = parameters["min_area"]
+    detector.max_area = parameters["max_area"]
+    detector.min_aspect = parameters["min_aspect"]
+    detector.max_aspect = parameters["max_aspect"]
+    detector.puck_delta = tuple(parameters["puck_delta"])
+    return detector
+
+
+def _init_worker(path: str, labels: np.ndarray):
+    global _FRAMES, _LABELS
+    _FRAMES = np.load(path, mmap_mode="r")
+    _LABELS = labels
+
+
+def evaluate(parameters: dict) -> dict:
+    """Precision, recall and detection cost of the parameters over the frames and labels of this worker"""
+    labels = _LABELS
+    detector = configure(DetectorPuck(), parameters)
+    true_positives = detections = 0
+    durations = np.empty(len(_FRAMES))
+    for i in range(len(_FRAMES)):
+        frame = np.asarray(_FRAMES[i])
+        start = time.perf_counter()
+        marks = detector.detect_check_marks(frame)
+        durations[i] = time.perf_counter() - start
+        detections += len(marks)
+        if not marks or np.isnan(labels[i, 0]):
+            continue
+        distances = np.hypot(*(np.array([mark[:2] for mark in marks]) - labels[i]).T)
+        # The labeled puck is matched at most once, duplicate detections of it count as false positives
+        true_positives += bool((distances <= MATCH_DISTANCE).any())
+
+    positives = int(np.count_nonzero(~np.isnan(labels[:, 0])))
+    precision = true_positives / detections if detections else 1.0
+    recall = true_positives / positives if positives else 1.0
+    return {
+        "parameters": parameters,
+        "precision": precision,
+        "recall": recall,
+        "f1": 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+        "mean_ms": float(durations.mean() * 1000),
+        "p99_ms": float(np.percentile(durations, 99) * 1000),
+    }
+
+
+def sweep(footage: str, labels_path: str, grid: dict[str, list] = PARAMETER_GRID, samples: Optional[int] = None,
+          workers: Optional[int] = None) -> list[dict]:
+    """Evaluate the parameter sets on a process pool, best F1 first and cheapest among equals"""
+    path = cached_frames(footage)
+    labels = load_labels(labels_path, len(np.load(path, mmap_mode="r")))
+    trials = parameter_sets(grid, samples)
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(path, labels)) as executor:
+        results = list(executor.map(evaluate, trials))
+    return sorted(results, key=lambda result: (-round(result["f1"], 3), result["mean_ms"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search detector thresholds against labeled footage")
+    parser.add_argument("footage", help="Video file or .npy stack of BGR frames, videos are decoded once and cached")
+    parser.add_argument("labels", help="CSV with frame, x, y columns of the puck in each frame")
+    parser.add_argument("--samples", type=int, help="Evaluate this many random parameter sets instead of the whole grid")
+    parser.add_argument("--grid", help="JSON file with the values of each parameter, replacing the default grid")
+    parser.add_argument("--workers", type=int, help="Worker processes, one per CPU by default")
+    parser.add_argument("--top", type=int, default=10, help="Print this many best parameter sets")
+    parser.add_argument("--output", help="Save all results as JSON")
+    args = parser.parse_args()
+
+    grid = PARAMETER_GRID
+    if args.grid:
+        with open(args.grid) as f:
+            grid = json.load(f)
+
+    start = time.perf_counter()
+    results = sweep(args.footage, args.labels, grid, args.samples, args.workers)
+    print(f"{len(results)} parameter sets in {time.perf_counter() - start:.1f} s\n")
+    print(f"{'f1':>6} {'prec':>6} {'recall':>6} {'mean ms':>8} {'p99 ms':>8}  parameters")
+    for result in results[:args.top]:
+        print(f"{result['f1']:>6.3f} {result['precision']:>6.3f} {result['recall']:>6.3f} "
+              f"{result['mean_ms']:>8.3f} {result['p99_ms']:>8.3f}  {json.dumps(result['parameters'])}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import cv2
+import numpy as np
+from typing import Optional
+
+
+# Colors of the rendered scene (BGR)
+ICE_COLOR = (235, 230, 225)
+CHECK_MARK_COLOR = (0, 215, 255)
+# Sub-pixel precision of the rendered polygons
+_SHIFT = 4
+# Exact check marks are drawn this many times larger and averaged down, so edge pixels get their true coverage
+EXACT_SUPERSAMPLING = 8
+
+
+def check_mark_polygon(center: tuple[float, float], width: float = 10.0) -> np.ndarray:
+    """Outline of a check mark twice as wide as it is tall, centered on its bounding box"""
+    height = width / 2
+    # Thick "V" with a short left arm and a long right arm, in units of the bounding box
+    outline = np.array([
+        (0.0, 0.15),
+        (0.3, 0.15),
+        (0.42, 0.5),
+        (0.65, 0.0),
+        (1.0, 0.0),
+        (0.55, 1.0),
+        (0.3, 1.0),
+    ])
+    x, y = center
+    return np.column_stack((x - width / 2 + outline[:, 0] * width, y - height / 2 + outline[:, 1] * height))
+
+
+def render_check_mark(image: np.ndarray, center: tuple[float, float], width: float = 10.0,
+                      color: tuple[int, int, int] = CHECK_MARK_COLOR, exact: bool = False):
+    """Draw an anti-aliased check mark with sub-pixel placement
+
+    The fast anti-aliasing of fillPoly widens the mark a little and snaps horizontal edges to whole pixels.
+    An exact mark covers every pixel by its true share, pixel i covering [i, i + 1), which makes its
+    position a ground truth for sub-pixel measurements.
+    """
+    polygon = check_mark_polygon(center, width)
+    if not exact:
+        cv2.fillPoly(image, [np.round(polygon * (1 << _SHIFT)).astype(np.int32)], color, cv2.LINE_AA, _SHIFT)
+        return
+    left, top = np.maximum(np.floor(polygon.min(axis=0)).astype(int), 0)
+    right, bottom = np.ceil(polygon.max(axis=0)).astype(int)
+    right, bottom = min(right, image.shape[1]), min(bottom, image.shape[0])
+    if right <= left or bottom <= top:
+        return
+    # Coverage of every pixel of the bounding box, fillPoly puts pixel centers on integer coordinates
+    coverage = np.zeros(((bottom - top) * EXACT_SUPERSAMPLING, (right - left) * EXACT_SUPERSAMPLING), dtype=np.uint8)
+    scaled = ((polygon - (left, top)) * EXACT_SUPERSAMPLING - 0.5) * (1 << _SHIFT)
+    cv2.fillPoly(coverage, [np.round(scaled).astype(np.int32)], 255, cv2.LINE_8, _SHIFT)
+    alpha = cv2.resize(coverage, (right - left, bottom - top), interpolation=cv2.INTER_AREA)[:, :, None] / 255.0
+    patch = image[top:bottom, left:right]
+    patch[:] = np.round(patch * (1 - alpha) + np.array(color) * alpha)
+
+
+def synthetic_frame(width: int, height: int, marks: Optional[list[tuple[float, float]]] = None,
+                    mark_width: float = 10.0, noise: float = 0.0, seed: int = 0, exact: bool = False) -> np.ndarray:
+    """Ice colored BGR frame with check marks at the given centers and optional gaussian noise"""
+    image = np.empty((height, width, 3), dtype=np.uint8)
+    image[:] = ICE_COLOR
+    for center in marks or []:
+        render_check_mark(image, center, mark_width, exact=exact)
+    if noise > 0:
+        rng = np.random.default_rng(seed)
+        noisy = image + rng.normal(0, noise, image.shape)
+        image = np.clip(noisy, 0, 255).astype(np.uint8)
+    return image
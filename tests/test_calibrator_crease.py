@@ -0,0 +1,70 @@
+import cv2
+import numpy as np
+
+import controller as controller_module
+from actuator import Actuator, InputBackendRecording
+from calibrator_crease import CalibratorCrease
+from controller import Controller
+from detector_puck import DetectorPuck
+
+
+def crease_image() -> np.ndarray:
+    image = np.zeros((600, 800, 3), dtype=np.uint8)
+    cv2.line(image, (200, 200), (200, 400), (255, 255, 255), 3)
+    return image
+
+
+def test_calibration_is_cached_under_the_given_resolution(tmp_path):
+    calibrator = CalibratorCrease(str(tmp_path / "cache.json"))
+    calibrator.calibrate_async(crease_image(), (1600, 1200))
+    calibrator.thread.join()
+    corners = calibrator.take_result()
+    assert corners is not None
+    assert CalibratorCrease(str(tmp_path / "cache.json")).load(1600, 1200) == corners
+    assert calibrator.load(800, 600) is None
+
+
+def test_manual_corners_are_saved_once_on_release(tmp_path, monkeypatch):
+    controller = Controller(DetectorPuck(), Actuator(InputBackendRecording((1600, 1200))), hotkeys=False)
+    try:
+        controller.calibrator = CalibratorCrease(str(tmp_path / "cache.json"))
+        controller.validate_corners = False
+        saves = []
+        monkeypatch.setattr(controller.calibrator, "save", lambda *args: saves.append(args))
+        cursor = iter([(100, 100), (110, 120), (120, 140)])
+        monkeypatch.setattr(Controller, "_cursor_position", staticmethod(lambda: next(cursor)))
+        monkeypatch.setattr(controller_module, "CREASE_CORNER_TOP", controller_module.CREASE_CORNER_TOP)
+
+        controller.pressed_keys.add(Controller.KEYBINDS.SET_CORNER_TOP)
+        for _ in range(3):
+            controller.tick()
+        assert saves == []
+        controller.pressed_keys.clear()
+        controller.tick()
+        controller.tick()
+        assert saves == [(1600, 1200, ((120, 140), controller_module.CREASE_CORNER_BOT))]
+    finally:
+        controller.stop()
+
+
+def test_auto_calibration_waits_for_a_full_frame(tmp_path, monkeypatch):
+    controller = Controller(DetectorPuck(), Actuator(InputBackendRecording((800, 600))), hotkeys=False)
+    try:
+        controller.calibrator = CalibratorCrease(str(tmp_path / "cache.json"))
+        controller.validate_corners = False
+        calibrated = []
+        monkeypatch.setattr(controller.calibrator, "calibrate_async", lambda image, resolution: calibrated.append(image))
+        image = crease_image()
+
+        controller.pressed_keys.add(Controller.KEYBINDS.SET_CORNER_AUTO)
+        controller.tick(image, (300, 0, 400, 600))
+        controller.pressed_keys.clear()
+        assert calibrated == []
+        assert controller.wants_full_frame()
+        controller.tick(image, (300, 0, 400, 600))
+        assert calibrated == []
+        controller.tick(image, (0, 0, 800, 600))
+        assert len(calibrated) == 1
+        assert not controller.wants_full_frame()
+    finally:
+        controller.stop()
@@ -0,0 +1,82 @@
+import cv2
+import numpy as np
+import pytest
+
+import detector_batch
+from detector_batch import DetectorBatch, video_to_npy
+from detector_puck import DetectorPuck
+from synthetic import synthetic_frame
+
+
+def footage(count: int = 12, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    frames = []
+    for i in range(count):
+        marks = [(60 + 15 * i, 80 + 4 * i), tuple(rng.uniform(20, 300, 2))]
+        # Some frames without any mark, some with the mark cut off by the border
+        if i % 5 == 4:
+            marks = []
+        elif i % 5 == 3:
+            marks.append((2.0, 150.0))
+        frames.append(synthetic_frame(320, 240, marks, noise=4.0, seed=i))
+    return np.stack(frames)
+
+
+def per_frame_rows(detector: DetectorPuck, frames: np.ndarray, region=None) -> list:
+    rows = []
+    for i, frame in enumerate(frames):
+        if region is None:
+            marks = detector.detect_check_marks(frame)
+        else:
+            left, top, width, height = region
+            marks = detector.detect_check_marks(frame, (left, top), (left + width, top + height))
+        rows += [(i,) + tuple(mark) for mark in marks]
+    return rows
+
+
+@pytest.mark.parametrize("mask_engine,scale", [("hsv", 1), ("lut", 1), ("hsv", 2), ("hsv", 4)])
+@pytest.mark.parametrize("region", [None, (40, 30, 200, 150)])
+def test_batch_matches_per_frame_detection(mask_engine, scale, region):
+    frames = footage()
+    detector = DetectorPuck(mask_engine=mask_engine, scale=scale)
+    table = DetectorBatch(detector, chunk_frames=5).run(frames, region)
+    expected = per_frame_rows(DetectorPuck(mask_engine=mask_engine, scale=scale), frames, region)
+    assert len(expected) > 0
+    assert [tuple(row) for row in table.tolist()] == expected
+
+
+def test_parallel_run_matches_serial(tmp_path):
+    frames = footage(20)
+    path = str(tmp_path / "frames.npy")
+    np.save(path, frames)
+    batch = DetectorBatch(chunk_frames=4)
+    serial = batch.run(path)
+    parallel = batch.run(path, workers=2)
+    assert np.array_equal(np.sort(serial, order=["frame", "x"]), np.sort(parallel, order=["frame", "x"]))
+
+
+@pytest.mark.parametrize("reported", [0, 3, 12, 30])
+def test_video_to_npy_keeps_every_decoded_frame(tmp_path, monkeypatch, reported):
+    frames = footage()
+    video = str(tmp_path / "footage.avi")
+    writer = cv2.VideoWriter(video, cv2.VideoWriter_fourcc(*"FFV1"), 60, (frames.shape[2], frames.shape[1]))
+    for frame in frames:
+        writer.write(frame)
+    writer.release()
+
+    open_capture = cv2.VideoCapture
+
+    class CaptureMiscounting:
+        def __init__(self, path):
+            self.capture = open_capture(path)
+
+        def get(self, prop):
+            return reported if prop == cv2.CAP_PROP_FRAME_COUNT else self.capture.get(prop)
+
+        def __getattr__(self, name):
+            return getattr(self.capture, name)
+
+    monkeypatch.setattr(detector_batch.cv2, "VideoCapture", CaptureMiscounting)
+    output = str(tmp_path / "footage.npy")
+    assert video_to_npy(video, output, chunk_frames=5) == len(frames)
+    assert np.array_equal(np.load(output), frames)
@@ -0,0 +1,37 @@
+from detector_incremental import DetectorIncremental
+from detector_puck import DetectorPuck
+from synthetic import synthetic_frame
+
+
+BOUNDS = ((100, 60), (500, 420))
+
+
+def run(scenes: list[list[tuple[float, float]]]) -> DetectorIncremental:
+    detector = DetectorPuck()
+    incremental = DetectorIncremental(DetectorPuck())
+    for marks in scenes:
+        image = synthetic_frame(640, 480, marks)
+        expected = sorted(detector.detect_check_marks(image, *BOUNDS))
+        assert sorted(incremental.detect_check_marks(image, *BOUNDS)) == expected
+    return incremental
+
+
+def test_unchanged_window_short_circuits():
+    incremental = run([[(300.0, 240.0), (150.0, 100.0)]] * 10)
+    assert incremental.full == 1
+    assert incremental.short_circuited == 9
+
+
+def test_partially_changed_window_matches_full_detection():
+    # A static mark stays while another one moves through a corner of the window
+    incremental = run([[(150.0, 100.0), (420.0 + 3 * i, 340.0 + 2 * i)] for i in range(20)])
+    assert incremental.partial > 0
+
+
+def test_moved_window_is_detected_whole():
+    detector = DetectorPuck()
+    incremental = DetectorIncremental(detector)
+    image = synthetic_frame(640, 480, [(300.0, 240.0)])
+    incremental.detect_check_marks(image, (100, 60), (500, 420))
+    assert incremental.detect_check_marks(image, (101, 60), (501, 420)) == detector.detect_check_marks(image, (101, 60), (501, 420))
+    assert incremental.full == 2
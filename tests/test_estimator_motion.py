@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from estimator_motion import ESTIMATORS, EstimatorMotionKalman, create_estimator
+from history_motion import HistoryMotion
+
+
+def feed(name: str, samples: list[tuple[float, float, float]], capacity: int = 10):
+    history = HistoryMotion(capacity)
+    estimator = create_estimator(name, history)
+    for t, x, y in samples:
+        if history.append(int(round(t * 1e9)), x, y):
+            estimator.update(t, x, y)
+    return history, estimator
+
+
+def straight_line(count: int, velocity: tuple[float, float] = (300.0, -120.0), dt: float = 1 / 60,
+                  noise: float = 0.0, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    return [(i * dt, 100 + velocity[0] * i * dt + rng.normal(0, noise), 200 + velocity[1] * i * dt + rng.normal(0, noise))
+            for i in range(count)]
+
+
+def test_history_keeps_last_samples_contiguous():
+    history = HistoryMotion(4)
+    for i in range(1, 7):
+        history.append(i, i, -i)
+    assert len(history) == 4
+    assert list(history.positions()[:, 0]) == [3, 4, 5, 6]
+    assert list(history.positions(2)[:, 1]) == [-5, -6]
+    assert history.last_time_ns() == 6
+
+
+def test_history_ignores_samples_not_newer():
+    history = HistoryMotion(4)
+    assert history.append(10, 1, 1)
+    assert not history.append(10, 2, 2)
+    assert not history.append(5, 3, 3)
+    assert history.last_position() == (1.0, 1.0)
+
+
+@pytest.mark.parametrize("name", sorted(ESTIMATORS))
+def test_estimators_need_two_samples(name):
+    _, estimator = feed(name, straight_line(1))
+    assert estimator.estimate() is None
+
+
+@pytest.mark.parametrize("name", sorted(ESTIMATORS))
+def test_estimators_recover_constant_velocity(name):
+    _, estimator = feed(name, straight_line(30))
+    motion = estimator.estimate()
+    assert motion.dx == pytest.approx(300.0, abs=1.0)
+    assert motion.dy == pytest.approx(-120.0, abs=1.0)
+    assert motion.speed == pytest.approx(np.hypot(300.0, -120.0), abs=1.0)
+
+
+@pytest.mark.parametrize("name", ["least_squares", "kalman_cv", "kalman_ca"])
+def test_estimators_report_covariance_shrinking_with_samples(name):
+    short = feed(name, straight_line(3, noise=1.0))[1].estimate()
+    long = feed(name, straight_line(10, noise=1.0))[1].estimate()
+    assert short.covariance.shape == (2, 2)
+    assert long.velocity_std() < short.velocity_std()
+
+
+def test_kalman_restarts_on_deflection():
+    samples = straight_line(20, velocity=(1200.0, -300.0))
+    t, x, y = samples[-1]
+    # Bounce off a wall: the puck comes back with the opposite horizontal velocity
+    samples += [(t + i / 60, x - 1200.0 * i / 60, y - 300.0 * i / 60) for i in range(1, 4)]
+    _, estimator = feed("kalman_cv", samples)
+    assert estimator.updates < 5
+    motion = estimator.estimate()
+    assert motion.dx < 0
+
+
+def test_kalman_ignores_samples_from_the_past():
+    _, estimator = feed("kalman_cv", straight_line(10))
+    state = estimator.state.copy()
+    estimator.update(0.0, 0.0, 0.0)
+    assert np.array_equal(estimator.state, state)
+
+
+def test_unknown_estimator_is_rejected():
+    with pytest.raises(ValueError):
+        create_estimator("median", HistoryMotion(4))
+
+
+def test_kalman_orders():
+    history = HistoryMotion(4)
+    assert EstimatorMotionKalman(history, order=1).state.shape == (2, 2)
+    assert EstimatorMotionKalman(history, order=2).state.shape == (3, 2)
@@ -0,0 +1,80 @@
+import sys
+import threading
+
+import numpy as np
+
+from frame_buffer import FrameBufferTriple
+
+
+def publish(frames: FrameBufferTriple, value: int):
+    frames.back()[:] = value
+    return frames.publish((0, 0, 4, 4), value)
+
+
+def test_latest_is_none_before_first_publish():
+    assert FrameBufferTriple((4, 4)).latest() is None
+
+
+def test_latest_returns_newest_frame():
+    frames = FrameBufferTriple((4, 4))
+    for value in (1, 2, 3):
+        publish(frames, value)
+    frame = frames.latest()
+    assert frame.sequence == 3
+    assert frame.timestamp_ns == 3
+    assert np.all(frame.image == 3)
+
+
+def test_latest_repeats_last_frame_without_new_publish():
+    frames = FrameBufferTriple((4, 4))
+    publish(frames, 1)
+    first = frames.latest()
+    second = frames.latest()
+    assert second.sequence == first.sequence == 1
+    assert second.image is first.image
+
+
+def test_producer_never_writes_into_read_frame():
+    frames = FrameBufferTriple((4, 4))
+    publish(frames, 1)
+    frame = frames.latest()
+    for value in range(2, 10):
+        publish(frames, value)
+        assert frames.back() is not frame.image
+    assert np.all(frame.image == 1)
+
+
+def test_concurrent_handoff_is_ordered_and_untorn():
+    frames = FrameBufferTriple((64, 64))
+    count = 20000
+    errors = []
+
+    def produce():
+        for value in range(1, count + 1):
+            # Frames carry their sequence in every pixel, a torn frame mixes two values
+            frames.back()[:] = value % 256
+            frames.publish((0, 0, 64, 64), value)
+
+    producer = threading.Thread(target=produce)
+    # Switch threads often, so the handoff is interrupted at many different points
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-5)
+    producer.start()
+    last = 0
+    while producer.is_alive() or last < count:
+        frame = frames.latest()
+        if frame is None:
+            continue
+        if frame.sequence < last:
+            errors.append(f"sequence went back from {last} to {frame.sequence}")
+        # The producer may only touch a frame once the consumer gave it back
+        image = frame.image
+        if image.min() != image.max() or image[0, 0] != frame.sequence % 256:
+            errors.append(f"frame {frame.sequence} changed while read")
+        last = frame.sequence
+        if not producer.is_alive() and frames.latest().sequence == last:
+            break
+    producer.join()
+    sys.setswitchinterval(interval)
+    assert not errors
+    assert last == count
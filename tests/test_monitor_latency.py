@@ -0,0 +1,42 @@
+import pytest
+
+from actuator import Actuator, InputBackendRecording
+from monitor_latency import DEFAULT_LEAD_TIME, MAX_LEAD_TIME, MIN_SAMPLES, MonitorLatency
+
+
+def test_lead_time_defaults_without_samples():
+    assert MonitorLatency().lead_time() == DEFAULT_LEAD_TIME
+
+
+def test_lead_time_from_decisions_plus_injection_cost():
+    monitor = MonitorLatency()
+    for _ in range(MIN_SAMPLES):
+        monitor.record("decision", 0, 20_000_000)
+    assert monitor.lead_time() == pytest.approx(0.02)
+    for _ in range(5):
+        monitor.record_injection_cost(0.004)
+    assert monitor.lead_time() == pytest.approx(0.024)
+
+
+def test_lead_time_follows_injections_once_measured():
+    monitor = MonitorLatency()
+    for _ in range(MIN_SAMPLES):
+        monitor.record("decision", 0, 20_000_000)
+        monitor.record("injection", 0, 35_000_000)
+    assert monitor.lead_time() == pytest.approx(0.035)
+    for _ in range(MIN_SAMPLES):
+        monitor.record("injection", 0, 900_000_000)
+    assert monitor.lead_time() == MAX_LEAD_TIME
+
+
+def test_every_injected_input_is_measured():
+    monitor = MonitorLatency()
+    actuator = Actuator(InputBackendRecording(), latency_monitor=monitor)
+    actuator.move(300, 300)
+    actuator.click("right")
+    actuator.flush()
+    assert monitor.injection_cost_count == 2
+    assert monitor.counts["injection"] == 0
+    actuator.move(400, 400, capture_ns=0)
+    actuator.flush()
+    assert monitor.counts["injection"] == 1
@@ -0,0 +1,114 @@
+import multiprocessing as mp
+
+import numpy as np
+
+from frame_buffer import Frame
+from pipeline import CountersShared, FrameSlots, QueueShared
+
+
+COUNT = 5000
+
+
+def produce_records(queue: QueueShared):
+    for value in range(1, COUNT + 1):
+        while not queue.put((value, -value)):
+            pass
+    queue.close()
+
+
+def produce_frames(frames: FrameSlots, counters: CountersShared):
+    image = np.zeros((frames.height, frames.width, 3), dtype=np.uint8)
+    for sequence in range(1, COUNT + 1):
+        image[:] = sequence % 256
+        frames.write(Frame(image, sequence, (0, 0, frames.width, frames.height), sequence))
+        counters.values[1] = sequence
+    counters.stop()
+    frames.close()
+    counters.close()
+
+
+def test_queue_put_get_in_order():
+    queue = QueueShared(4, 2)
+    try:
+        assert queue.get() is None
+        for value in range(4):
+            assert queue.put((value, value * 10))
+        assert not queue.put((4, 40))
+        assert [int(queue.get()[0]) for _ in range(4)] == [0, 1, 2, 3]
+        assert queue.get() is None
+    finally:
+        queue.close(unlink=True)
+
+
+def test_queue_get_latest_skips_older_records():
+    queue = QueueShared(8, 1)
+    try:
+        assert queue.get_latest() == (None, 0)
+        for value in range(5):
+            queue.put((value,))
+        record, skipped = queue.get_latest()
+        assert int(record[0]) == 4
+        assert skipped == 4
+        assert queue.get() is None
+    finally:
+        queue.close(unlink=True)
+
+
+def test_queue_across_processes():
+    queue = QueueShared(16, 2)
+    try:
+        producer = mp.Process(target=produce_records, args=(queue,))
+        producer.start()
+        received = []
+        while len(received) < COUNT:
+            record = queue.get()
+            if record is not None:
+                received.append(tuple(int(value) for value in record))
+        producer.join()
+        assert producer.exitcode == 0
+        assert received == [(value, -value) for value in range(1, COUNT + 1)]
+    finally:
+        queue.close(unlink=True)
+
+
+def test_frame_slots_detect_overwritten_frames():
+    frames = FrameSlots(2, 4, 4)
+    try:
+        image = np.full((4, 4, 3), 7, dtype=np.uint8)
+        frames.write(Frame(image, 1, (1, 1, 2, 2), 100))
+        frame = frames.read(1)
+        assert frame.region == (1, 1, 2, 2)
+        assert frame.timestamp_ns == 100
+        assert np.all(frame.image[1:3, 1:3] == 7)
+        assert frame.image[0, 0, 0] == 0
+        frames.write(Frame(image, 3, (0, 0, 4, 4), 300))
+        assert frames.read(1) is None
+        assert not frames.valid(1)
+        assert frames.valid(3)
+    finally:
+        frames.close(unlink=True)
+
+
+def test_frame_slots_reads_are_untorn_across_processes():
+    frames = FrameSlots(2, 64, 64)
+    counters = CountersShared()
+    try:
+        producer = mp.Process(target=produce_frames, args=(frames, counters))
+        producer.start()
+        checked = 0
+        while counters.running() or checked == 0:
+            sequence = int(counters.values[1])
+            frame = frames.read(sequence) if sequence else None
+            if frame is None:
+                continue
+            pixels = frame.image.copy()
+            # The pixels are only trusted if the slot still holds the same frame after the copy
+            if frames.valid(sequence):
+                assert np.all(pixels == sequence % 256)
+                checked += 1
+        producer.join()
+        assert producer.exitcode == 0
+        assert checked > 0
+    finally:
+        frames.close(unlink=True)
+        counters.close(unlink=True)
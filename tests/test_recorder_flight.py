@@ -0,0 +1,52 @@
+import numpy as np
+
+import recorder_flight
+from recorder_flight import RecorderFlight, load_crops, load_records, recordings, session_path
+
+
+def test_sessions_keep_the_previous_recording(tmp_path):
+    first = RecorderFlight(session_path(str(tmp_path)), capacity=8)
+    first.record(1, 100, (0, 0, 10, 10), [])
+    first.stop()
+    second = RecorderFlight(session_path(str(tmp_path)), capacity=8)
+    second.stop()
+    assert second.path != first.path
+    assert recordings(str(tmp_path)) == sorted([first.path, second.path])
+    assert list(load_records(first.path)["sequence"]) == [1]
+
+
+def test_old_sessions_are_pruned(tmp_path):
+    paths = []
+    for _ in range(4):
+        paths.append(session_path(str(tmp_path), keep=3))
+        np.save(paths[-1], np.zeros(1, dtype=recorder_flight.RECORD_DTYPE))
+    assert recordings(str(tmp_path)) == paths[1:]
+
+
+def test_ring_keeps_the_newest_records_in_order(tmp_path):
+    recorder = RecorderFlight(str(tmp_path / "flight.npy"), capacity=4)
+    for sequence in range(1, 7):
+        recorder.record(sequence, sequence * 10, (0, 0, 10, 10), [(1, 2, 3, 4, 5)] * 6, action="save")
+    recorder.stop()
+    records = load_records(recorder.path)
+    assert list(records["sequence"]) == [3, 4, 5, 6]
+    assert list(records["mark_count"]) == [6] * 4
+    assert records["action"][0] == recorder_flight.ACTIONS.index("save")
+
+
+def test_async_save_writes_a_copy_of_the_crops(tmp_path):
+    recorder = RecorderFlight(str(tmp_path / "flight.npy"), capacity=4, crop_frames=3, crop_size=4)
+    image = np.zeros((20, 20, 3), dtype=np.uint8)
+    for sequence in range(1, 5):
+        image[:] = sequence
+        recorder.record_crop(sequence, sequence * 1_000_000_000, image, (10, 10))
+    thread = recorder.save_crops_async(str(tmp_path / "crops.npz"), seconds=1.5)
+    # Crops recorded while the file is written do not end up in it
+    image[:] = 9
+    recorder.record_crop(5, 5_000_000_000, image, (10, 10))
+    thread.join()
+    recorder.stop()
+    crops = load_crops(str(tmp_path / "crops.npz"))
+    assert list(crops["sequence"]) == [3, 4]
+    assert [int(crop[0, 0, 0]) for crop in crops["crops"]] == [3, 4]
+    assert crops["origin"].tolist() == [[8, 8], [8, 8]]
@@ -0,0 +1,93 @@
+import threading
+import time
+
+import pytest
+
+from actuator import Actuator, InputBackendRecording
+from controller import Controller
+from detector_puck import DetectorPuck
+from scheduler import Scheduler
+
+
+def test_run_due_fires_in_deadline_order():
+    scheduler = Scheduler()
+    fired = []
+    now = time.perf_counter()
+    scheduler.schedule("late", now - 0.001, lambda: fired.append("late"))
+    scheduler.schedule("early", now - 0.002, lambda: fired.append("early"))
+    scheduler.schedule("future", now + 60, lambda: fired.append("future"))
+    scheduler.run_due()
+    assert fired == ["early", "late"]
+    assert scheduler.pending("future")
+    assert scheduler.next_deadline() == now + 60
+
+
+def test_schedule_again_retargets_the_key():
+    scheduler = Scheduler()
+    fired = []
+    now = time.perf_counter()
+    scheduler.schedule("save", now - 0.001, lambda: fired.append("first"))
+    scheduler.schedule("save", now + 60, lambda: fired.append("second"))
+    scheduler.run_due()
+    assert fired == []
+    scheduler.schedule("save", now - 0.001, lambda: fired.append("third"))
+    scheduler.run_due()
+    assert fired == ["third"]
+    assert not scheduler.pending("save")
+
+
+def test_cancel_drops_the_pending_action():
+    scheduler = Scheduler()
+    fired = []
+    scheduler.schedule("save", time.perf_counter() - 0.001, lambda: fired.append("save"))
+    scheduler.cancel("save")
+    scheduler.cancel("missing")
+    scheduler.run_due()
+    assert fired == []
+
+
+def test_thread_fires_once_at_the_retargeted_time():
+    scheduler = Scheduler()
+    scheduler.start()
+    fired = []
+    done = threading.Event()
+
+    def action(name):
+        fired.append((name, time.perf_counter()))
+        done.set()
+
+    try:
+        start = time.perf_counter()
+        scheduler.schedule("save", start + 0.05, lambda: action("first"))
+        scheduler.schedule("save", start + 0.1, lambda: action("second"))
+        assert done.wait(2)
+        time.sleep(0.05)
+    finally:
+        scheduler.stop()
+    assert [name for name, _ in fired] == ["second"]
+    assert fired[0][1] >= start + 0.1
+
+
+@pytest.fixture
+def controller():
+    controller = Controller(DetectorPuck(), Actuator(InputBackendRecording()), hotkeys=False)
+    controller.validate_corners = False
+    yield controller
+    controller.stop()
+
+
+def test_controller_cancels_the_save_when_disabled(controller):
+    controller.scheduler.schedule("save", time.perf_counter() + 60, controller._save)
+    # Hotkeys on without the enable key held turns auto control off
+    controller.hotkeys = True
+    controller.do((500.0, 500.0))
+    assert controller.last_action == "disabled"
+    assert not controller.scheduler.pending("save")
+
+
+def test_controller_keeps_the_cursor_while_a_save_is_pending(controller):
+    controller.scheduler.schedule("save", time.perf_counter() + 60, controller._save)
+    controller.do()
+    assert controller.scheduler.pending("save")
+    assert controller.actuator.idle()
+    assert not [event for event in controller.actuator.backend.events if event[1] == "move_to"]
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+import sweep_detector
+from detector_puck import DetectorPuck
+from sweep_detector import PARAMETER_GRID, evaluate, parameter_sets
+
+
+LABEL = (50.0, 40.0)
+
+
+@pytest.fixture
+def worker(tmp_path, monkeypatch):
+    """Worker state of three frames, the puck labeled in the first two"""
+    path = str(tmp_path / "frames.npy")
+    np.save(path, np.zeros((3, 8, 8, 3), dtype=np.uint8))
+    labels = np.array([LABEL, LABEL, (np.nan, np.nan)])
+    sweep_detector._init_worker(path, labels)
+    yield lambda marks: monkeypatch.setattr(DetectorPuck, "detect_check_marks", lambda self, frame: marks)
+    monkeypatch.setattr(sweep_detector, "_FRAMES", None)
+    monkeypatch.setattr(sweep_detector, "_LABELS", None)
+
+
+def test_duplicate_detections_of_the_puck_are_false_positives(worker):
+    worker([(50.0, 40.0, 9, 6, 30.0), (52.0, 41.0, 9, 6, 30.0)])
+    result = evaluate(parameter_sets(PARAMETER_GRID, 1)[0])
+    # Two frames with one match each, six detections in total
+    assert result["precision"] == pytest.approx(2 / 6)
+    assert result["recall"] == 1.0
+
+
+def test_detections_away_from_the_label_are_missed(worker):
+    worker([(90.0, 40.0, 9, 6, 30.0)])
+    result = evaluate(parameter_sets(PARAMETER_GRID, 1)[0])
+    assert result["precision"] == 0.0
+    assert result["recall"] == 0.0
+    assert result["f1"] == 0.0
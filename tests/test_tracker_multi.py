@@ -0,0 +1,83 @@
+import numpy as np
+
+from detector_puck import DetectorPuck
+from reacquirer_puck import ReacquirerPuck
+from synthetic import synthetic_frame
+from tracker_multi import MAX_MISSES, TrackerMulti
+
+
+UI_MARK = (500.0, 300.0, 10.0, 5.0, 30.0)
+
+
+def puck_mark(i: int) -> tuple:
+    return (100.0 + 20 * i, 200.0 + 5 * i, 10.0, 5.0, 30.0)
+
+
+def test_moving_puck_is_picked_over_a_static_mark():
+    tracker = TrackerMulti()
+    for i in range(10):
+        result = tracker.update([UI_MARK, puck_mark(i)], i / 60)
+    assert result == puck_mark(9)
+
+
+def test_static_mark_never_takes_over_a_lost_puck():
+    tracker = TrackerMulti()
+    for i in range(10):
+        tracker.update([UI_MARK, puck_mark(i)], i / 60)
+    for i in range(10, 10 + 3 * MAX_MISSES):
+        t = i / 60
+        assert tracker.update([UI_MARK], t) is None
+        position = tracker.puck_position(t)
+        assert position is None or np.hypot(position[0] - UI_MARK[0], position[1] - UI_MARK[1]) > 50
+
+
+def test_puck_at_rest_is_still_reported():
+    tracker = TrackerMulti()
+    resting = (400.0, 250.0, 10.0, 5.0, 30.0)
+    for i in range(40):
+        t = i / 60
+        assert tracker.update([resting], t) == resting
+        assert tracker.accounts_for_puck([resting], t)
+    assert tracker.puck_position(40 / 60) == (400.0, 250.0)
+
+
+def test_resting_puck_is_preferred_over_a_smaller_static_mark_until_one_moves():
+    tracker = TrackerMulti()
+    resting = (100.0, 200.0, 10.0, 6.0, 50.0)
+    for i in range(10):
+        assert tracker.update([UI_MARK, resting], i / 60) == resting
+    # The puck leaves, the mark which stayed behind is a UI element from now on
+    for i in range(10, 20):
+        assert tracker.update([UI_MARK, puck_mark(i - 10)], i / 60) == puck_mark(i - 10)
+    assert not tracker.accounts_for_puck([UI_MARK], 20 / 60)
+
+
+def test_static_mark_does_not_account_for_the_puck():
+    tracker = TrackerMulti()
+    for i in range(10):
+        tracker.update([UI_MARK, puck_mark(i)], i / 60)
+    assert tracker.accounts_for_puck([puck_mark(10)], 10 / 60)
+    assert not tracker.accounts_for_puck([UI_MARK], 10 / 60)
+    for i in range(10, 10 + 3 * MAX_MISSES):
+        tracker.update([UI_MARK], i / 60)
+    # The puck track is gone, only the UI element is known
+    assert not tracker.accounts_for_puck([UI_MARK], 1.0)
+    assert tracker.accounts_for_puck([UI_MARK, (900.0, 100.0, 10.0, 5.0, 30.0)], 1.0)
+
+
+def test_reacquisition_looks_past_a_ui_mark_in_the_search_window():
+    detector = DetectorPuck()
+    detector.update_position((300.0, 300.0), 1)
+    tracker = TrackerMulti()
+    ui_mark = (320.0, 300.0, 10.0, 5.0, 30.0)
+    for i in range(10):
+        tracker.update([ui_mark, puck_mark(i)], i / 60)
+    for i in range(10, 11 + MAX_MISSES):
+        tracker.update([ui_mark], i / 60)
+    # UI mark inside the search window around the last position, the puck far outside of it
+    image = synthetic_frame(1000, 600, [(320.0, 300.0), (800.0, 450.0)])
+    t = (11 + MAX_MISSES) / 60
+    marks, missed = ReacquirerPuck(detector).find(image, (0, 0, 1000, 600), 2,
+                                                  lambda marks: tracker.accounts_for_puck(marks, t))
+    assert missed
+    assert sorted(marks) == sorted(detector.detect_check_marks(image))
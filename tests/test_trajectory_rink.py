@@ -0,0 +1,52 @@
+import math
+
+import numpy as np
+import pytest
+
+from trajectory_rink import DAMPING, RESTITUTION, TrajectoryRink
+from vector_motion import VectorMotion
+
+
+RINK = [(0, 0), (1000, 0), (1000, 600), (0, 600)]
+CREASE = ((100, 200), (100, 400))
+
+
+def time_to_cover(speed: float, distance: float, damping: float = DAMPING) -> float:
+    return -math.log(1 - damping * distance / speed) / damping
+
+
+def test_straight_hit():
+    hit, points, times = TrajectoryRink(RINK).predict([(500, 300)], [(-800, 0)], CREASE)
+    assert hit[0]
+    assert points[0] == pytest.approx((100, 300))
+    assert times[0] == pytest.approx(time_to_cover(800, 400))
+
+
+def test_bank_off_a_side_wall_mirrors_the_path():
+    # Aimed at the crease point mirrored in the top wall, the rebound lands on the crease point itself
+    trajectory = TrajectoryRink(RINK, damping=0, restitution=1)
+    hit, points, times = trajectory.predict([(500, 300)], [(-800, -1200)], CREASE)
+    assert hit[0]
+    assert points[0] == pytest.approx((100, 300))
+    assert times[0] == pytest.approx(math.hypot(400, 600) / math.hypot(800, 1200))
+
+
+def test_bank_keeps_restitution_of_the_damped_speed():
+    hit, points, times = TrajectoryRink(RINK).predict([(500, 300)], [(-800, -1200)], CREASE)
+    speed = math.hypot(800, 1200)
+    leg = math.hypot(200, 300)
+    first = time_to_cover(speed, leg)
+    rebound_speed = speed * math.exp(-DAMPING * first) * RESTITUTION
+    assert hit[0]
+    assert points[0] == pytest.approx((100, 300))
+    assert times[0] == pytest.approx(first + time_to_cover(rebound_speed, leg))
+
+
+def test_miss_beyond_the_horizon():
+    trajectory = TrajectoryRink(RINK)
+    hit, points, times = trajectory.predict([(500, 300)], [(-50, 0)], CREASE, horizon=2.0)
+    assert not hit[0]
+    assert np.isnan(points[0]).all()
+    assert np.isnan(times[0])
+    motion = VectorMotion(-50, 0, 50, np.eye(2))
+    assert trajectory.predict_motion((500, 300), motion, CREASE, horizon=2.0) is None
@@ -0,0 +1,212 @@
+import numpy as np
+from typing import Optional
+
+
+MAX_TRACKS = 8
+# Detections further than this from the predicted position of a track are never associated with it (px)
+GATE_DISTANCE = 80.0
+# The gate also grows with the time since the track was last seen (px/s)
+GATE_SPEED = 1500.0
+# Tracks are dropped after this many updates without a detection
+MAX_MISSES = 5
+# Tracks need this many detections before they can be picked as the puck
+MIN_HITS = 3
+# Weight of the newest sample in the velocity and residual averages
+VELOCITY_SMOOTHING = 0.6
+RESIDUAL_SMOOTHING = 0.3
+# Tracks which never moved further than this from where they started are static (px)
+STATIC_DISTANCE = 15.0
+# A static track also has to be slower than this, a puck starting slowly is not static (px/s)
+STATIC_SPEED = 60.0
+# Another track has to be this much more consistent to take over the puck (px)
+SWITCH_MARGIN = 10.0
+
+
+class TrackerMulti:
+    """Track every check mark candidate and pick the one which moves like the puck
+
+    Detections are associated with the constant velocity prediction of each track
+    through a cost matrix of distances, assigned greedily cheapest first. The puck is the
+    track predicting its own detections best and the current puck track keeps its role until
+    another one is clearly better. A track which stays static while another confirmed track
+    moves is a UI element for the rest of its life and never picked. A resting puck without
+    such a moving track is still followed, preferring the largest static mark.
+    """
+
+    def __init__(self, max_tracks: int = MAX_TRACKS):
+        self.max_tracks = max_tracks
+        self.ids = np.zeros(max_tracks, dtype=np.int64)
+        self.alive = np.zeros(max_tracks, dtype=bool)
+        self.positions = np.zeros((max_tracks, 2))
+        self.velocities = np.zeros((max_tracks, 2))
+        self.origins = np.zeros((max_tracks, 2))
+        self.times = np.zeros(max_tracks)
+        self.hits = np.zeros(max_tracks, dtype=np.int64)
+        self.misses = np.zeros(max_tracks, dtype=np.int64)
+        self.residuals = np.zeros(max_tracks)
+        self.travelled = np.zeros(max_tracks)
+        self.areas = np.zeros(max_tracks)
+        self.ui = np.zeros(max_tracks, dtype=bool)
+        self.next_id = 1
+        self.puck_id = 0
+
+    def reset(self):
+        self.alive[:] = False
+        self.puck_id = 0
+
+    def predict(self, t: float) -> np.ndarray:
+        """Positions of all track slots extrapolated to time t, shape (max_tracks, 2)"""
+        return self.positions + self.velocities * (t - self.times)[:, None]
+
+    def update(self, check_marks: list, t: float) -> Optional[tuple]:
+        """Associate the check marks detected at time t with the tracks, return the puck mark if it was detected"""
+        detections = np.array([mark[:2] for mark in check_marks], dtype=np.float64).reshape(-1, 2)
+        predicted = self.predict(t)
+        track_index = np.flatnonzero(self.alive)
+
+        # Cost matrix of distances between predicted tracks (rows) and detections (columns)
+        costs = np.hypot(*(predicted[track_index, None, :] - detections[None, :, :]).transpose(2, 0, 1))
+        gates = GATE_DISTANCE + GATE_SPEED * (t - self.times[track_index])
+        costs[costs > gates[:, None]] = np.inf
+
+        assigned_tracks = np.zeros(len(track_index), dtype=bool)
+        assigned_detections = np.zeros(len(detections), dtype=bool)
+        detection_of_track = {}
+        for flat in np.argsort(costs, axis=None):
+            row, column = divmod(int(flat), len(detections))
+            if not np.isfinite(costs[row, column]):
+                break
+            if assigned_tracks[row] or assigned_detections[column]:
+                continue
+            assigned_tracks[row] = assigned_detections[column] = True
+            detection_of_track[int(track_index[row])] = column
+            self._correct(int(track_index[row]), detections[column], check_marks[column][4], costs[row, column], t)
+
+        missed = track_index[~assigned_tracks]
+        self.misses[missed] += 1
+        self.alive[missed[self.misses[missed] > MAX_MISSES]] = False
+        for column in np.flatnonzero(~assigned_detections):
+            self._spawn(detections[column], check_marks[column][4], t)
+
+        self._mark_ui()
+        puck = self._select_puck()
+        if puck is None:
+            # Nothing confirmed yet, fall back to the largest candidate which is not a known UI element
+            ui = {detection_of_track[slot] for slot in self._ui_slots() if slot in detection_of_track}
+            candidates = [mark for column, mark in enumerate(check_marks) if column not in ui]
+            return max(candidates, key=lambda mark: mark[4]) if candidates else None
+        if puck not in detection_of_track:
+            return None
+        return check_marks[detection_of_track[puck]]
+
+    def accounts_for_puck(self, check_marks: list, t: float) -> bool:
+        """Whether one of the check marks detected at time t can be the puck, without updating the tracks
+
+        With a puck track, a mark has to be within its gate. Without one, any mark which
+        is not a known UI element will do.
+        """
+        if not check_marks:
+            return False
+        detections = np.array([mark[:2] for mark in check_marks], dtype=np.float64).reshape(-1, 2)
+        predicted = self.predict(t)
+        slot = self._puck_slot()
+        if slot is not None:
+            gate = GATE_DISTANCE + GATE_SPEED * (t - self.times[slot])
+            return bool((np.hypot(*(detections - predicted[slot]).T) <= gate).any())
+        ui = self._ui_slots()
+        if len(ui) == 0:
+            return True
+        distances = np.hypot(*(predicted[ui, None, :] - detections[None, :, :]).transpose(2, 0, 1))
+        return bool((distances.min(axis=0) > GATE_DISTANCE).any())
+
+    def puck_position(self, t: float) -> Optional[tuple[float, float]]:
+        """Predicted position of the puck track, also while it is coasting through missed frames"""
+        slot = self._puck_slot()
+        if slot is None:
+            return None
+        x, y = self.predict(t)[slot]
+        return float(x), float(y)
+
+    def _correct(self, slot: int, detection: np.ndarray, area: float, residual: float, t: float):
+        dt = t - self.times[slot]
+        if dt > 0:
+            velocity = (detection - self.positions[slot]) / dt
+            if self.hits[slot] == 1:
+                self.velocities[slot] = velocity
+            else:
+                self.velocities[slot] += VELOCITY_SMOOTHING * (velocity - self.velocities[slot])
+        if self.hits[slot] >= 2:
+            # The first velocity is only a guess, residuals count from the third detection on
+            self.residuals[slot] += RESIDUAL_SMOOTHING * (residual - self.residuals[slot])
+        self.positions[slot] = detection
+        self.times[slot] = t
+        self.hits[slot] += 1
+        self.misses[slot] = 0
+        self.areas[slot] = area
+        self.travelled[slot] = max(self.travelled[slot], float(np.hypot(*(detection - self.origins[slot]))))
+
+    def _spawn(self, detection: np.ndarray, area: float, t: float):
+        free = np.flatnonzero(~self.alive)
+        if len(free) == 0:
+            # Replace the least confirmed track
+            free = [int(np.argmin(self.hits - 10 * self.misses))]
+            if self.ids[free[0]] == self.puck_id:
+                return
+        slot = free[0]
+        self.ids[slot] = self.next_id
+        self.next_id += 1
+        self.alive[slot] = True
+        self.positions[slot] = self.origins[slot] = detection
+        self.velocities[slot] = 0
+        self.times[slot] = t
+        self.hits[slot] = 1
+        self.misses[slot] = 0
+        self.residuals[slot] = 0
+        self.travelled[slot] = 0
+        self.areas[slot] = area
+        self.ui[slot] = False
+
+    def _puck_slot(self) -> Optional[int]:
+        slots = np.flatnonzero(self.alive & (self.ids == self.puck_id))
+        return int(slots[0]) if len(slots) else None
+
+    def _static_slots(self) -> np.ndarray:
+        """Slots of the confirmed tracks which never moved and do not move now"""
+        speeds = np.hypot(self.velocities[:, 0], self.velocities[:, 1])
+        return np.flatnonzero(self.alive & (self.hits >= MIN_HITS) & (self.travelled < STATIC_DISTANCE) & (speeds < STATIC_SPEED))
+
+    def _ui_slots(self) -> np.ndarray:
+        return np.flatnonzero(self.alive & self.ui)
+
+    def _mark_ui(self):
+        """Static tracks become UI elements once another confirmed track moves, a puck at rest alone stays the puck"""
+        if not (self.alive & (self.hits >= MIN_HITS) & (self.travelled >= STATIC_DISTANCE)).any():
+            return
+        static = self._static_slots()
+        self.ui[static] = True
+        if self.puck_id in self.ids[static]:
+            self.puck_id = 0
+
+    def _select_puck(self) -> Optional[int]:
+        """Slot of the most motion consistent confirmed moving track, sticking with the current puck track
+
+        Without a moving track the largest confirmed static one which is not a UI element is picked.
+        """
+        confirmed = self.alive & (self.hits >= MIN_HITS) & ~self.ui
+        moving = np.flatnonzero(confirmed & (self.travelled >= STATIC_DISTANCE))
+        current = self._puck_slot()
+        if len(moving) == 0:
+            resting = np.flatnonzero(confirmed)
+            if len(resting) == 0:
+                return current
+            best = current if current in resting else resting[np.argmax(self.areas[resting])]
+            self.puck_id = int(self.ids[best])
+            return int(best)
+        scores = self.residuals[moving]
+        best = moving[np.argmin(scores)]
+        if current is not None and current in moving:
+            current_score = scores[np.flatnonzero(moving == current)[0]]
+            if current_score <= scores.min() + SWITCH_MARGIN:
+                best = current
+        self.puck_id = int(self.ids[best])
+        return int(best)
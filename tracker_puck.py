@@ -1,70 +1,63 @@
-from collections import defaultdict
-import cv2
-import numpy as np
-import pyautogui
 import time
 from typing import Optional
 
+from actuator import Actuator, InputBackend, InputBackendNull
 from controller import Controller
+from detector_incremental import DetectorIncremental
 from detector_puck import DetectorPuck
+from frame_buffer import Frame
+from overlay_debug import OverlayDebug, OverlayState, CURRENT_COLOR, PREDICTED_COLOR
+from monitor_latency import MonitorLatency
+from profiler import Profiler, ProfilerExporter
+from reacquirer_puck import ReacquirerPuck
+from recorder_flight import RecorderFlight
 from screen_capture import ScreenCapture
+from settings_tracking import AUTO_LEAD_TIME, CAPTURE_MARGIN, CURRENT_POSITION_DT, INCREMENTAL_DETECTION, PYRAMID_REACQUISITION
+from tracker_multi import TrackerMulti
 from vector_motion import VectorMotion
 
-import tkinter as tk
-from PIL import ImageTk, Image
-
 
 DEBUG_OVERLAY = False
-CURRENT_POSITION_DT = 0.05
-
-
-class Profiler:
-    start_time: float = None
-    tick_time: float = None
-    end_time: float = None
-
-    total_stats: dict[str, list[float]] = defaultdict(list)
-
-    def __init__(self):
-        self.start()
-
-    def start(self):
-        # print("\nProfiler started")
-        self.start_time = time.time()
-        self.tick_time = self.start_time
-        self.end_time = None
-
-    def tick(self, msg: str):
-        new_tick_time = time.time()
-        # print(msg, new_tick_time - self.tick_time)
-        Profiler.total_stats[msg].append(new_tick_time - self.tick_time)
-        self.tick_time = new_tick_time
-
-    def end(self):
-        self.end_time = time.time()
-        # print(f"Profiler ended: {self.end_time - self.start_time}\n")
-        Profiler.total_stats["Profiler::__end__"].append(self.end_time - self.start_time)
-
-    @classmethod
-    def print_total_stats(cls):
-        print("\nProfiler: total stats")
-        data = []
-        for msg, dtimes in cls.total_stats.items():
-            data.append((sum(dtimes) / len(dtimes), msg, len(dtimes)))
-        data.sort(reverse=True)
-        for avg, msg, amount in data:
-            print(msg, avg, amount)
+# Block on new frames from the capture thread instead of polling it and feeding the FPS back
+EVENT_DRIVEN = True
+# How far ahead the overlay shows the predicted puck (s)
+DISPLAY_LOOKAHEAD = 0.4
+# Record the tracking state of every frame for looking into missed saves afterwards
+FLIGHT_RECORDER = True
 
 
 class TrackerPuck:
-    def __init__(self):
-        self.screen_capture = ScreenCapture()
+    def __init__(self, screen_capture: Optional[ScreenCapture] = None, event_driven: bool = EVENT_DRIVEN,
+                 profiler_exporter: Optional[ProfilerExporter] = None, input_backend: Optional[InputBackend] = None,
+                 headless: bool = False, flight_recorder: bool = FLIGHT_RECORDER):
+        """Headless runs without overlay and hotkeys with auto control on, and drop the input by default"""
+        self.screen_capture = screen_capture if screen_capture is not None else ScreenCapture()
+        self.event_driven = event_driven
+        self.profiler_exporter = profiler_exporter
         self.detector_puck = DetectorPuck()
-        self.controller = Controller(self.detector_puck)
+        self.reacquirer_puck = ReacquirerPuck(self.detector_puck, pyramid=PYRAMID_REACQUISITION, incremental=INCREMENTAL_DETECTION)
+        self.tracker_multi = TrackerMulti()
+        self.latency_monitor = MonitorLatency()
+        if input_backend is None and headless:
+            input_backend = InputBackendNull((self.screen_capture.width, self.screen_capture.height))
+        self.controller = Controller(self.detector_puck, Actuator(input_backend, latency_monitor=self.latency_monitor),
+                                     hotkeys=not headless)
+        # Each tracking session records into its own file, created when tracking starts
+        self.flight_recorder = flight_recorder
+        self.recorder = None
+        self.crops_key_held = False
         self.running = False
+        self.overlay = None
+        if DEBUG_OVERLAY and not headless:
+            self.overlay = OverlayDebug([
+                (CURRENT_COLOR, "Blue Circle", "Current Puck (+latency)" if AUTO_LEAD_TIME else f"Current Puck (+{CURRENT_POSITION_DT}s)"),
+                (PREDICTED_COLOR, "Cyan Circle", f"Predicted (+{DISPLAY_LOOKAHEAD}s)"),
+            ])
 
         # Performance monitoring
         self.frame_count = 0
+        self.dropped_frames = 0
+        self.last_sequence = 0
         self.start_time = time.time()
 
     def start_tracking(self):
@@ -73,9 +66,18 @@ class TrackerPuck:
         print("Press Ctrl+C to stop")
 
         self.screen_capture.start_capture()
+        if self.profiler_exporter is not None:
+            self.profiler_exporter.start()
+        if self.overlay is not None:
+            self.overlay.start()
+        if self.flight_recorder:
+            self.recorder = RecorderFlight()
+            self.recorder.start()
         self.running = True
         self.start_time = time.time()
         self.frame_count = 0
+        self.dropped_frames = 0
+        self.last_sequence = 0
 
         try:
             self._tracking_loop()
@@ -86,212 +88,158 @@ class TrackerPuck:
         """Stop the tracking system"""
         self.running = False
         self.screen_capture.stop_capture()
+        self.controller.stop()
+        if self.overlay is not None:
+            self.overlay.stop()
+        if self.profiler_exporter is not None:
+            self.profiler_exporter.stop()
+        if self.recorder is not None:
+            self.recorder.stop()
+            print(f"Flight recording saved to {self.recorder.path}")
 
         # Calculate and display performance statistics
         elapsed = time.time() - self.start_time
         fps = self.frame_count / elapsed if elapsed > 0 else 0
-        print(f"\nTracking stopped. Average FPS: {fps:.2f}")
+        print(f"\nTracking stopped. Average FPS: {fps:.2f}, dropped frames: {self.dropped_frames}")
+        print(f"Lead time: {self.latency_monitor.lead_time() * 1000:.1f} ms")
+        window_detector = self.reacquirer_puck.window_detector
+        if isinstance(window_detector, DetectorIncremental):
+            print(f"Search windows: {window_detector.short_circuited} unchanged, {window_detector.partial} partially "
+                  f"and {window_detector.full} fully detected")
         Profiler.print_total_stats()
 
     def _tracking_loop(self):
         """Main tracking loop"""
         while self.running:
+            if self.overlay is not None and self.overlay.closed.is_set():
+                self.stop_tracking()
+                break
             loop_start = time.time()
             profiler = Profiler()
-            self.controller.tick()
-
-            frame = self.screen_capture.get_frame()
-            profiler.tick("screen_capture.get_frame")
-            if frame is None:
-                time.sleep(0.001)
-                continue
-
-            # Detect check marks
-            check_marks = []
-            if self.detector_puck.previous_positions:
-                last_x, last_y = self.detector_puck.previous_positions[-1]
-                check_marks = self.detector_puck.detect_check_marks(frame, (int(last_x) - 200, int(last_y) - 200), (int(last_x) + 200, int(last_y) + 200))
-            if not check_marks:
-                print("PUCK DETECTION FAILED")
-                check_marks = self.detector_puck.detect_check_marks(frame)
-                print(check_marks)
-            profiler.tick("detector.detect_check_marks")
 
-            if check_marks:
-                # Use the largest check mark (by area)
-                largest_mark = max(check_marks, key=lambda x: x[4])
-                center_x, center_y, width, height, area = largest_mark
-
-                # Update position history
-                self.detector_puck.update_position((center_x, center_y))
-                profiler.tick("detector.update_position")
-
-                # Calculate motion vector
-                motion_vector = self.detector_puck.calculate_motion_vector()
-                profiler.tick("detector.calculate_motion_vector")
-
-                if motion_vector:
-                    # Predict position in 0.5 seconds
-                    predicted_x, predicted_y = motion_vector.predict_position(
-                        (center_x, center_y), CURRENT_POSITION_DT
-                    )
-                    next_x, next_y = motion_vector.predict_position(
-                        (center_x, center_y), 0.4
-                    )
-                    profiler.tick("detector.predict_position")
-
-                    # Move or do something using detected mouse
-                    self.controller.do((predicted_x, predicted_y))
-                    profiler.tick("_move_mouse_smooth")
-
-                    # Display info (optional - can be removed for maximum performance)
-                    self._display_info(predicted_x, predicted_y, width, height,
-                                       motion_vector, next_x, next_y)
-                    profiler.tick("_display_info")
-                else:
-                    # No motion vector yet, just move to current position
-                    self._display_info(center_x, center_y, width, height)
+            if self.event_driven:
+                captured = self.screen_capture.wait_frame(self.last_sequence)
+                profiler.tick("screen_capture.wait_frame")
+                if captured is None:
+                    if not self.screen_capture.running:
+                        self.stop_tracking()
+                    continue
             else:
-                self.controller.do()
-
-            profiler.tick("before end")
-            self.frame_count += 1
+                captured = self.screen_capture.get_frame()
+                profiler.tick("screen_capture.get_frame")
+                if captured is None or captured.sequence == self.last_sequence:
+                    time.sleep(0.001)
+                    continue
+            self.process_frame(captured, profiler)
+            if not self.event_driven:
+                self.screen_capture.update_target_fps(self.frame_count / (time.time() - self.start_time))
+
+    def process_frame(self, captured: Frame, profiler: Optional[Profiler] = None):
+        """Detect the puck in a captured frame and act on it"""
+        if profiler is None:
+            profiler = Profiler()
+        Profiler.record("latency.capture_to_processing", (time.perf_counter_ns() - captured.timestamp_ns) / 1e9)
+        self.dropped_frames += captured.sequence - self.last_sequence - 1
+        self.last_sequence = captured.sequence
+        frame = captured.image
+        self.controller.tick(frame, captured.region)
+
+        # Detect check marks in a window sized from the current speed, search the grabbed region if the puck is not in it
+        capture_time = captured.timestamp_ns / 1e9
+        check_marks, missed = self.reacquirer_puck.find(frame, captured.region, captured.timestamp_ns,
+                                                        lambda marks: self.tracker_multi.accounts_for_puck(marks, capture_time))
+        if missed:
+            print("PUCK DETECTION FAILED")
+            print(check_marks)
+        profiler.tick("detector.detect_check_marks")
+        self.latency_monitor.record("detection", captured.timestamp_ns)
+
+        # Follow every candidate, only the one moving like the puck is used
+        puck_mark = self.tracker_multi.update(check_marks, capture_time)
+        profiler.tick("tracker_multi.update")
+
+        motion_vector = None
+        decision = ("none", None)
+        if puck_mark is not None:
+            center_x, center_y, width, height, area = puck_mark
+
+            # Update position history, stamped with the capture time so detection time does not skew the velocity
+            self.detector_puck.update_position((center_x, center_y), captured.timestamp_ns)
+            profiler.tick("detector.update_position")
+
+            # Calculate motion vector
+            motion_vector = self.detector_puck.calculate_motion_vector()
+            profiler.tick("detector.calculate_motion_vector")
+
+            # Grab only around the next search window
+            self.screen_capture.set_region(ReacquirerPuck.capture_region((center_x, center_y), motion_vector, CAPTURE_MARGIN))
 
-            profiler.end()
-            self.screen_capture.update_target_fps(self.frame_count / (time.time() - self.start_time))
+            if motion_vector:
+                # Predict where the puck is once the input lands, the mark shows it at capture time
+                lead_time = self.latency_monitor.lead_time() if AUTO_LEAD_TIME else CURRENT_POSITION_DT
+                predicted_x, predicted_y = motion_vector.predict_position(
+                    (center_x, center_y), lead_time
+                )
+                next_x, next_y = motion_vector.predict_position(
+                    (center_x, center_y), DISPLAY_LOOKAHEAD
+                )
+                profiler.tick("detector.predict_position")
+
+                # Move or do something using detected mouse
+                self.controller.do((predicted_x, predicted_y), captured.timestamp_ns)
+                decision = (self.controller.last_action, self.controller.last_impact)
+                self.latency_monitor.record("decision", captured.timestamp_ns)
+                profiler.tick("_move_mouse_smooth")
+
+                # Display info (optional - can be removed for maximum performance)
+                self._display_info(predicted_x, predicted_y, width, height,
+                                   motion_vector, next_x, next_y)
+                profiler.tick("_display_info")
+            else:
+                # No motion vector yet, just move to current position
+                self._display_info(center_x, center_y, width, height)
+        elif self.tracker_multi.puck_position(capture_time) is None:
+            # Puck is lost, grab the whole rink again
+            self.screen_capture.set_region(None)
+            self.controller.do()
+            decision = (self.controller.last_action, self.controller.last_impact)
+        if self.controller.wants_full_frame():
+            # The gate corners are detected on the whole rink, not on the narrowed region
+            self.screen_capture.set_region(None)
+
+        if self.recorder is not None:
+            self._record(captured, check_marks, puck_mark, motion_vector, decision)
+            profiler.tick("recorder.record")
+
+        profiler.tick("before end")
+        self.frame_count += 1
+
+        profiler.end()
+
+    def _record(self, captured: Frame, check_marks: list, puck_mark: Optional[tuple], motion_vector: Optional[VectorMotion],
+                decision: tuple[str, Optional[tuple]]):
+        """Hand the frame over to the flight recorder, save its crops on the key press"""
+        action, impact = decision
+        position = puck_mark[:2] if puck_mark is not None else None
+        self.recorder.record(captured.sequence, captured.timestamp_ns, captured.region, check_marks, position,
+                             motion_vector, impact, action)
+        if position is None:
+            left, top, width, height = captured.region
+            position = (left + width / 2, top + height / 2)
+        self.recorder.record_crop(captured.sequence, captured.timestamp_ns, captured.image, position)
+
+        crops_pressed = Controller.KEYBINDS.SAVE_CROPS in self.controller.pressed_keys
+        if crops_pressed and not self.crops_key_held:
+            # Only the copy of the crops happens here, the file is written in the background
+            self.recorder.save_crops_async()
+        self.crops_key_held = crops_pressed
 
     def _display_info(self, x: float, y: float, width: float, height: float,
                     motion_vector: Optional[VectorMotion] = None,
                     pred_x: float = None, pred_y: float = None):
-        """Display tracking information as an overlay on the screen"""
-        if not DEBUG_OVERLAY:
+        """Hand the tracking information over to the overlay thread"""
+        if self.overlay is None:
             return
-
-        try:
-            # Get screen size
-            screen_width, screen_height = pyautogui.size()
-
-            # Create a transparent overlay image
-            overlay = np.zeros((screen_height, screen_width, 4), dtype=np.uint8)
-
-            # Draw bounding box around detected check mark (green)
-            # cv2.rectangle(overlay,
-            #             (int(x - width/2), int(y - height/2)),
-            #             (int(x + width/2), int(y + height/2)),
-            #             (0, 255, 0, 255), 2)  # Green with full opacity
-
-            # Draw center point (blue)
-            cv2.circle(overlay, (int(x), int(y)), 50, (0, 0, 255, 255), 3)
-
-            if motion_vector and pred_x is not None and pred_y is not None:
-                # Draw motion vector (red arrow)
-                end_x = int(x + motion_vector.dx * 0.2)  # Scale for visibility
-                end_y = int(y + motion_vector.dy * 0.2)
-                # cv2.arrowedLine(overlay, (int(x), int(y)), (end_x, end_y),
-                #             (255, 0, 0, 255), 3)  # red with full opacity
-
-                # Draw predicted position (cyan)
-                cv2.circle(overlay, (int(pred_x), int(pred_y)), 8, (0, 255, 255, 255), 3)
-
-                # Draw prediction line (yellow)
-                # cv2.line(overlay, (int(x), int(y)), (int(pred_x), int(pred_y)),
-                #         (255, 255, 0, 255), 2)
-
-            # Create information panel in top-left corner
-            panel_height = 120
-            panel_width = 300
-            cv2.rectangle(overlay, (10, 10), (panel_width, panel_height),
-                        (0, 0, 0, 200), -1)  # Semi-transparent black background
-            cv2.rectangle(overlay, (10, 10), (panel_width, panel_height),
-                        (255, 255, 255, 255), 1)  # White border
-
-            # Calculate FPS
-            current_time = time.time()
-            fps = self.frame_count / (current_time - self.start_time) if current_time > self.start_time else 0
-
-            # Prepare information text
-            info_lines = []
-            info_lines.append(f"FPS: {fps:.1f}")
-            info_lines.append(f"Position: ({int(x)}, {int(y)})")
-
-            if motion_vector:
-                info_lines.append(f"Speed: {motion_vector.speed:.1f} px/s")
-                info_lines.append(f"Direction: ({motion_vector.dx:.1f}, {motion_vector.dy:.1f})")
-                if pred_x is not None and pred_y is not None:
-                    info_lines.append(f"Predicted: ({int(pred_x)}, {int(pred_y)})")
-
-            # Draw text on overlay
-            for i, line in enumerate(info_lines):
-                y_position = 35 + i * 20
-                cv2.putText(overlay, line, (20, y_position),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255, 255), 1)
-
-            # Draw legend in bottom-left corner
-            legend_y = screen_height - 100
-            cv2.rectangle(overlay, (10, legend_y), (200, legend_y + 80),
-                        (0, 0, 0, 200), -1)
-
-            legend_items = [
-                # ((0, 255, 0), "Green Box", "Detected Mark"),
-                ((0, 0, 255), "Blue Circle", f"Current Puck (+{CURRENT_POSITION_DT}s)"),
-                # ((0, 0, 255), "Red Arrow", "Motion Vector"),
-                ((0, 255, 255), "Cyan Circle", "Predicted (+0.4s)"),
-                # ((255, 255, 0), "Yellow Line", "Prediction Path"),
-            ]
-
-            for i, (color, color_name, description) in enumerate(legend_items):
-                y_pos = legend_y + 20 + i * 15
-                # Draw color indicator
-                cv2.circle(overlay, (20, y_pos - 5), 4, color + (255,), -1)
-                # Draw text
-                cv2.putText(overlay, f"{color_name}: {description}", (30, y_pos),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255, 255), 1)
-
-            # Convert to PIL Image and display as overlay
-            pil_image = Image.fromarray(overlay, 'RGBA')
-
-            # Create a simple overlay window using Tkinter
-            if not hasattr(self, 'overlay_window'):
-                self._create_overlay_window()
-            self.overlay_window.lift()
-
-            # Update the overlay window
-            if hasattr(self, 'overlay_window') and self.overlay_window:
-                try:
-                    self.overlay_photo = ImageTk.PhotoImage(pil_image)
-                    self.overlay_canvas.create_image(0, 0, image=self.overlay_photo, anchor='nw')
-                    self.overlay_window.update()
-                except Exception as e:
-                    # Recreate window if it was closed
-                    self._create_overlay_window()
-
-        except Exception as e:
-            print(f"Overlay error: {e}")
-
-    def _create_overlay_window(self):
-        """Create a transparent overlay window"""
-        try:
-            self.overlay_window = tk.Tk()
-            self.overlay_window.attributes('-fullscreen', True)
-            self.overlay_window.attributes('-topmost', True)
-            self.overlay_window.attributes('-transparentcolor', 'black')
-            self.overlay_window.configure(bg='black')
-            self.overlay_window.overrideredirect(True)
-
-            # Create canvas
-            self.overlay_canvas = tk.Canvas(self.overlay_window,
-                                        bg='black',
-                                        highlightthickness=0)
-            self.overlay_canvas.pack(fill='both', expand=True)
-
-            # Add close button (invisible but clickable in top-right)
-            close_btn = tk.Button(self.overlay_window, text="X",
-                                command=self.stop_tracking,
-                                bg='red', fg='white', font=('Arial', 12))
-            self.overlay_canvas.create_window(50, 50, window=close_btn)
-
-            print("Overlay window created. Press the red 'X' button to stop tracking.")
-
-        except Exception as e:
-            print(f"Failed to create overlay window: {e}")
-            self.overlay_window = None
+        current_time = time.time()
+        fps = self.frame_count / (current_time - self.start_time) if current_time > self.start_time else 0
+        self.overlay.submit(OverlayState(x, y, width, height, fps, motion_vector, pred_x, pred_y))
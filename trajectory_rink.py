@@ -0,0 +1,140 @@
+import numpy as np
+from typing import Optional
+
+from vector_motion import VectorMotion
+
+
+# Velocity decays as exp(-DAMPING * t) on the ice (1/s)
+DAMPING = 0.3
+# Fraction of the speed kept by a wall rebound
+RESTITUTION = 0.8
+MAX_BOUNCES = 3
+TIME_HORIZON = 2.0
+# Velocity samples drawn from the motion covariance
+VELOCITY_SAMPLES = 64
+# A crease hit is trusted when at least this fraction of the samples agrees on it
+MIN_HIT_FRACTION = 0.5
+# Ignore intersections closer than this, so a path does not hit the wall it just rebounded from
+_EPSILON = 1e-6
+
+
+def _cross(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return a[..., 0] * b[..., 1] - a[..., 1] * b[..., 0]
+
+
+class TrajectoryRink:
+    """Puck paths with exponential damping and reflections off the rink boundary
+
+    Between rebounds the puck moves in a straight line and covers
+    s(t) = v / k * (1 - exp(-k * t)), so the time to reach a wall or the crease follows
+    from the distance. All paths are advanced together, one rebound per iteration.
+    """
+
+    def __init__(self, polygon: list[tuple[float, float]], damping: float = DAMPING,
+                 restitution: float = RESTITUTION, max_bounces: int = MAX_BOUNCES):
+        vertices = np.asarray(polygon, dtype=np.float64)
+        self.edge_starts = vertices
+        self.edges = np.roll(vertices, -1, axis=0) - vertices
+        normals = np.stack([-self.edges[:, 1], self.edges[:, 0]], axis=1)
+        self.normals = normals / np.linalg.norm(normals, axis=1, keepdims=True)
+        self.damping = damping
+        self.restitution = restitution
+        self.max_bounces = max_bounces
+
+    def _distance_within(self, speed: np.ndarray, duration: np.ndarray) -> np.ndarray:
+        if self.damping == 0:
+            return speed * duration
+        return speed / self.damping * (1 - np.exp(-self.damping * duration))
+
+    def _time_to_cover(self, speed: np.ndarray, distance: np.ndarray) -> np.ndarray:
+        if self.damping == 0:
+            return distance / speed
+        return -np.log(1 - self.damping * distance / speed) / self.damping
+
+    @staticmethod
+    def _ray_hits(positions: np.ndarray, directions: np.ndarray, starts: np.ndarray,
+                  edges: np.ndarray) -> np.ndarray:
+        """Distance along each ray (N) to each segment (E), inf where it misses, shape (N, E)"""
+        offsets = starts[None, :, :] - positions[:, None, :]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            denominator = _cross(directions[:, None, :], edges[None, :, :])
+            distance = _cross(offsets, edges[None, :, :]) / denominator
+            along = _cross(offsets, directions[:, None, :]) / denominator
+        valid = (denominator != 0) & (distance > _EPSILON) & (along >= 0) & (along <= 1)
+        return np.where(valid, distance, np.inf)
+
+    def predict(self, positions: np.ndarray, velocities: np.ndarray,
+                crease: tuple[tuple[float, float], tuple[float, float]],
+                horizon: float = TIME_HORIZON) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Crease hits of N paths starting at positions (N, 2) with velocities (N, 2) in px/s
+
+        Returns whether each path reaches the crease within the horizon, the hit points (N, 2)
+        and the hit times in seconds (N), both nan for the paths that miss.
+        """
+        positions = np.array(positions, dtype=np.float64).reshape(-1, 2)
+        velocities = np.asarray(velocities, dtype=np.float64).reshape(-1, 2)
+        count = len(positions)
+        speeds = np.hypot(velocities[:, 0], velocities[:, 1])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            directions = velocities / speeds[:, None]
+        elapsed = np.zeros(count)
+        active = speeds > 0
+        hit = np.zeros(count, dtype=bool)
+        hit_points = np.full((count, 2), np.nan)
+        hit_times = np.full(count, np.nan)
+
+        crease_start = np.array(crease[0], dtype=np.float64)[None, :]
+        crease_edge = np.array(crease[1], dtype=np.float64)[None, :] - crease_start
+
+        for _ in range(self.max_bounces + 1):
+            if not active.any():
+                break
+            index = np.flatnonzero(active)
+            p, u, v = positions[index], directions[index], speeds[index]
+            reach = self._distance_within(v, horizon - elapsed[index])
+
+            wall_distances = self._ray_hits(p, u, self.edge_starts, self.edges)
+            wall = np.argmin(wall_distances, axis=1)
+            wall_distance = wall_distances[np.arange(len(index)), wall]
+            crease_distance = self._ray_hits(p, u, crease_start, crease_edge)[:, 0]
+
+            # The crease is reached before any wall
+            reached = (crease_distance <= wall_distance) & (crease_distance <= reach)
+            reached_index = index[reached]
+            hit[reached_index] = True
+            hit_points[reached_index] = p[reached] + u[reached] * crease_distance[reached, None]
+            hit_times[reached_index] = elapsed[reached_index] + self._time_to_cover(v[reached], crease_distance[reached])
+
+            # Rebound off the nearest wall, the rest stops or leaves the rink
+            bounced = ~reached & (wall_distance <= reach)
+            bounced_index = index[bounced]
+            travel_time = self._time_to_cover(v[bounced], wall_distance[bounced])
+            elapsed[bounced_index] += travel_time
+            positions[bounced_index] = p[bounced] + u[bounced] * wall_distance[bounced, None]
+            normals = self.normals[wall[bounced]]
+            directions[bounced_index] = u[bounced] - 2 * np.sum(u[bounced] * normals, axis=1, keepdims=True) * normals
+            speeds[bounced_index] = v[bounced] * np.exp(-self.damping * travel_time) * self.restitution
+            active[index[~bounced]] = False
+
+        return hit, hit_points, hit_times
+
+    def predict_motion(self, position: tuple[float, float], motion: VectorMotion,
+                       crease: tuple[tuple[float, float], tuple[float, float]], horizon: float = TIME_HORIZON,
+                       samples: int = VELOCITY_SAMPLES, seed: Optional[int] = 0) -> Optional[tuple[float, float, float]]:
+        """Median crease hit point and time over velocities sampled from the motion covariance
+
+        None if too few of the samples reach the crease within the horizon.
+        """
+        velocity = np.array([motion.dx, motion.dy])
+        if motion.covariance is None or samples <= 1:
+            velocities = velocity[None, :]
+        else:
+            rng = np.random.default_rng(seed)
+            velocities = rng.multivariate_normal(velocity, motion.covariance, size=samples, method="eigh")
+            velocities[0] = velocity
+        positions = np.broadcast_to(np.asarray(position, dtype=np.float64), velocities.shape)
+        hit, hit_points, hit_times = self.predict(positions, velocities, crease, horizon)
+        if hit.mean() < MIN_HIT_FRACTION:
+            return None
+        hit_x, hit_y = np.median(hit_points[hit], axis=0)
+        return float(hit_x), float(hit_y), float(np.median(hit_times[hit]))
@@ -1,4 +1,6 @@
 from dataclasses import dataclass
+import numpy as np
+from typing import Optional
 
 
 @dataclass
@@ -6,10 +8,18 @@ class VectorMotion:
     dx: float
     dy: float
     speed: float
-    
+    # 2x2 covariance of (dx, dy) in (px/s)^2, None if the estimator does not provide one
+    covariance: Optional[np.ndarray] = None
+
     def predict_position(self, current_pos: tuple[float, float], time_sec: float) -> tuple[float, float]:
         """Predict future position based on current motion vector"""
         x, y = current_pos
         future_x = x + self.dx * time_sec
         future_y = y + self.dy * time_sec
         return (future_x, future_y)
+
+    def velocity_std(self) -> float:
+        """Standard deviation of the velocity along its least certain direction (px/s), 0 if unknown"""
+        if self.covariance is None:
+            return 0.0
+        return float(np.sqrt(np.linalg.eigvalsh(self.covariance)[-1]))